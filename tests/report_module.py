@@ -0,0 +1,35 @@
+"""Загрузка скрипта отчета как модуля для тестов (имя файла не является именем модуля Python)"""
+import importlib.util
+import os
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Отчет_по_ТОиР_2027.py')
+
+
+def load_report_module():
+    """Модуль отчета, загруженный один раз и зарегистрированный как report_generator"""
+    module = sys.modules.get('report_generator')
+    if module is None:
+        spec = importlib.util.spec_from_file_location('report_generator', SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['report_generator'] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_plan_frame(source, num_rows=500, seed=0):
+    """Нормализованные строки плана как после load_plan_data: исходные коды, значения вне таблиц замен и пустые
+
+    Строки без ПО_Общества отброшены, поэтому индекс, как у реального листа, идет с пропусками.
+    """
+    import numpy as np
+    import pandas as pd
+    report = load_report_module()
+    rng = np.random.default_rng(seed)
+    choices = {'ПО_Общества': ['ПО Север', 'ПО Юг', 'ПО Центр', None]}
+    for column, mapping in report.VALUE_REPLACEMENTS[source].items():
+        choices[column] = list(mapping) + [' да ', 'Прочее', None]
+    df = pd.DataFrame({column: [values[pick] for pick in rng.integers(0, len(values), num_rows)]
+                       for column, values in choices.items()})
+    df = df[report.SHEET_CONFIGS[source]['names']].dropna(subset=['ПО_Общества'])
+    return report.normalize_plan_values(df, report.VALUE_REPLACEMENTS[source])
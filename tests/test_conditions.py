@@ -0,0 +1,79 @@
+"""Условия отбора и среза куба: разбор аргументов командной строки и срезы CountCube против pd.crosstab"""
+import unittest
+
+import pandas as pd
+
+from report_module import load_report_module, synthetic_plan_frame
+
+report = load_report_module()
+
+
+class ParseConditionsTest(unittest.TestCase):
+    def test_valid_conditions(self):
+        conditions = ['План=Доп_1', ' ДВ = ДВ на проверке ', 'План=Доп_2', 'КП=a=b']
+        self.assertEqual(report.parse_conditions(conditions),
+                         {'План': ['Доп_1', 'Доп_2'], 'ДВ': ['ДВ на проверке'], 'КП': ['a=b']})
+        self.assertEqual(report.parse_conditions([]), {})
+
+    def test_malformed_condition(self):
+        with self.assertRaisesRegex(ValueError, 'СТОЛБЕЦ=ЗНАЧЕНИЕ'):
+            report.parse_conditions(['План=Доп_1', 'Доп_2'])
+
+    def test_breakdown_conditions(self):
+        self.assertEqual(report.parse_breakdown_conditions(['План = Доп_1', 'ДВ=ДВ отсутствует']),
+                         {'План': 'Доп_1', 'ДВ': 'ДВ отсутствует'})
+        with self.assertRaisesRegex(ValueError, 'несколько значений'):
+            report.parse_breakdown_conditions(['План=Доп_1', 'План=Доп_2'])
+        with self.assertRaisesRegex(ValueError, 'СТОЛБЕЦ=ЗНАЧЕНИЕ'):
+            report.parse_breakdown_conditions(['План'])
+
+
+class CountCubeBreakdownTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.df = synthetic_plan_frame('kr')
+        cls.cube = report.build_count_cube(cls.df, report.pivot_blocks('kr'))
+
+    def cube_values(self, values):
+        """Значения столбца в подписях куба: вне таблицы замен - 'Прочие значения', пустые - 'Не заполнено'"""
+        other, empty = report.CUBE_EXTRA_LABELS
+        values = values.astype(object)
+        known = values.isin(self.cube.labels[values.name]) & ~values.isin(report.CUBE_EXTRA_LABELS)
+        return values.where(known, other).where(values.notna(), empty)
+
+    def crosstab(self, df, index, columns):
+        """pd.crosstab по подписям куба, включая прочие и пустые значения"""
+        labels = self.cube.labels
+        return pd.crosstab(self.cube_values(df[index]), self.cube_values(df[columns])).reindex(
+            index=labels[index], columns=labels[columns], fill_value=0)
+
+    def test_breakdown_matches_crosstab(self):
+        expected = self.crosstab(self.df, 'ДВ', 'План')
+        pd.testing.assert_frame_equal(self.cube.breakdown('ДВ', by='План'), expected)
+        self.assertEqual(expected.to_numpy().sum(), len(self.df))
+
+    def test_breakdown_with_condition_matches_crosstab(self):
+        subset = self.df[self.df['План'] == 'Доп_1']
+        expected = self.crosstab(subset, 'ПО_Общества', 'КП')
+        result = self.cube.breakdown('ПО_Общества', by='КП', where={'План': 'Доп_1'})
+        pd.testing.assert_frame_equal(result, expected)
+        self.assertEqual(self.cube.count(План='Доп_1'), len(subset))
+
+    def test_empty_cells_and_unmapped_values(self):
+        series = self.cube.breakdown('ДВ')
+        self.assertEqual(series['Не заполнено'], self.df['ДВ'].isna().sum())
+        mapped = list(dict.fromkeys(report.VALUE_REPLACEMENTS['kr']['ДВ'].values()))
+        self.assertEqual(series['Прочие значения'], (self.df['ДВ'].notna() & ~self.df['ДВ'].isin(mapped)).sum())
+        self.assertEqual(series.sum(), len(self.df))
+
+    def test_unknown_dimension_or_value(self):
+        with self.assertRaisesRegex(ValueError, "Нет измерения 'Сумма'"):
+            self.cube.breakdown('Сумма')
+        with self.assertRaisesRegex(ValueError, "Нет значения 'Доп_3' в измерении 'План'"):
+            self.cube.breakdown('ДВ', where={'План': 'Доп_3'})
+        with self.assertRaisesRegex(ValueError, "Нет измерения 'Сумма'"):
+            self.cube.breakdown('ДВ', where={'Сумма': '1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+"""Запись пакета DOCX: повторы изображений, детерминированность, уровень сжатия, временный файл, встроенные диаграммы"""
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+
+from report_module import load_report_module
+
+report = load_report_module()
+
+SVG_IMAGE = b'<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"><rect width="10" height="10"/></svg>'
+
+
+def png_image():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10), '#66b3ff').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def report_document():
+    """Документ с одинаковой SVG-диаграммой, вставленной дважды (SVG python-docx не объединяет)"""
+    from docx import Document
+    from docx.shared import Cm
+    doc = Document()
+    png = png_image()
+    for _ in range(2):
+        report.add_svg_picture(doc.add_paragraph().add_run(), SVG_IMAGE, png, Cm(2), Cm(2))
+    doc.add_paragraph('Текст ' * 200)
+    return doc
+
+
+class DocxPackageTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.temp_dir.name, name)
+
+    def test_duplicate_media_written_once(self):
+        from docx import Document
+        summary = report.save_docx_package(report_document(), self.path('report.docx'))
+        self.assertEqual(summary['duplicates'], 1)
+        with zipfile.ZipFile(self.path('report.docx')) as archive:
+            names = archive.namelist()
+            rels = archive.read('word/_rels/document.xml.rels').decode('utf-8')
+        svg_names = [name for name in names if name.endswith('.svg')]
+        self.assertEqual(len(svg_names), 1)
+        self.assertEqual(len(names), len(set(names)))
+        self.assertEqual(rels.count(svg_names[0].replace('word/', '')), 2)
+        Document(self.path('report.docx'))
+
+    def test_package_is_deterministic(self):
+        for name in ('first.docx', 'second.docx'):
+            report.save_docx_package(report_document(), self.path(name))
+        with open(self.path('first.docx'), 'rb') as first, open(self.path('second.docx'), 'rb') as second:
+            self.assertEqual(first.read(), second.read())
+        with zipfile.ZipFile(self.path('first.docx')) as archive:
+            for info in archive.infolist():
+                self.assertEqual(info.date_time, report.PACKAGE_ZIP_DATE_TIME, info.filename)
+                self.assertEqual(info.external_attr, 0o644 << 16, info.filename)
+
+    def test_compress_level_applies_to_document_xml(self):
+        sizes = {}
+        for level in (0, 9):
+            report.save_docx_package(report_document(), self.path(f'{level}.docx'), compress_level=level)
+            with zipfile.ZipFile(self.path(f'{level}.docx')) as archive:
+                sizes[level] = archive.getinfo('word/document.xml').compress_size
+        self.assertLess(sizes[9], sizes[0])
+
+    def test_streaming_matches_whole_document(self):
+        import re
+        models = {source: report.make_synthetic_report_model(source, 5, seed=seed)
+                  for seed, source in enumerate(('kr', 'totr'))}
+        saved = dict(report.RUN_SETTINGS), dict(report.CACHE_SETTINGS)
+        self.addCleanup(lambda: (report.RUN_SETTINGS.update(saved[0]), report.CACHE_SETTINGS.update(saved[1])))
+        report.RUN_SETTINGS['chart_backend'] = 'native'
+        report.CACHE_SETTINGS['enabled'] = False
+        documents = {}
+        for streaming in (False, True):
+            report.create_docx_report(models['kr'], models['totr'], self.path(f'{streaming}.docx'), streaming=streaming)
+            with zipfile.ZipFile(self.path(f'{streaming}.docx')) as archive:
+                documents[streaming] = archive.read('word/document.xml')
+        self.assertEqual(documents[True], documents[False])
+        shape_ids = [int(value) for value in re.findall(rb'<wp:docPr id="(\d+)"', documents[True])]
+        self.assertEqual(shape_ids, list(range(1, len(shape_ids) + 1)))
+        self.assertNotRegex(documents[True], rb'<w:sectPr[^>]* id=')
+
+    def test_cached_fragments_match_full_build(self):
+        models = {source: report.make_synthetic_report_model(source, 5, seed=seed)
+                  for seed, source in enumerate(('kr', 'totr'))}
+        saved = dict(report.RUN_SETTINGS), dict(report.CACHE_SETTINGS)
+        self.addCleanup(lambda: (report.RUN_SETTINGS.update(saved[0]), report.CACHE_SETTINGS.update(saved[1])))
+        report.RUN_SETTINGS['chart_backend'] = 'native'
+        report.CACHE_SETTINGS['directory'] = self.path('cache')
+        builds = [('full', False, False), ('cold', True, False), ('warm', True, False), ('warm_stream', True, True)]
+        documents = {}
+        for name, cache_enabled, streaming in builds:
+            report.CACHE_SETTINGS['enabled'] = cache_enabled
+            hits = report.FRAGMENT_CACHE_STATS['hits']
+            report.create_docx_report(models['kr'], models['totr'], self.path(f'{name}.docx'), streaming=streaming)
+            if name.startswith('warm'):
+                self.assertGreater(report.FRAGMENT_CACHE_STATS['hits'], hits)
+            with open(self.path(f'{name}.docx'), 'rb') as f:
+                documents[name] = f.read()
+        for name, _, _ in builds[1:]:
+            self.assertEqual(documents[name], documents['full'], name)
+
+    def test_failed_write_removes_temp_file(self):
+        def failing_blocks():
+            yield None
+            raise RuntimeError('сбой')
+
+        with self.assertRaises(RuntimeError):
+            report.save_docx_package(report_document(), self.path('report.docx'), failing_blocks())
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+
+class NativeChartTest(unittest.TestCase):
+    def test_doughnut_categories_without_counts(self):
+        """Количество выводится подписями данных по значениям ряда, а не зашито в категории"""
+        import re
+        chart = report.create_native_doughnut_chart(['КП на проверке', 'КП отсутствует'], [3, 5], 'КП')
+        xml = chart['chart'] if isinstance(chart['chart'], str) else chart['chart'].decode('utf-8')
+        categories = xml[xml.index('<c:cat>'):xml.index('</c:cat>')]
+        self.assertEqual(re.findall('<c:v>(.*?)</c:v>', categories), ['КП на проверке', 'КП отсутствует'])
+        self.assertIn('<c:showVal val="1"/>', xml)
+        self.assertIn('<c:showPercent val="1"/>', xml)
+        with zipfile.ZipFile(io.BytesIO(chart['workbook'])) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertIn('КП отсутствует</t>', sheet)
+        self.assertNotIn('КП отсутствует: 5', sheet)
+
+
+if __name__ == '__main__':
+    unittest.main()
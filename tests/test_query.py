@@ -0,0 +1,96 @@
+"""Отбор строк плана по битовым картам PlanIndex и run_query против булевых фильтров pandas"""
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from report_module import load_report_module, synthetic_plan_frame
+
+report = load_report_module()
+
+
+class PlanIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.df = synthetic_plan_frame('kr', num_rows=1000, seed=1)
+        cls.index = report.build_plan_index(cls.df, 'kr')
+
+    def expected_rows(self, mask):
+        """Строки по маске pandas в виде результата PlanIndex.select"""
+        rows = self.df[mask].astype(object)
+        rows.insert(0, 'Строка Excel', rows.index.to_numpy() + report.SHEET_CONFIGS['kr']['skiprows'] + 2)
+        return rows.reset_index(drop=True)
+
+    def check(self, mask, where=None, exclude=None):
+        self.assertEqual(self.index.count(where, exclude), int(mask.sum()))
+        pd.testing.assert_frame_equal(self.index.select(where, exclude), self.expected_rows(mask))
+
+    def test_matches_boolean_filters(self):
+        df = self.df
+        self.check(pd.Series(True, index=df.index))
+        self.check(df['План'] == 'Доп_1', where={'План': 'Доп_1'})
+        self.check((df['ПО_Общества'] == 'ПО Север') & df['КП'].isin(['КП на проверке', 'КП отсутствует']),
+                   where={'ПО_Общества': 'ПО Север', 'КП': ['КП на проверке', 'КП отсутствует']})
+        self.check((df['План'] == 'Основной') & (df['ДВ'] != 'ДВ отсутствует') & df['МТР'].notna(),
+                   where={'План': 'Основной'}, exclude={'ДВ': 'ДВ отсутствует', 'МТР': 'Не заполнено'})
+        self.check(df['Статус_объекта'].isna(), where={'Статус_объекта': 'Не заполнено'})
+
+    def test_empty_result(self):
+        mask = (self.df['План'] == 'Доп_1') & (self.df['План'] == 'Доп_2')
+        self.check(mask, where={'План': 'Доп_1'}, exclude={'План': 'Доп_1'})
+        self.check(mask, where={'План': 'Доп_1'}, exclude={'План': self.index.labels['План']})
+        self.assertEqual(list(self.index.select(where={'План': 'Доп_1'}, exclude={'План': 'Доп_1'}).columns),
+                         ['Строка Excel'] + report.SHEET_CONFIGS['kr']['names'])
+
+    def test_unknown_column_or_value(self):
+        with self.assertRaisesRegex(ValueError, "Нет столбца 'Сумма'"):
+            self.index.count({'Сумма': '1'})
+        with self.assertRaisesRegex(ValueError, "Нет значения 'Доп_3' в столбце 'План'"):
+            self.index.count(exclude={'План': ['Доп_1', 'Доп_3']})
+
+
+class RunQueryTest(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        file_path = os.path.join(temp_dir.name, 'plan.xlsx')
+        report.write_synthetic_plan_workbook('kr', file_path, 300, num_subdivisions=3, seed=2)
+        for settings, key, value in ((report.FILE_PATHS, 'kr_file', file_path),
+                                     (report.CACHE_SETTINGS, 'enabled', False)):
+            self.addCleanup(settings.__setitem__, key, settings[key])
+            settings[key] = value
+        self.export_path = os.path.join(temp_dir.name, 'rows.csv')
+
+    def run_query(self, where=None, exclude=None):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            result = report.run_query('kr', where, exclude, export_path=self.export_path)
+        return result, output.getvalue()
+
+    def test_export_matches_boolean_filter(self):
+        df = report.load_plan_data('kr')
+        mask = df['ПО_Общества'].isin(['ПО 000', 'ПО 002']) & (df['КП'] != 'КП отсутствует')
+        result, output = self.run_query({'ПО_Общества': ['ПО 000', 'ПО 002']}, {'КП': ['КП отсутствует']})
+        self.assertTrue(result)
+        self.assertIn(f"найдено строк {mask.sum()} из {len(df)}", output)
+        exported = pd.read_csv(self.export_path, sep=';', encoding='utf-8-sig')
+        self.assertEqual(exported['Строка Excel'].tolist(), (df.index[mask] + report.SHEET_CONFIGS['kr']['skiprows'] + 2).tolist())
+
+    def test_empty_result(self):
+        result, output = self.run_query({'План': ['Доп_1']}, {'План': ['Доп_1']})
+        self.assertTrue(result)
+        self.assertIn('найдено строк 0 из', output)
+        self.assertEqual(len(pd.read_csv(self.export_path, sep=';', encoding='utf-8-sig')), 0)
+
+    def test_unknown_value(self):
+        result, output = self.run_query({'План': ['Доп_3']})
+        self.assertFalse(result)
+        self.assertIn("Ошибка: Нет значения 'Доп_3'", output)
+        self.assertFalse(os.path.exists(self.export_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
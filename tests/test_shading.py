@@ -0,0 +1,55 @@
+"""Заливка ячеек таблиц: одна w:shd на ячейку, место по схеме w:tcPr, общая разметка с таблицами отчета"""
+import unittest
+
+from report_module import load_report_module
+
+report = load_report_module()
+
+
+def shading_fills(tc):
+    """Цвета всех w:shd в свойствах ячейки"""
+    return [shd.get(f"{report.WORDML_NS}fill") for shd in tc.iter(f"{report.WORDML_NS}shd")]
+
+
+class ShadingTest(unittest.TestCase):
+    def setUp(self):
+        from docx import Document
+        self.doc = Document()
+        self.table = self.doc.add_table(rows=3, cols=3)
+
+    def test_shading_twice_leaves_one_shd(self):
+        cell = self.table.cell(0, 0)
+        report.set_cell_shading(cell, 'FF0000')
+        report.set_cell_shading(cell, '00FF00')
+        self.assertEqual(shading_fills(cell._element), ['00FF00'])
+
+    def test_shd_goes_before_valign(self):
+        from docx.enum.table import WD_CELL_VERTICAL_ALIGNMENT
+        cell = self.table.cell(1, 1)
+        cell.vertical_alignment = WD_CELL_VERTICAL_ALIGNMENT.CENTER
+        report.set_cell_shading(cell, 'F8F9FA')
+        tags = [child.tag.split('}')[1] for child in cell._element.tcPr]
+        self.assertLess(tags.index('shd'), tags.index('vAlign'))
+
+    def test_shade_row_and_column(self):
+        report.shade_row(self.table, 0, 'AAAAAA')
+        report.shade_column(self.table, 2, 'BBBBBB')
+        fills = [[shading_fills(self.table.cell(row, col)._element) for col in range(3)] for row in range(3)]
+        self.assertEqual(fills[0], [['AAAAAA'], ['AAAAAA'], ['BBBBBB']])
+        self.assertEqual(fills[1], [[], [], ['BBBBBB']])
+
+    def test_invalid_color(self):
+        with self.assertRaises(ValueError):
+            report.set_cell_shading(self.table.cell(0, 0), 'красный')
+
+    def test_report_table_uses_shared_markup(self):
+        model = report.make_synthetic_report_model('kr', 3)
+        table = model.table(report.REPORT_LAYOUT[0]['items'][0]['columns'])
+        style_ids = report.register_report_styles(self.doc)
+        xml = report.build_table_xml(table, 9000000, style_ids)
+        # Заливка у заголовка и итоговой строки
+        self.assertEqual(xml.count(report.shading_xml(report.TABLE_FILL_COLOR)), 2 * len(table.columns))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""Потоковое чтение листа XLSX: совпадение с pd.read_excel на ячейках разных типов"""
+import os
+import tempfile
+import unittest
+import zipfile
+
+import pandas as pd
+
+from report_module import load_report_module
+
+report = load_report_module()
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELS_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+SHARED_STRINGS = ['ПО Север', 'Основная', 'N/A', 'ПО Юг']
+
+# Стили ячеек (индекс xf): 0 - общий, 1 - дата (встроенный 14), 2 - дата (свой dd.mm.yyyy),
+# 3 - время (встроенный 20, h:mm), 4 - длительность ([h]:mm:ss), 5 - число с двумя знаками
+STYLES = (
+    f'<styleSheet xmlns="{MAIN_NS}">'
+    '<numFmts count="2"><numFmt numFmtId="164" formatCode="dd\\.mm\\.yyyy"/>'
+    '<numFmt numFmtId="165" formatCode="[h]:mm:ss"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+    '<borders count="1"><border/></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="6"><xf numFmtId="0" xfId="0"/><xf numFmtId="14" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="164" xfId="0" applyNumberFormat="1"/><xf numFmtId="20" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" xfId="0" applyNumberFormat="1"/><xf numFmtId="2" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def shared(ref, index):
+    return f'<c r="{ref}" t="s"><v>{index}</v></c>'
+
+
+def inline(ref, text):
+    return f'<c r="{ref}" t="inlineStr"><is><t>{text}</t></is></c>'
+
+
+def number(ref, value, style=0):
+    return f'<c r="{ref}" s="{style}"><v>{value}</v></c>'
+
+
+def typed(ref, cell_type, value):
+    return f'<c r="{ref}" t="{cell_type}"><v>{value}</v></c>'
+
+
+# Столбцы A-F; читаются A, C, D, E, F (B пропускается)
+ROWS = [
+    [inline('A1', 'Шапка отчета')],
+    [inline('A2', 'Подразделение'), inline('B2', 'Лишний'), inline('C2', 'Число'),
+     inline('D2', 'Дата'), inline('E2', 'Время'), inline('F2', 'Прочее')],
+    [shared('A3', 0), shared('B3', 1), number('C3', 5), number('D3', 45000, 1), number('E3', '0.5', 3),
+     typed('F3', 'b', 1)],
+    [inline('A4', 'ПО Центр'), number('C4', '2.5'), number('D4', '45001.75', 2), number('E4', '1.5', 4),
+     typed('F4', 'e', '#DIV/0!')],
+    [shared('A5', 2), number('C5', '3.0', 5), typed('D5', 'd', '2024-03-01T12:30:00'), number('E5', '0.25', 3),
+     typed('F5', 'str', 'итог')],
+    [shared('A6', 3), number('C6', 4), '<c r="D6" s="1"/>', number('E6', 7), inline('F6', 'NULL')],
+    [shared('A7', 3), number('C7', '1E3'), number('D7', 45010, 2), number('E7', '2.25', 4), shared('F7', 1)],
+]
+
+
+def write_fixture_workbook(file_path):
+    """Книга с листом 'Данные' из ROWS: общие и встроенные строки, числа, логические, пустые, даты"""
+    rows = ''.join(f'<row r="{index}">{"".join(cells)}</row>' for index, cells in enumerate(ROWS, start=1))
+    sheet = f'<worksheet xmlns="{MAIN_NS}"><dimension ref="A1:F{len(ROWS)}"/><sheetData>{rows}</sheetData></worksheet>'
+    strings = ''.join(f'<si><t>{text}</t></si>' for text in SHARED_STRINGS)
+    parts = {
+        '[Content_Types].xml': (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '<Override PartName="/xl/sharedStrings.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/></Types>'),
+        '_rels/.rels': (
+            f'<Relationships xmlns="{PKG_RELS_NS}"><Relationship Id="rId1" '
+            f'Type="{RELS_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'),
+        'xl/workbook.xml': (
+            f'<workbook xmlns="{MAIN_NS}" xmlns:r="{RELS_NS}"><workbookPr/>'
+            '<sheets><sheet name="Данные" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+        'xl/_rels/workbook.xml.rels': (
+            f'<Relationships xmlns="{PKG_RELS_NS}">'
+            f'<Relationship Id="rId1" Type="{RELS_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+            f'<Relationship Id="rId2" Type="{RELS_NS}/sharedStrings" Target="sharedStrings.xml"/>'
+            f'<Relationship Id="rId3" Type="{RELS_NS}/styles" Target="styles.xml"/></Relationships>'),
+        'xl/worksheets/sheet1.xml': sheet,
+        'xl/sharedStrings.xml': f'<sst xmlns="{MAIN_NS}" count="{len(SHARED_STRINGS)}">{strings}</sst>',
+        'xl/styles.xml': STYLES,
+    }
+    with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, xml in parts.items():
+            archive.writestr(name, '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + xml)
+
+
+class SheetReaderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.file_path = os.path.join(cls.temp_dir.name, 'fixture.xlsx')
+        write_fixture_workbook(cls.file_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+
+    def read_both(self, **options):
+        expected = pd.read_excel(self.file_path, **options)
+        actual = report.read_sheet_columns(self.file_path, **options)
+        return expected, actual
+
+    def test_matches_read_excel(self):
+        options = dict(sheet_name='Данные', usecols='A,C,D,E,F', skiprows=1,
+                       names=['ПО_Общества', 'Число', 'Дата', 'Время', 'Прочее'])
+        expected, actual = self.read_both(**options)
+        pd.testing.assert_frame_equal(actual, expected)
+
+    def test_matches_read_excel_with_nrows(self):
+        options = dict(sheet_name='Данные', usecols='A,D', skiprows=1, nrows=3, names=['ПО_Общества', 'Дата'])
+        expected, actual = self.read_both(**options)
+        pd.testing.assert_frame_equal(actual, expected)
+
+    def test_date_cells(self):
+        from datetime import datetime, time, timedelta
+        df = report.read_sheet_columns(self.file_path, sheet_name='Данные', usecols='D,E', skiprows=1,
+                                       names=['Дата', 'Время'])
+        self.assertEqual(df['Дата'][0], datetime(2023, 3, 15))
+        self.assertEqual(df['Дата'][2], datetime(2024, 3, 1, 12, 30))
+        self.assertEqual(df['Время'][0], time(12, 0))
+        self.assertEqual(df['Время'][1], timedelta(hours=36))
+
+
+if __name__ == '__main__':
+    unittest.main()
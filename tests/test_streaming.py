@@ -0,0 +1,46 @@
+"""Потоковая агрегация: пиковая память в пределах бюджета, результат совпадает с обычным режимом
+
+Замер выполняет `benchmark streaming` отчета в отдельном процессе: синтетическая книга
+читается частями по CHUNK_SIZE строк и целиком, каждый вариант - в новом процессе.
+"""
+import os
+import subprocess
+import sys
+import unittest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Отчет_по_ТОиР_2027.py')
+
+NUM_ROWS = 20_000
+CHUNK_SIZE = 2_000
+# Пиковая память потокового режима вместе с pandas/numpy/openpyxl (около 150 МБ на Linux)
+MEMORY_BUDGET_MB = 250
+
+
+def run_streaming_benchmark(source, memory_budget_mb):
+    """Запуск замера потокового режима; возвращает код завершения и вывод"""
+    env = dict(os.environ, PYTHONIOENCODING='utf-8')
+    completed = subprocess.run(
+        [sys.executable, SCRIPT, '--chunk-size', str(CHUNK_SIZE), 'benchmark', 'streaming',
+         '--source', source, '--rows', str(NUM_ROWS), '--memory-budget-mb', str(memory_budget_mb)],
+        capture_output=True, encoding='utf-8', env=env, timeout=600)
+    return completed.returncode, completed.stdout + completed.stderr
+
+
+class StreamingAggregationTest(unittest.TestCase):
+    def test_streaming_matches_in_memory_within_budget(self):
+        for source in ('kr', 'totr'):
+            with self.subTest(source=source):
+                returncode, output = run_streaming_benchmark(source, MEMORY_BUDGET_MB)
+                self.assertIn(f"части по {CHUNK_SIZE}", output)
+                self.assertIn("Результаты совпадают: да", output)
+                self.assertIn(f"Бюджет памяти {float(MEMORY_BUDGET_MB)} МБ: соблюден", output)
+                self.assertEqual(returncode, 0, output)
+
+    def test_exceeded_budget_fails(self):
+        returncode, output = run_streaming_benchmark('kr', 1)
+        self.assertIn("Бюджет памяти 1.0 МБ: ПРЕВЫШЕН", output)
+        self.assertEqual(returncode, 1, output)
+
+
+if __name__ == '__main__':
+    unittest.main()
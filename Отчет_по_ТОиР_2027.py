@@ -1,1052 +1,3577 @@
-import pandas as pd
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Border, Side, Alignment, Font, PatternFill
-from openpyxl.utils import get_column_letter
-from openpyxl.drawing.image import Image
-import matplotlib.pyplot as plt
+import time
+
+# Момент начала импорта модуля: для сводки --timings
+_MODULE_IMPORT_STARTED = time.perf_counter()
+
+import argparse
+import copy
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+import hashlib
+import itertools
+import importlib.util
 import io
+import json
+import multiprocessing
 import os
-from docx import Document
-from docx.shared import Inches, Pt, Cm
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
-from docx.oxml import parse_xml
+import re
+import subprocess
+import sys
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape as xml_escape
 import tempfile
-import atexit
 from datetime import datetime
 
+def _lazy_module(name):
+    """Модуль, который загружается при первом обращении к его атрибутам (importlib.util.LazyLoader)"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+# Тяжелые зависимости не загружаются при импорте скрипта: pandas и numpy - при первом
+# обращении, matplotlib и python-docx - внутри функций этапов отрисовки и сборки документа
+pd = _lazy_module('pandas')
+np = _lazy_module('numpy')
+
 # Определяем базовую директорию (на уровень выше скрипта)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-# Получаем текущую дату для имени файла
-current_date = datetime.now().strftime("%d.%m.%Y")
+# Конфигурация путей к файлам относительно базовой директории
+# (output_file = None - имя с текущей датой определяется в момент сборки, см. output_file_path())
+FILE_PATHS = {
+    'kr_file': os.path.join(BASE_DIR, "КР", "Проект плана КР 2027_20.xlsx"),
+    'totr_file': os.path.join(BASE_DIR, "ТОиТР", "Проект плана ТОиТР 2027.xlsx"),
+    'output_file': None
+}
+
+# Параметры чтения листов исходных файлов (буквы столбцов, пропуск шапки, имена столбцов)
+SHEET_CONFIGS = {
+    'kr': {
+        'sheet_name': "ПроектКР2026",
+        'usecols': "AO,AQ,BD,BJ,BM,BT,BV,CI,CK",
+        'skiprows': 15,
+        'nrows': None,
+        'names': ['ПО_Общества', 'План', 'МТР', 'ДВ', 'КП', 'Передано_в_ОДСиССР', 'Направлено_на_осмечивание', 'Статус_объекта', 'Признак_МТР_в_заказе']
+    },
+    'totr': {
+        'sheet_name': "ПроектТОиТР2026",
+        'usecols': "AM,AO,BB,BE,BJ,BL,BU,BW",
+        'skiprows': 15,
+        'nrows': None,
+        'names': ['ПО_Общества', 'План', 'ДВ', 'КП', 'Передано_в_ОДСиССР', 'Направлено_на_осмечивание', 'Статус_объекта', 'Признак_МТР_в_заказе']
+    }
+}
+
+# Замены исходных значений на подписи для отчета (по столбцам, в порядке применения)
+VALUE_REPLACEMENTS = {
+    'kr': {
+        'План': {
+            'Основная': 'Основной',
+            'Доп1': 'Доп_1',
+            'Доп2': 'Доп_2'
+        },
+        'ДВ': {
+            'НА ПРОВЕРКЕ': 'ДВ на проверке',
+            'ДА': 'ДВ принята в работу',
+            'НЕТ': 'ДВ отсутствует'
+        },
+        'КП': {
+            'НА ПРОВЕРКЕ': 'КП на проверке',
+            'ДА': 'КП принято в работу',
+            'НЕТ': 'КП отсутствует',
+            'НЕ требуется': 'КП не требуется'
+        },
+        'МТР': {
+            'НА ПРОВЕРКЕ': 'МТР на проверке',
+            'ДА': 'ЕСТЬ замечания к МТР',
+            'НЕТ': 'Замечаний к МТР НЕТ',
+            'НЕ ТРЕБУЕТСЯ': 'Внесение МТР не требуется'
+        },
+        'Признак_МТР_в_заказе': {
+            'Да': 'Есть признаки МТР в заказе',
+            'Нет': 'Нет признаков МТР в заказе',
+            'Не требуется': 'Не требуется МТР в заказе'
+        },
+        'Передано_в_ОДСиССР': {
+            'ДА': 'Передано в ОДСиССР',
+            'НЕТ': 'Не передано в ОДСиССР'
+        },
+        'Направлено_на_осмечивание': {
+            'ДА': 'Направлено на осмечивание',
+            'НЕТ': 'Не направлено на осмечивание',
+            'На доработке': 'СД на доработке'
+        },
+        'Статус_объекта': {
+            'НА ПРОВЕРКЕ': 'Объект на проверке',
+            'РАЗРАБОТКА СД': 'Разработка СД по объекту',
+            'ВКЛ': 'Объект включен в план',
+            'ПРЕД. К ИСКЛ': 'Объект предлагается к исключению',
+            'ИСКЛ': 'Объект исключен из плана'
+        }
+    },
+    'totr': {
+        'План': {
+            'Основная': 'Основной',
+            'Доп1': 'Доп_1',
+            'Доп2': 'Доп_2'
+        },
+        'ДВ': {
+            'НА ПРОВЕРКЕ': 'ДВ на проверке',
+            'ДА': 'ДВ принята в работу',
+            'НЕТ': 'ДВ отсутствует'
+        },
+        'КП': {
+            'НА ПРОВЕРКЕ': 'КП на проверке',
+            'ДА': 'КП принято в работу',
+            'НЕТ': 'КП отсутствует',
+            'Не требуется': 'КП не требуется'
+        },
+        'Признак_МТР_в_заказе': {
+            'Да': 'Есть признаки МТР в заказе',
+            'Нет': 'Нет признаков МТР в заказе',
+            'Не требуется': 'Не требуется МТР в заказе'
+        },
+        'Передано_в_ОДСиССР': {
+            'ДА': 'Передано в ОДСиССР',
+            'НЕТ': 'Не передано в ОДСиССР'
+        },
+        'Направлено_на_осмечивание': {
+            'ДА': 'Направлено на осмечивание',
+            'НЕТ': 'Не направлено на осмечивание',
+            'На доработке': 'СД на доработке'
+        },
+        'Статус_объекта': {
+            'НА ПРОВЕРКЕ': 'Объект на проверке',
+            'РАЗРАБОТКА СД': 'Разработка СД по объекту',
+            'ВКЛ': 'Объект включен в план',
+            'ПРЕД. К ИСКЛ': 'Объект предлагается к исключению',
+            'ИСКЛ': 'Объект исключен из плана'
+        }
+    }
+}
+
+# Короткие названия и описания источников для сообщений
+SOURCE_TITLES = {
+    'kr': ('КР', "Файл данных по капитальному ремонту"),
+    'totr': ('ТОиТР', "Файл данных по техническому обслуживанию и текущему ремонту")
+}
+
+# Настройки кэша разобранных исходных данных (Arrow IPC, требуется pyarrow)
+CACHE_SETTINGS = {
+    'enabled': True,
+    'directory': os.path.join(BASE_DIR, '.report_cache'),
+    'max_size_mb': 256,
+    'chart_max_size_mb': 64,
+    'chart_memory_mb': 32,
+    'fragment_max_size_mb': 128
+}
+
+# Параметры выполнения: параллельная загрузка источников в пуле процессов,
+# остановка чтения листа после серии подряд идущих строк с пустым ПО_Общества (только за
+# пределами размера листа из dimension; размер больше trusted_dimension_rows строк данных
+# считается раздутым форматированием, и тогда серия учитывается по всему листу),
+# сколько строк после такой остановки проверить на пропущенные значения ПО_Общества
+# (None - просмотреть остаток листа целиком, только для диагностики: время растет с размером листа),
+# потоковая агрегация частями по chunk_size строк для очень больших выгрузок,
+# способ построения диаграмм: 'matplotlib' (изображения) или 'native' (диаграммы Word),
+# формат изображений matplotlib: 'png' или 'svg' (вектор с запасным PNG для Word до 2016;
+# EMF matplotlib не записывает), DPI отрисовки (None - по размеру диаграммы в документе
+# и плотности chart_ppi точек на дюйм страницы; запасной PNG к SVG - chart_fallback_ppi),
+# число цветов палитры PNG (None - без палитры),
+# потоковая запись document.xml по блокам отчета для очень больших документов,
+# уровень сжатия deflate XML-частей DOCX (0-9; изображения хранятся без сжатия),
+# пропуск записи, если готовый DOCX совпадает с уже существующим файлом,
+# каталог настроек и кэша шрифтов matplotlib (None - каталог matplotlib по умолчанию)
+RUN_SETTINGS = {
+    'parallel': True,
+    'empty_run_limit': 500,
+    'trusted_dimension_rows': 100_000,
+    'after_stop_check_rows': 1000,
+    'streaming': False,
+    'chunk_size': 50_000,
+    'chart_backend': 'matplotlib',
+    'chart_format': 'png',
+    'chart_dpi': None,
+    'chart_ppi': 220,
+    'chart_fallback_ppi': 96,
+    'chart_palette_colors': None,
+    'docx_streaming': False,
+    'docx_compress_level': 6,
+    'skip_unchanged': False,
+    'matplotlib_config_dir': None
+}
+
+# Дата всех записей архива DOCX: одинаковое содержимое дает побайтно одинаковый файл.
+# Совпадает с датой ZipInfo по умолчанию, которую получает запись, открытая ZipFile.open() по имени
+PACKAGE_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Типы частей DOCX, которые уже сжаты и записываются в архив как есть (ZIP_STORED):
+# изображения и книги Excel с данными встроенных диаграмм Word.
+# EMF - несжатый векторный формат, поэтому, как и XML, сжимается deflate
+PACKAGE_STORED_CONTENT_TYPES = frozenset([
+    'image/png', 'image/jpeg', 'image/gif',
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+])
+
+# Версия формата кэша: увеличивается при изменении логики чтения или нормализации
+CACHE_FORMAT_VERSION = 3
+
+# Версия кэша диаграмм: увеличивается при изменении оформления диаграмм
+CHART_CACHE_VERSION = 3
+
+# Версия кэша фрагментов документа: увеличивается при изменении разметки таблиц, заголовков и диаграмм
+FRAGMENT_CACHE_VERSION = 3
+
+# Оформление диаграмм отчета по типам
+CHART_STYLES = {
+    'plan_doughnut': {'colors': ['#99ff99', '#66b3ff', '#ff9999'], 'figsize': (5.0, 5.5)},
+    'status_doughnut': {'colors': ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0', '#ffb3e6', '#c4e17f'],
+                        'figsize': (5.0, 5.5)},
+    'status_bar': {'colors': ['#66b3ff', '#99ff99', '#c2c2f0', '#ffcc99', '#ff9999'], 'figsize': (10, 6)}
+}
+
+# Столбцы таблиц отчета (общие для КР и ТОиТР)
+TABLE_COLUMNS = {
+    'plan': ['ПО_Общества', 'Кол-во объектов', 'Основной', 'Доп_1', 'Доп_2'],
+    'dv': ['ПО_Общества', 'ДВ на проверке', 'ДВ принята в работу', 'ДВ отсутствует'],
+    'kp': ['ПО_Общества', 'КП на проверке', 'КП принято в работу', 'КП отсутствует', 'КП не требуется'],
+    'mtr': ['ПО_Общества', 'МТР на проверке', 'ЕСТЬ замечания к МТР', 'Замечаний к МТР НЕТ', 'Внесение МТР не требуется'],
+    'mtr_order': ['ПО_Общества', 'Есть признаки МТР в заказе', 'Нет признаков МТР в заказе', 'Не требуется МТР в заказе'],
+    'ods': ['ПО_Общества', 'Передано в ОДСиССР', 'Не передано в ОДСиССР'],
+    'osmech': ['ПО_Общества', 'Направлено на осмечивание', 'Не направлено на осмечивание', 'СД на доработке'],
+    'status': ['ПО_Общества', 'Объект на проверке', 'Разработка СД по объекту', 'Объект включен в план',
+               'Объект предлагается к исключению', 'Объект исключен из плана']
+}
+
+# Именованные стили отчета: регистрируются один раз в styles.xml документа и применяются
+# по ссылке вместо прямого форматирования каждого абзаца и run (шрифт Arial наследуется от Normal)
+REPORT_PARAGRAPH_STYLES = {
+    'title': {'name': 'Отчет Заголовок', 'size': 16, 'bold': True, 'alignment': 'center',
+              'space_before': 0, 'space_after': 6},
+    'date': {'name': 'Отчет Дата', 'size': 12, 'space_before': 6, 'space_after': 6},
+    'section': {'name': 'Отчет Раздел', 'size': 12, 'bold': True, 'space_before': 6, 'space_after': 6},
+    'table_title': {'name': 'Отчет Заголовок таблицы', 'size': 12, 'space_before': 6, 'space_after': 0},
+    'chart': {'name': 'Отчет Диаграмма', 'alignment': 'center', 'space_before': 6, 'space_after': 0},
+    'cell': {'name': 'Отчет Ячейка', 'size': 8, 'space_before': 0, 'space_after': 0},
+    'cell_center': {'name': 'Отчет Ячейка по центру', 'size': 8, 'alignment': 'center',
+                    'space_before': 0, 'space_after': 0},
+    'cell_bold': {'name': 'Отчет Ячейка выделенная', 'size': 8, 'bold': True, 'alignment': 'center',
+                  'space_before': 0, 'space_after': 0}
+}
+REPORT_TABLE_STYLE = 'Отчет Таблица'
+
+# Структура отчета: разделы КР и ТОиТР, заголовки таблиц, диаграммы и разрывы страниц
+# (heading_space_after - отступ после заголовка раздела, если он отличается от стиля).
+# Для таблиц с диаграммой chart_title задает заголовок диаграммы в объединенном столбце,
+# status_bar_chart - горизонтальную диаграмму статусов объектов после таблицы;
+# chart_size - размер диаграммы в документе (ширина и высота, см).
+REPORT_LAYOUT = [
+    {
+        'source': 'kr',
+        'heading': 'КАПИТАЛЬНЫЙ РЕМОНТ',
+        'heading_space_after': None,
+        'items': [
+            {'title': 'КР: Количество объектов', 'columns': 'plan', 'chart_title': "КР: Распределение по планам", 'chart_size': (6.06, 6.1)},
+            {'title': 'КР: Статусы ДВ', 'columns': 'dv', 'chart_title': "КР: Статусы ДВ", 'chart_size': (5.91, 6.5)},
+            {'title': 'КР: Статусы КП', 'columns': 'kp', 'chart_title': "КР: Статусы КП", 'chart_size': (5.91, 6.5)},
+            {'page_break': True},
+            {'title': 'КР: Статусы МТР', 'columns': 'mtr', 'chart_title': "КР: Статусы МТР", 'chart_size': (5.91, 6.5)},
+            {'title': 'КР: Признаки наличия у заказа ведомости МТР', 'columns': 'mtr_order',
+             'chart_title': "КР: Признаки наличия у заказа ведомости МТР", 'chart_size': (5.91, 6.5)},
+            {'title': 'КР: Передача в ОДСиССР', 'columns': 'ods', 'chart_title': "КР: Передача в ОДСиССР", 'chart_size': (5.91, 6.5)},
+            {'page_break': True},
+            {'title': 'КР: Направление на осмечивание', 'columns': 'osmech', 'chart_title': "КР: Направление на осмечивание", 'chart_size': (5.91, 6.5)},
+            {'title': 'КР: Готовность объектов', 'columns': 'status'},
+            {'status_bar_chart': "КР: Статусы объектов", 'chart_size': (15.24, 9.02)}
+        ]
+    },
+    {
+        'source': 'totr',
+        'heading': 'ТЕХНИЧЕСКОЕ ОБСЛУЖИВАНИЕ И ТЕКУЩИЙ РЕМОНТ',
+        'heading_space_after': 0,
+        'items': [
+            {'title': 'ТОиТР: Количество объектов', 'columns': 'plan', 'chart_title': "ТОиТР: Распределение по планам", 'chart_size': (6.06, 6.1)},
+            {'title': 'ТОиТР: Статусы ДВ', 'columns': 'dv', 'chart_title': "ТОиТР: Статусы ДВ", 'chart_size': (5.91, 6.5)},
+            {'title': 'ТОиТР: Статусы КП', 'columns': 'kp', 'chart_title': "ТОиТР: Статусы КП", 'chart_size': (5.91, 6.5)},
+            {'page_break': True},
+            {'title': 'ТОиТР: Признаки наличия у заказа ведомости МТР', 'columns': 'mtr_order',
+             'chart_title': "ТОиТР: Признаки наличия у заказа ведомости МТР", 'chart_size': (5.91, 6.5)},
+            {'title': 'ТОиТР: Передача в ОДСиССР', 'columns': 'ods', 'chart_title': "ТОиТР: Передача в ОДСиССР", 'chart_size': (5.91, 6.5)},
+            {'title': 'ТОиТР: Направление на осмечивание', 'columns': 'osmech',
+             'chart_title': "ТОиТР: Направление на осмечивание", 'chart_size': (5.91, 6.5)},
+            {'page_break': True},
+            {'title': 'ТОиТР: Готовность объектов', 'columns': 'status'},
+            {'status_bar_chart': "ТОиТР: Статусы объектов", 'chart_size': (15.24, 9.02)}
+        ]
+    }
+]
+
+def output_file_path():
+    """Путь к выходному файлу: из FILE_PATHS или с текущей датой в имени"""
+    if FILE_PATHS['output_file']:
+        return FILE_PATHS['output_file']
+    current_date = datetime.now().strftime("%d.%m.%Y")
+    return os.path.join(BASE_DIR, f"Отчет_по_подготовке_ТОиР_2027_{current_date}.docx")
+
+def check_file_exists(file_path, file_description):
+    """Проверяет существование файла и выводит информационное сообщение"""
+    if not os.path.exists(file_path):
+        print(f"Файл не найден: {file_path}")
+        print(f"Описание: {file_description}")
+        print(f"Текущая рабочая директория: {os.getcwd()}")
+        print(f"Базовая директория: {BASE_DIR}")
+        print("Пожалуйста, проверьте пути в конфигурации FILE_PATHS")
+        return False
+    else:
+        print(f"Файл найден: {file_path}")
+        return True
+
+# Пространства имен SpreadsheetML для потокового чтения листов XLSX
+XLSX_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+XLSX_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Строковые значения, которые pd.read_excel по умолчанию считает пустыми
+EXCEL_NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
+
+def column_letters_to_index(letters):
+    """Преобразует буквенное обозначение столбца Excel (AO) в индекс с нуля"""
+    index = 0
+    for char in letters.strip().upper():
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index - 1
+
+def _find_sheet_xml_path(archive, sheet_name):
+    """Находит путь к XML листа внутри архива XLSX по имени листа"""
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    rel_id = None
+    for sheet in workbook.iter(f'{XLSX_MAIN_NS}sheet'):
+        if sheet.get('name') == sheet_name:
+            rel_id = sheet.get(f'{XLSX_REL_NS}id')
+            break
+    if rel_id is None:
+        raise ValueError(f"Worksheet named '{sheet_name}' not found")
+
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.iter(f'{XLSX_PKG_REL_NS}Relationship'):
+        if rel.get('Id') == rel_id:
+            target = rel.get('Target')
+            # Путь может быть абсолютным внутри пакета или относительным к xl/
+            return target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+    raise ValueError(f"Не найдена связь {rel_id} для листа '{sheet_name}'")
+
+def _read_shared_strings(archive):
+    """Читает таблицу общих строк книги (без фонетических подсказок)"""
+    try:
+        stream = archive.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+
+    shared_strings = []
+    with stream:
+        for event, elem in ET.iterparse(stream, events=('end',)):
+            if elem.tag == f'{XLSX_MAIN_NS}si':
+                parts = []
+                for child in elem:
+                    if child.tag == f'{XLSX_MAIN_NS}t':
+                        parts.append(child.text or '')
+                    elif child.tag == f'{XLSX_MAIN_NS}r':
+                        for run_text in child.iter(f'{XLSX_MAIN_NS}t'):
+                            parts.append(run_text.text or '')
+                shared_strings.append(''.join(parts))
+                elem.clear()
+    return shared_strings
+
+def _read_number_formats(archive):
+    """Стили ячеек с форматом даты и длительности и начало отсчета дат книги
+
+    Стиль ячейки (атрибут s) - номер элемента xf в cellXfs. Формат считается датой или
+    длительностью по тем же правилам openpyxl, что и у pd.read_excel.
+    """
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+    number_formats = {'dates': set(), 'timedeltas': set(), 'epoch': CALENDAR_WINDOWS_1900}
+
+    workbook_pr = ET.fromstring(archive.read('xl/workbook.xml')).find(f'{XLSX_MAIN_NS}workbookPr')
+    if workbook_pr is not None and workbook_pr.get('date1904') in ('1', 'true'):
+        number_formats['epoch'] = CALENDAR_MAC_1904
+
+    try:
+        styles = ET.fromstring(archive.read('xl/styles.xml'))
+    except KeyError:
+        return number_formats
+    custom = {int(num_fmt.get('numFmtId')): num_fmt.get('formatCode')
+              for num_fmt in styles.iter(f'{XLSX_MAIN_NS}numFmt')}
+    cell_xfs = styles.find(f'{XLSX_MAIN_NS}cellXfs')
+    for style_index, xf in enumerate(cell_xfs.findall(f'{XLSX_MAIN_NS}xf') if cell_xfs is not None else []):
+        num_fmt_id = int(xf.get('numFmtId', 0))
+        code = custom.get(num_fmt_id, BUILTIN_FORMATS.get(num_fmt_id))
+        if code and is_date_format(code):
+            number_formats['dates'].add(style_index)
+        if code and is_timedelta_format(code):
+            number_formats['timedeltas'].add(style_index)
+    return number_formats
+
+def _convert_cell_value(cell, shared_strings, number_formats=None):
+    """Преобразует ячейку листа в значение так же, как это делает pd.read_excel
+
+    Числа в ячейках с форматом даты (number_formats из _read_number_formats) становятся
+    датой, временем или длительностью, ячейки t="d" хранят дату в ISO 8601, ошибки - пустые.
+    """
+    cell_type = cell.get('t', 'n')
+
+    if cell_type == 'inlineStr':
+        value = ''.join(t.text or '' for t in cell.iter(f'{XLSX_MAIN_NS}t'))
+    else:
+        raw = cell.findtext(f'{XLSX_MAIN_NS}v')
+        if raw is None:
+            return None
+        if cell_type == 's':
+            value = shared_strings[int(raw)]
+        elif cell_type == 'n':
+            number = float(raw) if '.' in raw or 'E' in raw or 'e' in raw else int(raw)
+            style = cell.get('s')
+            if number_formats is not None and style is not None and int(style) in number_formats['dates']:
+                from openpyxl.utils.datetime import from_excel
+                try:
+                    return from_excel(number, number_formats['epoch'],
+                                      timedelta=int(style) in number_formats['timedeltas'])
+                except (OverflowError, ValueError):
+                    # Число вне диапазона дат openpyxl считает ошибкой, pandas - пустым значением
+                    return None
+            # Целые числа pandas возвращает как int, остальные - как float
+            if isinstance(number, float) and number.is_integer():
+                return int(number)
+            return number
+        elif cell_type == 'b':
+            return raw == '1'
+        elif cell_type == 'd':
+            from openpyxl.utils.datetime import from_ISO8601
+            return from_ISO8601(raw)
+        elif cell_type == 'e':
+            # Ошибки формул (#DIV/0! и т.п.) pandas читает как пустые значения
+            return None
+        else:
+            # 'str' (результат формулы) читается как строка
+            value = raw
+
+    return None if value in EXCEL_NA_VALUES else value
+
+def _cell_has_value(cell):
+    """Проверяет, что ячейка содержит значение, а не только оформление"""
+    if cell.get('t') == 'inlineStr':
+        return True
+    return bool(cell.findtext(f'{XLSX_MAIN_NS}v'))
+
+def _iter_sheet_rows(file_path, sheet_name, col_indexes, first_data_row, last_data_row,
+                     empty_run_limit, key_position, extent):
+    """Построчный обход листа: (номер строки Excel, значения выбранных столбцов, есть ли данные в строке)
+
+    Ячейки вне выбранных столбцов не преобразуются, обработанные строки
+    сразу освобождаются. Сведения о границах данных записываются в extent.
+
+    Серия из empty_run_limit строк с пустым ключевым столбцом останавливает чтение только
+    за пределами размера листа (dimension) или если размер не указан либо раздут
+    (больше RUN_SETTINGS['trusted_dimension_rows'] строк данных). После такой остановки
+    следующие RUN_SETTINGS['after_stop_check_rows'] строк просматриваются без преобразования
+    значений: число непрочитанных строк с ключом записывается в extent['rows_after_stop'].
+    """
+    wanted = {col_index: position for position, col_index in enumerate(col_indexes)}
+    row_tag = f'{XLSX_MAIN_NS}row'
+    cell_tag = f'{XLSX_MAIN_NS}c'
+    dimension_tag = f'{XLSX_MAIN_NS}dimension'
+    key_col_index = col_indexes[key_position]
+    check_rows = RUN_SETTINGS['after_stop_check_rows']
+
+    def empty_run_stops(row_number):
+        """Достаточно ли серии пустых строк для остановки перед строкой row_number"""
+        if empty_run_limit is None or empty_run < empty_run_limit:
+            return False
+        dimension = extent['dimension_last_row']
+        if dimension is None or dimension - first_data_row + 1 > RUN_SETTINGS['trusted_dimension_rows']:
+            return True
+        # Внутри размера листа строки не отбрасываются
+        return row_number > dimension
+
+    with zipfile.ZipFile(file_path) as archive:
+        sheet_path = _find_sheet_xml_path(archive, sheet_name)
+        shared_strings = _read_shared_strings(archive)
+        number_formats = _read_number_formats(archive)
+
+        with archive.open(sheet_path) as stream:
+            sheet_data = None
+            row_number = 0
+            empty_run = 0
+            stop_row = None
+            for event, elem in ET.iterparse(stream, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == row_tag:
+                        row_ref = elem.get('r')
+                        row_number = int(row_ref) if row_ref else row_number + 1
+                    elif sheet_data is None and elem.tag == f'{XLSX_MAIN_NS}sheetData':
+                        sheet_data = elem
+                    elif elem.tag == dimension_tag:
+                        # Размер листа из dimension (A1:CK2034): внутри него серия пустых строк чтение
+                        # не останавливает. Границей чтения он не служит - pd.read_excel его тоже не учитывает
+                        last_ref = (elem.get('ref') or '').split(':')[-1]
+                        digits = last_ref.lstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+                        extent['dimension_last_row'] = int(digits) if digits.isdigit() else None
+                    continue
+
+                if elem.tag != row_tag:
+                    continue
+
+                if last_data_row is not None and row_number > last_data_row:
+                    extent['stop_reason'] = 'nrows'
+                    return
+                if stop_row is None and row_number >= first_data_row:
+                    # Строки, отсутствующие в XML, тоже пустые
+                    empty_run += row_number - extent['scanned_to_row'] - 1
+                    if empty_run_stops(row_number):
+                        extent['stop_reason'] = 'empty_run'
+                        stop_row = row_number
+
+                if stop_row is not None:
+                    # Чтение остановлено: в пределах проверяемых строк только отмечаем строки с ключом,
+                    # которые не попадут в данные, дальше лист не разбирается
+                    if check_rows is not None and row_number >= stop_row + check_rows:
+                        return
+                    if _row_has_key_value(elem, cell_tag, key_col_index):
+                        extent['rows_after_stop'] += 1
+                        extent['last_row_after_stop'] = row_number
+                    extent['checked_after_stop_to_row'] = row_number
+                elif row_number >= first_data_row:
+                    values = [None] * len(col_indexes)
+                    has_values = False
+                    col_position = -1
+                    for cell in elem.iter(cell_tag):
+                        cell_ref = cell.get('r')
+                        if cell_ref:
+                            col_position = column_letters_to_index(cell_ref.rstrip('0123456789'))
+                        else:
+                            col_position += 1
+                        position = wanted.get(col_position)
+                        if position is not None:
+                            values[position] = _convert_cell_value(cell, shared_strings, number_formats)
+                            has_values = has_values or values[position] is not None
+                        elif not has_values:
+                            has_values = _cell_has_value(cell)
+
+                    extent['scanned_to_row'] = row_number
+                    yield row_number, values, has_values
+
+                    if values[key_position] is None:
+                        empty_run += 1
+                        if empty_run_stops(row_number + 1):
+                            extent['stop_reason'] = 'empty_run'
+                            stop_row = row_number + 1
+                    else:
+                        empty_run = 0
+                        extent['last_key_row'] = row_number
+
+                # Освобождаем уже обработанные строки, чтобы не держать лист в памяти
+                if sheet_data is not None:
+                    sheet_data.clear()
+                else:
+                    elem.clear()
+
+def _row_has_key_value(row, cell_tag, key_col_index):
+    """Есть ли в строке XML значение в ключевом столбце (без преобразования значений)"""
+    col_position = -1
+    for cell in row.iter(cell_tag):
+        cell_ref = cell.get('r')
+        col_position = column_letters_to_index(cell_ref.rstrip('0123456789')) if cell_ref else col_position + 1
+        if col_position == key_col_index:
+            return _cell_has_value(cell)
+    return False
+
+def _prepare_sheet_read(usecols, skiprows, nrows, names, key_column):
+    """Разбор параметров чтения листа в индексы столбцов и границы строк"""
+    letters = [letter.strip() for letter in usecols.split(',')]
+    # pandas выдает столбцы в порядке их следования на листе
+    col_indexes = sorted(column_letters_to_index(letter) for letter in letters)
+    if names is None:
+        names = letters
+    if len(names) != len(col_indexes):
+        raise ValueError("Количество имен столбцов не совпадает с usecols")
+    key_position = 0 if key_column is None else list(names).index(key_column)
+
+    first_data_row = skiprows + 2  # номер строки Excel (с единицы) после шапки и заголовка
+    last_data_row = None if nrows is None else first_data_row + nrows - 1
+    extent = {
+        'first_row': first_data_row,
+        'dimension_last_row': None,
+        'last_key_row': None,
+        'scanned_to_row': first_data_row - 1,
+        'stop_reason': 'sheet_end',
+        'rows_after_stop': 0,
+        'last_row_after_stop': None,
+        'checked_after_stop_to_row': None
+    }
+    return col_indexes, list(names), key_position, first_data_row, last_data_row, extent
+
+def read_sheet_columns(file_path, sheet_name, usecols, skiprows=0, nrows=None, names=None,
+                       empty_run_limit=None, key_column=None):
+    """Потоковое чтение выбранных столбцов листа XLSX без разбора остальных ячеек
+
+    Повторяет семантику pd.read_excel(usecols=..., skiprows=..., nrows=..., names=...):
+    первые skiprows строк пропускаются, следующая строка считается заголовком
+    и заменяется на names, затем читается не более nrows строк данных.
+
+    При nrows=None граница данных определяется автоматически: по размеру листа
+    (элемент dimension) и, если задан empty_run_limit, по серии из стольких
+    подряд строк с пустым ключевым столбцом key_column (по умолчанию первым).
+    Сведения о найденном диапазоне сохраняются в df.attrs['extent'].
+
+    Числа с форматом даты или времени (встроенным или своим, с учетом date1904)
+    и ячейки t="d" читаются как datetime/time/timedelta, ошибки (#DIV/0! и т.п.) -
+    как пустые значения. Отличие от pandas: столбец, где числа перемешаны
+    с логическими значениями, остается object, а pandas приводит его к float.
+    """
+    col_indexes, names, key_position, first_data_row, last_data_row, extent = _prepare_sheet_read(
+        usecols, skiprows, nrows, names, key_column)
+
+    rows = []
+    last_non_empty_row = first_data_row - 1
+    for row_number, values, has_values in _iter_sheet_rows(file_path, sheet_name, col_indexes, first_data_row,
+                                                           last_data_row, empty_run_limit, key_position, extent):
+        # Пустые строки между данными сохраняются, хвостовые - отбрасываются
+        while len(rows) < row_number - first_data_row:
+            rows.append([None] * len(col_indexes))
+        rows.append(values)
+        if has_values:
+            last_non_empty_row = row_number
+
+    rows = rows[:max(last_non_empty_row - first_data_row + 1, 0)]
+    columns = {name: [row[position] for row in rows] for position, name in enumerate(names)}
+    df = pd.DataFrame(columns).infer_objects().fillna(np.nan)
+    df.attrs['extent'] = extent
+    return df
+
+def iter_sheet_chunks(file_path, sheet_name, usecols, skiprows=0, nrows=None, names=None,
+                      empty_run_limit=None, key_column=None, chunk_size=50_000):
+    """Чтение выбранных столбцов листа частями по chunk_size строк
+
+    Индекс строк совпадает с индексом read_sheet_columns, поэтому объединение
+    частей без пустых хвостовых строк дает тот же результат. После обхода
+    сведения о границах данных доступны в attrs['extent'] последней части.
+    """
+    col_indexes, names, key_position, first_data_row, last_data_row, extent = _prepare_sheet_read(
+        usecols, skiprows, nrows, names, key_column)
+
+    def make_chunk(row_numbers, rows):
+        columns = {name: [row[position] for row in rows] for position, name in enumerate(names)}
+        chunk = pd.DataFrame(columns, index=[number - first_data_row for number in row_numbers])
+        chunk = chunk.infer_objects().fillna(np.nan)
+        chunk.attrs['extent'] = extent
+        return chunk
+
+    row_numbers = []
+    rows = []
+    for row_number, values, _ in _iter_sheet_rows(file_path, sheet_name, col_indexes, first_data_row,
+                                                  last_data_row, empty_run_limit, key_position, extent):
+        row_numbers.append(row_number)
+        rows.append(values)
+        if len(rows) >= chunk_size:
+            yield make_chunk(row_numbers, rows)
+            row_numbers, rows = [], []
+    # Последняя часть выдается всегда, чтобы передать сведения о границах данных
+    yield make_chunk(row_numbers, rows)
+
+def describe_data_extent(extent, num_objects, short_name):
+    """Вывод в лог найденного диапазона данных листа"""
+    if extent is None:
+        return
+    stop_reasons = {
+        'sheet_end': "конец листа",
+        'nrows': "достигнут лимит nrows",
+        'empty_run': "серия пустых строк ПО_Общества"
+    }
+    last_key_row = extent['last_key_row'] or extent['first_row'] - 1
+    dimension = extent['dimension_last_row']
+    print(f"{short_name}: диапазон данных - строки {extent['first_row']}-{last_key_row} "
+          f"(объектов: {num_objects}), просмотрено до строки {extent['scanned_to_row']}, "
+          f"размер листа: {dimension if dimension is not None else 'не указан'}, "
+          f"остановка: {stop_reasons[extent['stop_reason']]}")
+    if extent.get('rows_after_stop'):
+        print(f"ВНИМАНИЕ! {short_name}: после остановки чтения на листе остались строки с ПО_Общества "
+              f"({extent['rows_after_stop']} до строки {extent['checked_after_stop_to_row']}, последняя - "
+              f"{extent['last_row_after_stop']}), они НЕ вошли в отчет. Увеличьте --empty-run-limit "
+              f"или задайте 0, чтобы читать лист целиком; --scan-after-stop проверяет остаток листа до конца")
+
+def benchmark_excel_readers(source='kr', repeats=3):
+    """Сравнение времени чтения листа через pd.read_excel и потоковый ридер"""
+    config = SHEET_CONFIGS[source]
+    file_path = FILE_PATHS[f'{source}_file']
+    if not check_file_exists(file_path, f"Файл данных для замера ({source})"):
+        raise FileNotFoundError(f"Файл не найден: {file_path}")
+
+    readers = [
+        ('pd.read_excel', lambda: pd.read_excel(file_path, **config)),
+        ('read_sheet_columns', lambda: read_sheet_columns(file_path, **config))
+    ]
+
+    results = {}
+    for reader_name, reader in readers:
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            frame = reader()
+            timings.append(time.perf_counter() - start)
+        results[reader_name] = (min(timings), frame)
+        print(f"{reader_name:<20} лучшее время: {min(timings):.3f} с (строк: {len(frame)})")
+
+    reference = results['pd.read_excel'][1].dropna(subset=[config['names'][0]])
+    streamed = results['read_sheet_columns'][1].dropna(subset=[config['names'][0]])
+    same = reference.astype(object).equals(streamed.astype(object))
+    speedup = results['pd.read_excel'][0] / max(results['read_sheet_columns'][0], 1e-9)
+    print(f"Ускорение: {speedup:.1f}x, результаты совпадают: {'да' if same else 'НЕТ'}")
+    return results
+
+def fold_value(value):
+    """Ключ сопоставления значения: без лишних пробелов и без учета регистра"""
+    return ' '.join(str(value).split()).casefold()
+
+def build_normalization_table(mapping):
+    """Таблица сопоставления свернутых значений с подписями отчета"""
+    table = {}
+    # Подпись отчета, уже записанная в исходном файле, сопоставляется сама с собой
+    for key, label in list(mapping.items()) + [(label, label) for label in mapping.values()]:
+        folded = fold_value(key)
+        if table.setdefault(folded, label) != label:
+            raise ValueError(f"Значение '{key}' неоднозначно после свертки: '{table[folded]}' и '{label}'")
+    return table
+
+def normalize_column(values, mapping):
+    """Перевод исходных кодов столбца в категориальные подписи отчета
+
+    Категории - подписи из mapping в порядке объявления, за ними нераспознанные
+    исходные значения. Свертка пробелов и регистра выполняется один раз на
+    каждое различное значение, строки получают подпись через таблицу кодов.
+    """
+    labels = list(dict.fromkeys(mapping.values()))
+    label_codes = {label: code for code, label in enumerate(labels)}
+    table = build_normalization_table(mapping)
+
+    codes, uniques = pd.factorize(values)
+    unmapped = {}
+    # Последний элемент таблицы соответствует коду -1 (пустое значение)
+    lookup = np.full(len(uniques) + 1, -1, dtype=np.int64)
+    for position, raw in enumerate(uniques):
+        label = table.get(fold_value(raw))
+        if label is not None:
+            lookup[position] = label_codes[label]
+        else:
+            lookup[position] = unmapped.setdefault(raw, len(labels) + len(unmapped))
+
+    return pd.Categorical.from_codes(lookup[codes], categories=labels + list(unmapped))
+
+def normalize_plan_values(df, replacements):
+    """Замена исходных кодов статусов на подписи для отображения в отчете"""
+    for column, mapping in replacements.items():
+        df[column] = normalize_column(df[column], mapping)
+    return df
+
+def _normalize_plan_values_replace(df, replacements):
+    """Прежняя нормализация цепочкой Series.replace (эталон для замеров)"""
+    for column, mapping in replacements.items():
+        df[column] = df[column].replace(mapping)
+    return df
+
+def find_unmapped_values(df, replacements):
+    """Количество строк с нераспознанными исходными значениями по столбцам"""
+    unmapped = {}
+    for column, mapping in replacements.items():
+        num_labels = len(dict.fromkeys(mapping.values()))
+        values = df[column]
+        codes = values.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= num_labels] - num_labels,
+                             minlength=len(values.cat.categories) - num_labels)
+        stray = {raw: int(count) for raw, count in zip(values.cat.categories[num_labels:], counts) if count}
+        if stray:
+            unmapped[column] = stray
+    return unmapped
+
+def report_unmapped_values(df, replacements, short_name):
+    """Вывод нераспознанных значений, которые не попадают ни в один столбец отчета"""
+    unmapped = find_unmapped_values(df, replacements)
+    print_unmapped_values(unmapped, short_name)
+    return unmapped
+
+def print_unmapped_values(unmapped, short_name):
+    """Вывод в лог нераспознанных значений по столбцам с количеством строк"""
+    for column, stray in unmapped.items():
+        details = ', '.join(f"'{raw}': {count}" for raw, count in stray.items())
+        print(f"{short_name}: нераспознанные значения в столбце {column} (строк): {details}")
+
+# Доступность pyarrow для кэша исходных данных (проверяется при первом обращении к кэшу).
+# Кэши диаграмм и фрагментов документа pyarrow не требуют и от этого флага не зависят
+ARROW_CACHE_AVAILABLE = None
+
+def _cache_enabled():
+    """Проверяет, что кэш включен и доступен pyarrow для формата Arrow IPC"""
+    global ARROW_CACHE_AVAILABLE
+    if not CACHE_SETTINGS['enabled']:
+        return False
+    if ARROW_CACHE_AVAILABLE is None:
+        ARROW_CACHE_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+        if not ARROW_CACHE_AVAILABLE:
+            print("Кэш исходных данных отключен: не установлен pyarrow")
+    return ARROW_CACHE_AVAILABLE
+
+def _file_content_hash(file_path, chunk_size=1024 * 1024):
+    """SHA-256 содержимого файла, вычисляемый по частям"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_key(source, file_path):
+    """Ключ кэша: отпечаток файла и все параметры извлечения и нормализации"""
+    stat = os.stat(file_path)
+    fingerprint = {
+        'version': CACHE_FORMAT_VERSION,
+        'path': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': _file_content_hash(file_path),
+        'sheet': SHEET_CONFIGS[source],
+        'empty_run_limit': RUN_SETTINGS['empty_run_limit'],
+        'trusted_dimension_rows': RUN_SETTINGS['trusted_dimension_rows'],
+        'replacements': VALUE_REPLACEMENTS[source]
+    }
+    payload = json.dumps(fingerprint, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _cache_entry_path(source, key):
+    """Путь к файлу кэша для источника и ключа"""
+    return os.path.join(CACHE_SETTINGS['directory'], f"{source}_{key[:32]}.arrow")
+
+def load_cached_frame(source, key):
+    """Загружает нормализованные данные из кэша или возвращает None при промахе"""
+    entry_path = _cache_entry_path(source, key)
+    if not os.path.exists(entry_path):
+        return None
+    try:
+        df = pd.read_feather(entry_path).set_index('__row__').rename_axis(None)
+    except Exception as e:
+        # Поврежденная запись удаляется и считается промахом
+        print(f"Ошибка при чтении кэша {entry_path}: {e}")
+        _remove_cache_file(entry_path)
+        return None
+    # Отмечаем использование записи для вытеснения по давности (LRU)
+    os.utime(entry_path)
+    return df
+
+def store_cached_frame(source, key, df):
+    """Сохраняет нормализованные данные в кэш, удаляя устаревшие записи источника"""
+    directory = CACHE_SETTINGS['directory']
+    entry_path = _cache_entry_path(source, key)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Записи того же источника с другим ключом устарели: файл или настройки изменились
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.startswith(f"{source}_") and name.endswith('.arrow') and path != entry_path:
+                _remove_cache_file(path)
+
+        temp_path = f"{entry_path}.tmp"
+        df.rename_axis('__row__').reset_index().to_feather(temp_path)
+        os.replace(temp_path, entry_path)
+    except Exception as e:
+        print(f"Ошибка при записи кэша {entry_path}: {e}")
+        return
+    enforce_cache_size_limit()
+
+def enforce_cache_size_limit(suffix='.arrow', limit_setting='max_size_mb'):
+    """Вытесняет давно не использованные записи, пока кэш больше лимита"""
+    directory = CACHE_SETTINGS['directory']
+    if not os.path.isdir(directory):
+        return
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(suffix):
+            stat = os.stat(os.path.join(directory, name))
+            entries.append((stat.st_mtime, stat.st_size, os.path.join(directory, name)))
+
+    limit = CACHE_SETTINGS[limit_setting] * 1024 * 1024
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= limit:
+            break
+        _remove_cache_file(path)
+        total_size -= size
+
+def clear_cache():
+    """Полная очистка кэша исходных данных, диаграмм и фрагментов документа"""
+    directory = CACHE_SETTINGS['directory']
+    removed = 0
+    _chart_memory_cache.clear()
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith(('.arrow', '.png', '.svg', '.docxfrag', '.tmp')):
+                _remove_cache_file(os.path.join(directory, name))
+                removed += 1
+    print(f"Кэш очищен: {directory} (удалено файлов: {removed})")
+
+def _remove_cache_file(path):
+    """Удаляет файл кэша, не прерывая работу при ошибке"""
+    try:
+        os.unlink(path)
+    except OSError as e:
+        print(f"Ошибка при удалении файла кэша {path}: {e}")
+
+def source_file_path(source):
+    """Путь к исходному файлу источника с проверкой его существования"""
+    file_path = FILE_PATHS[f'{source}_file']
+    short_name, description = SOURCE_TITLES[source]
+
+    # Проверяем существование файла
+    if not check_file_exists(file_path, description):
+        raise FileNotFoundError(f"Файл {short_name} не найден: {file_path}")
+    return file_path
+
+def load_plan_data(source):
+    """Чтение и нормализация строк плана с использованием кэша по отпечатку файла"""
+    file_path = source_file_path(source)
+    short_name = SOURCE_TITLES[source][0]
+
+    key = None
+    df = None
+    if _cache_enabled():
+        key = _cache_key(source, file_path)
+        start = time.perf_counter()
+        df = load_cached_frame(source, key)
+        if df is not None:
+            print(f"Данные {short_name} загружены из кэша за {(time.perf_counter() - start) * 1000:.0f} мс")
+
+    if df is None:
+        # Читаем только нужные столбцы листа потоковым ридером до фактической границы данных
+        df = read_sheet_columns(file_path, **SHEET_CONFIGS[source],
+                                empty_run_limit=RUN_SETTINGS['empty_run_limit'],
+                                key_column='ПО_Общества').dropna(subset=['ПО_Общества'])
+        describe_data_extent(df.attrs.get('extent'), len(df), short_name)
+
+        # Предварительно обрабатываем значения для правильного отображения
+        df = normalize_plan_values(df, VALUE_REPLACEMENTS[source])
+
+        if key is not None:
+            store_cached_frame(source, key, df)
+
+    # Сообщаем о значениях, которых нет в таблицах замен
+    report_unmapped_values(df, VALUE_REPLACEMENTS[source], short_name)
+    return df
+
+def pivot_blocks(source):
+    """Блоки сводной таблицы: столбец данных и его категории в порядке столбцов отчета"""
+    # Категории блока - подписи из таблицы замен (без повторов, в порядке объявления)
+    return [(column, list(dict.fromkeys(mapping.values())))
+            for column, mapping in VALUE_REPLACEMENTS[source].items()]
+
+def category_codes(values, labels):
+    """Коды категорий столбца: номер подписи в labels, len(labels) для прочих значений, -1 для пустых"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Нормализованные столбцы уже закодированы - используем их коды напрямую
+        codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, uniques = pd.factorize(values)
+    # Сопоставление выполняется один раз на каждое различное значение, а не на каждую строку
+    lookup = pd.Index(labels).get_indexer(uniques)
+    lookup[lookup < 0] = len(labels)
+    # Последний элемент таблицы соответствует коду -1 (пустое значение)
+    return np.append(lookup, -1).astype(np.int64)[codes]
+
+def pivot_slot_offsets(blocks):
+    """Раскладка слотов строки счетчиков: [Кол-во объектов] + по блокам [категории..., прочие значения]"""
+    offsets = []
+    width = 1
+    for column, labels in blocks:
+        offsets.append(width)
+        width += len(labels) + 1
+    return offsets, width
+
+def cube_dimension_codes(df, blocks):
+    """Коды строк по измерениям куба: ПО_Общества и столбцы блоков (прочие значения и пустые - отдельные коды)"""
+    po_codes, po_labels = pd.factorize(df['ПО_Общества'], sort=True)
+    codes = [po_codes.astype(np.int64)]
+    labels = [list(po_labels)]
+    for column, block_labels in blocks:
+        column_codes = category_codes(df[column], block_labels)
+        column_codes[column_codes < 0] = len(block_labels) + 1
+        codes.append(column_codes)
+        labels.append(list(block_labels) + list(CUBE_EXTRA_LABELS))
+    return codes, labels
+
+def build_count_cube(df, blocks):
+    """Куб счетчиков (ПО_Общества x столбцы блоков) по нормализованным строкам за один проход"""
+    codes, labels = cube_dimension_codes(df, blocks)
+    shape = tuple(len(dimension_labels) for dimension_labels in labels)
+    if not len(df):
+        return CountCube(blocks, labels, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    keys = np.ravel_multi_index(codes, shape)
+    # Хранятся только встречающиеся сочетания значений: ячеек не больше, чем строк
+    keys, counts = np.unique(keys, return_counts=True)
+    return CountCube(blocks, labels, keys, counts.astype(np.int64))
+
+def aggregate_report(df, blocks):
+    """Модель отчета (ReportModel) по ПО_Общества из куба счетчиков, построенного за один проход"""
+    return build_count_cube(df, blocks).report_model()
+
+def aggregate_pivot(df, blocks):
+    """Сводная таблица по ПО_Общества за один векторизованный проход по кодам категорий
+
+    Результат совпадает с прежней схемой (pd.crosstab по каждому столбцу, pd.concat,
+    добавление недостающих столбцов, 'Кол-во объектов' и строка 'Общий итог'),
+    включая порядок строк и NaN для подразделений без значений в блоке.
+    """
+    return aggregate_report(df, blocks).to_frame()
+
+class ReportTable:
+    """Таблица отчета: заголовки, подписи подразделений, значения по подразделениям и итоговая строка
+
+    values и totals - представления матрицы модели отчета, без копирования данных.
+    """
+    __slots__ = ('columns', 'labels', 'values', 'totals')
+
+    def __init__(self, columns, labels, values, totals):
+        self.columns = columns
+        self.labels = labels
+        self.values = values
+        self.totals = totals
+
+    def __len__(self):
+        """Число строк таблицы вместе с итоговой"""
+        return len(self.labels) + 1
+
+    def rows(self):
+        """Строки таблицы как DataFrame.itertuples(index=False): подпись и значения, итоговая строка последняя"""
+        for label, values in zip(self.labels, self.values.tolist()):
+            yield (label, *values)
+        yield ('Общий итог', *self.totals.tolist())
+
+class ReportModel:
+    """Итоги источника в компактном виде: матрица счетчиков по подразделениям и индексы к ней
+
+    counts - матрица (подразделение x столбец отчета), totals - строка 'Общий итог',
+    subdivision_index - номер строки подразделения, column_groups - срезы столбцов для групп
+    TABLE_COLUMNS. Тип значений повторяет прежнюю сводную таблицу: int64, а если у
+    подразделения нет значений в каком-либо блоке (NaN) - float64 для всех столбцов.
+    Таблицы и диаграммы читают представления матрицы без копирования и без поиска итоговой
+    строки; модель дешево передается в дочерние процессы. cube - куб счетчиков источника
+    (CountCube), из которого построена модель; по нему строятся срезы, которых нет в отчете.
+    """
+    __slots__ = ('subdivisions', 'subdivision_index', 'columns', 'column_groups', 'counts', 'totals', 'cube')
+
+    def __init__(self, subdivisions, columns, counts, totals, cube=None):
+        self.subdivisions = list(subdivisions)
+        self.subdivision_index = {label: row for row, label in enumerate(self.subdivisions)}
+        self.columns = list(columns)
+        self.counts = counts
+        self.totals = totals
+        # Куб счетчиков, из которого построена модель (для произвольных срезов)
+        self.cube = cube
+
+        # Группы столбцов, которые есть у источника; смежные столбцы дают срез-представление
+        positions = {name: index for index, name in enumerate(self.columns)}
+        self.column_groups = {}
+        for group, names in TABLE_COLUMNS.items():
+            if all(name in positions for name in names[1:]):
+                indexes = [positions[name] for name in names[1:]]
+                if indexes == list(range(indexes[0], indexes[0] + len(indexes))):
+                    self.column_groups[group] = slice(indexes[0], indexes[-1] + 1)
+                else:
+                    self.column_groups[group] = np.asarray(indexes)
+
+    def __len__(self):
+        """Число строк сводной таблицы: подразделения и 'Общий итог'"""
+        return len(self.subdivisions) + 1
+
+    def table(self, group):
+        """Таблица группы столбцов TABLE_COLUMNS[group]"""
+        columns = self.column_groups[group]
+        return ReportTable(TABLE_COLUMNS[group], self.subdivisions, self.counts[:, columns], self.totals[columns])
+
+    def group_totals(self, group):
+        """Итоги группы столбцов TABLE_COLUMNS[group] (без столбца ПО_Общества)"""
+        return self.totals[self.column_groups[group]]
+
+    def row(self, subdivision):
+        """Счетчики подразделения по всем столбцам"""
+        return self.counts[self.subdivision_index[subdivision]]
+
+    def equals(self, other):
+        """Совпадение подписей, столбцов, типа и значений (NaN равен NaN, как в DataFrame.equals)"""
+        equal_nan = self.counts.dtype.kind == 'f'
+        return (self.subdivisions == other.subdivisions and self.columns == other.columns
+                and self.counts.dtype == other.counts.dtype
+                and np.array_equal(self.counts, other.counts, equal_nan=equal_nan)
+                and np.array_equal(self.totals, other.totals, equal_nan=equal_nan))
+
+    def to_frame(self):
+        """Сводная таблица pandas в прежнем виде, со строкой 'Общий итог' (для сравнения с pd.crosstab)"""
+        values = np.vstack([self.counts, self.totals])
+        data = {'ПО_Общества': self.subdivisions + ['Общий итог']}
+        data.update((name, values[:, index]) for index, name in enumerate(self.columns))
+        return pd.DataFrame(data)
+
+# Подписи дополнительных значений измерения куба: значения вне таблицы замен и пустые ячейки
+CUBE_EXTRA_LABELS = ('Прочие значения', 'Не заполнено')
+
+class CountCube:
+    """Разреженный куб счетчиков строк плана: ПО_Общества x столбцы блоков сводной таблицы
+
+    Хранит только встречающиеся сочетания значений: keys - номера ячеек плотного куба
+    формы shape (np.ravel_multi_index), counts - число строк в ячейке. Свертки по одному
+    или нескольким измерениям (rollup) вычисляются один раз и кэшируются, поэтому любой
+    срез (например, статусы ДВ внутри плана Доп_1) не требует повторного прохода по строкам.
+    """
+    __slots__ = ('blocks', 'dimensions', 'labels', 'shape', 'keys', 'counts', '_label_index', '_axis_codes',
+                 '_rollups')
+
+    def __init__(self, blocks, labels, keys, counts):
+        self.blocks = list(blocks)
+        self.dimensions = ['ПО_Общества'] + [column for column, _ in self.blocks]
+        self.labels = {dimension: list(dimension_labels) for dimension, dimension_labels in zip(self.dimensions, labels)}
+        self.shape = tuple(len(dimension_labels) for dimension_labels in labels)
+        self.keys = keys
+        self.counts = counts
+        self._label_index = {}
+        self._axis_codes = {}
+        self._rollups = {}
+
+    def __getstate__(self):
+        # Кэш сверток не передается в дочерние процессы: он пересчитывается по требованию
+        return (self.blocks, [self.labels[dimension] for dimension in self.dimensions], self.keys, self.counts)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @property
+    def num_rows(self):
+        """Число строк плана в кубе"""
+        return int(self.counts.sum())
+
+    def axis(self, dimension):
+        """Номер измерения по имени столбца"""
+        try:
+            return self.dimensions.index(dimension)
+        except ValueError:
+            raise ValueError(f"Нет измерения '{dimension}', доступны: {', '.join(self.dimensions)}") from None
+
+    def label_position(self, dimension, label):
+        """Номер значения измерения по подписи"""
+        index = self._label_index.get(dimension)
+        if index is None:
+            self.axis(dimension)
+            index = self._label_index[dimension] = {value: position for position, value
+                                                    in enumerate(self.labels[dimension])}
+        try:
+            return index[label]
+        except KeyError:
+            raise ValueError(f"Нет значения '{label}' в измерении '{dimension}', "
+                             f"доступны: {', '.join(map(str, self.labels[dimension]))}") from None
+
+    def _codes(self, axis):
+        """Коды значений измерения для каждой ячейки куба (вычисляются один раз)"""
+        codes = self._axis_codes.get(axis)
+        if codes is None:
+            stride = int(np.prod(self.shape[axis + 1:], dtype=np.int64))
+            codes = self._axis_codes[axis] = (self.keys // stride) % self.shape[axis]
+        return codes
+
+    def rollup(self, *dimensions):
+        """Счетчики по выбранным измерениям (остальные свернуты): массив формы их размеров
+
+        Результат кэшируется и доступен только для чтения.
+        """
+        axes = tuple(self.axis(dimension) for dimension in dimensions)
+        result = self._rollups.get(axes)
+        if result is None:
+            shape = tuple(self.shape[axis] for axis in axes)
+            if axes:
+                flat = np.ravel_multi_index([self._codes(axis) for axis in axes], shape)
+                result = np.bincount(flat, weights=self.counts, minlength=int(np.prod(shape))).astype(np.int64)
+                result = result.reshape(shape)
+            else:
+                result = np.array(self.counts.sum(), dtype=np.int64)
+            result.setflags(write=False)
+            self._rollups[axes] = result
+        return result
+
+    def count(self, **where):
+        """Число строк с заданными значениями измерений, например count(План='Доп_1', ДВ='ДВ на проверке')"""
+        positions = tuple(self.label_position(dimension, label) for dimension, label in where.items())
+        return int(self.rollup(*where)[positions])
+
+    def breakdown(self, dimension, by=None, where=None):
+        """Срез куба: счетчики по dimension (Series) или dimension x by (DataFrame) при значениях where"""
+        where = where or {}
+        dimensions = list(where) + [dimension] + ([by] if by is not None else [])
+        positions = tuple(self.label_position(name, label) for name, label in where.items())
+        values = self.rollup(*dimensions)[positions]
+        if by is None:
+            return pd.Series(values, index=pd.Index(self.labels[dimension], name=dimension), name='Количество')
+        return pd.DataFrame(values, index=pd.Index(self.labels[dimension], name=dimension),
+                            columns=pd.Index(self.labels[by], name=by))
+
+    def merge(self, other):
+        """Куб по строкам обоих кубов (для накопления по частям в потоковом режиме)"""
+        if self.blocks != other.blocks:
+            raise ValueError("Кубы построены по разным блокам сводной таблицы")
+        subdivisions = sorted(set(self.labels['ПО_Общества']) | set(other.labels['ПО_Общества']))
+        position = {label: index for index, label in enumerate(subdivisions)}
+        shape = (len(subdivisions),) + self.shape[1:]
+        keys = []
+        for cube in (self, other):
+            # Переводим номера подразделений каждого куба в общую нумерацию
+            remap = np.array([position[label] for label in cube.labels['ПО_Общества']], dtype=np.int64)
+            codes = list(np.unravel_index(cube.keys, cube.shape))
+            codes[0] = remap[codes[0]]
+            keys.append(np.ravel_multi_index(codes, shape))
+        keys, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([self.counts, other.counts])).astype(np.int64)
+        labels = [subdivisions] + [self.labels[dimension] for dimension in self.dimensions[1:]]
+        return CountCube(self.blocks, labels, keys, counts)
+
+    def report_model(self):
+        """Модель отчета из сверток ПО_Общества x столбец блока (свертки остаются в кэше куба)"""
+        offsets, width = pivot_slot_offsets(self.blocks)
+        counts = np.zeros((self.shape[0], width), dtype=np.int64)
+        counts[:, 0] = self.rollup('ПО_Общества')
+        for (column, labels), offset in zip(self.blocks, offsets):
+            # Слоты блока: категории отчета и прочие значения, пустые ячейки не учитываются
+            counts[:, offset:offset + len(labels) + 1] = self.rollup('ПО_Общества', column)[:, :len(labels) + 1]
+        po_labels = np.array(self.labels['ПО_Общества'], dtype=object)
+        return _build_report_model(po_labels, counts, self.blocks, offsets, cube=self)
+
+def _build_report_model(po_labels, counts, blocks, offsets, cube=None):
+    """Формирует модель отчета из матрицы счетчиков по подразделениям и слотам"""
+    # Подразделение попадает в блок, если у него есть хотя бы одно непустое значение столбца
+    presence = [counts[:, offset:offset + len(labels) + 1].sum(axis=1) > 0
+                for (column, labels), offset in zip(blocks, offsets)]
+
+    # Порядок строк как у pd.concat(sort=False): подразделения первого блока,
+    # затем новые подразделения следующих блоков
+    order = []
+    seen = np.zeros(len(po_labels), dtype=bool)
+    for present in presence:
+        order.extend(np.flatnonzero(present & ~seen))
+        seen |= present
+    order = np.asarray(order, dtype=np.intp)
+
+    columns = ['Кол-во объектов']
+    values = [counts[order, 0]]
+    for (column, labels), offset, present in zip(blocks, offsets, presence):
+        row_present = present[order]
+        for position, label in enumerate(labels):
+            column_counts = counts[order, offset + position]
+            if counts[:, offset + position].sum() == 0:
+                # Категория не встречается в данных: столбец заполняется нулями
+                column_values = np.zeros(len(order), dtype=np.int64)
+            elif not row_present.all():
+                # Подразделения без значений в блоке получают NaN
+                column_values = column_counts.astype(np.float64)
+                column_values[~row_present] = np.nan
+            else:
+                column_values = column_counts
+            columns.append(label)
+            values.append(column_values)
+
+    # Как и при добавлении итоговой строки через pd.concat, наличие хотя бы одного
+    # NaN переводит все числовые столбцы в float64: np.column_stack приводит тип сам
+    matrix = np.column_stack(values)
+    return ReportModel(list(po_labels[order]), columns, matrix, np.nansum(matrix, axis=0), cube)
+
+def _aggregate_pivot_crosstab(df, blocks):
+    """Прежняя схема построения сводной таблицы через pd.crosstab (эталон для проверок и замеров)"""
+    result = pd.concat([pd.crosstab(df['ПО_Общества'], df[column]) for column, _ in blocks],
+                       axis=1, sort=False)
+
+    required_columns = [label for _, labels in blocks for label in labels]
+    for col in required_columns:
+        if col not in result.columns:
+            result[col] = 0
+
+    result = result.reset_index()
+    count_series = df.groupby('ПО_Общества').size().reset_index(name='Кол-во объектов')
+    result = result.merge(count_series, on='ПО_Общества', how='left')
+    result = result[['ПО_Общества', 'Кол-во объектов'] + required_columns]
+
+    total_row = result.sum(numeric_only=True)
+    total_row['ПО_Общества'] = 'Общий итог'
+    return pd.concat([result, pd.DataFrame([total_row])], ignore_index=True, sort=False)
+
+def make_synthetic_plan_rows(source, num_rows, num_subdivisions=40, seed=0, raw=False):
+    """Синтетические строки плана для замеров (нормализованные или с исходными кодами)"""
+    rng = np.random.default_rng(seed)
+    data = {'ПО_Общества': rng.choice([f'ПО {i:03d}' for i in range(num_subdivisions)], num_rows)}
+    for column, mapping in VALUE_REPLACEMENTS[source].items():
+        labels = list(mapping) if raw else list(dict.fromkeys(mapping.values()))
+        # Кроме категорий отчета добавляем пропуски и неизвестное значение
+        choices = np.array(labels + ['Прочее'], dtype=object)
+        values = choices[rng.integers(0, len(choices), num_rows)]
+        values[rng.random(num_rows) < 0.05] = None
+        data[column] = values
+    return pd.DataFrame(data)
+
+def benchmark_aggregation(source='kr', sizes=(10_000, 100_000, 1_000_000), repeats=3):
+    """Сравнение времени построения сводной таблицы через crosstab и одним проходом"""
+    blocks = pivot_blocks(source)
+    for num_rows in sizes:
+        df = make_synthetic_plan_rows(source, num_rows)
+        timings = {}
+        frames = {}
+        for name, aggregate in [('crosstab', _aggregate_pivot_crosstab), ('aggregate_pivot', aggregate_pivot)]:
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                frames[name] = aggregate(df, blocks)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+
+        same = frames['crosstab'].equals(frames['aggregate_pivot'])
+        per_million = timings['aggregate_pivot'] / num_rows * 1_000_000
+        print(f"Строк: {num_rows:>9}  crosstab: {timings['crosstab']:.3f} с  "
+              f"aggregate_pivot: {timings['aggregate_pivot']:.3f} с ({per_million:.2f} с на 1 млн строк)  "
+              f"ускорение: {timings['crosstab'] / max(timings['aggregate_pivot'], 1e-9):.1f}x  "
+              f"совпадает: {'да' if same else 'НЕТ'}")
+
+def benchmark_cube(source='kr', sizes=(10_000, 100_000, 1_000_000), repeats=3):
+    """Построение куба счетчиков, свертки по одному и двум измерениям и срез против фильтра по строкам"""
+    blocks = pivot_blocks(source)
+    for num_rows in sizes:
+        df = make_synthetic_plan_rows(source, num_rows)
+        build = None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            cube = build_count_cube(df, blocks)
+            elapsed = time.perf_counter() - start
+            build = elapsed if build is None else min(build, elapsed)
+
+        # Все срезы по одному и двум измерениям: первый вызов считает свертку, повторный берет ее из кэша
+        pairs = [(dimension,) for dimension in cube.dimensions]
+        pairs += [(first, second) for index, first in enumerate(cube.dimensions) for second in cube.dimensions[index + 1:]]
+        start = time.perf_counter()
+        for dimensions in pairs:
+            cube.rollup(*dimensions)
+        cold = (time.perf_counter() - start) / len(pairs)
+        start = time.perf_counter()
+        for dimensions in pairs:
+            cube.rollup(*dimensions)
+        warm = (time.perf_counter() - start) / len(pairs)
+
+        # Статусы ДВ внутри плана Доп_1: фильтр по строкам против готовой свертки
+        start = time.perf_counter()
+        expected = df.loc[df['План'] == 'Доп_1', 'ДВ'].value_counts()
+        by_rows = time.perf_counter() - start
+        start = time.perf_counter()
+        result = cube.breakdown('ДВ', where={'План': 'Доп_1'})
+        by_cube = time.perf_counter() - start
+        same = all(result[label] == expected.get(label, 0) for label in dict(blocks)['ДВ'])
+
+        print(f"Строк: {num_rows:>9}  ячеек куба: {len(cube.keys):>8}  построение: {build:.3f} с  "
+              f"свертка ({len(pairs)} срезов): {cold * 1000:.2f} мс, из кэша: {warm * 1e6:.1f} мкс  "
+              f"ДВ в Доп_1: строки {by_rows * 1000:.2f} мс, куб {by_cube * 1000:.2f} мс  "
+              f"совпадает: {'да' if same else 'НЕТ'}")
+
+def benchmark_query(source='kr', sizes=(10_000, 100_000, 1_000_000), repeats=3):
+    """Отбор строк по трем условиям: маски pandas по строкам против битовых карт индекса"""
+    where = {'ПО_Общества': 'ПО 001', 'КП': 'КП на проверке'}
+    exclude = {'МТР': 'ЕСТЬ замечания к МТР'} if source == 'kr' else {'ДВ': 'ДВ отсутствует'}
+    for num_rows in sizes:
+        df = make_synthetic_plan_rows(source, num_rows)
+        start = time.perf_counter()
+        index = build_plan_index(df, source)
+        build = time.perf_counter() - start
+
+        timings = {}
+        for name in ('pandas', 'bitmap', 'count'):
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                if name == 'pandas':
+                    mask = (df['ПО_Общества'] == where['ПО_Общества']) & (df['КП'] == where['КП'])
+                    for column, value in exclude.items():
+                        mask &= df[column] != value
+                    expected = np.flatnonzero(mask.to_numpy())
+                elif name == 'bitmap':
+                    found = index.positions(where, exclude)
+                else:
+                    count = index.count(where, exclude)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+
+        same = np.array_equal(expected, found) and count == len(expected)
+        print(f"Строк: {num_rows:>9}  индекс: {build:.3f} с  маски pandas: {timings['pandas'] * 1000:.2f} мс  "
+              f"битовые карты: {timings['bitmap'] * 1000:.2f} мс (только число: {timings['count'] * 1000:.2f} мс)  "
+              f"найдено: {count}  совпадает: {'да' if same else 'НЕТ'}")
+
+def benchmark_normalization(source='kr', sizes=(10_000, 100_000, 1_000_000), repeats=3):
+    """Сравнение времени нормализации цепочкой Series.replace и через таблицы кодов"""
+    replacements = VALUE_REPLACEMENTS[source]
+    for num_rows in sizes:
+        raw_df = make_synthetic_plan_rows(source, num_rows, raw=True)
+        timings = {}
+        frames = {}
+        for name, normalize in [('Series.replace', _normalize_plan_values_replace),
+                                ('normalize_plan_values', normalize_plan_values)]:
+            best = None
+            for _ in range(repeats):
+                df = raw_df.copy()
+                start = time.perf_counter()
+                frames[name] = normalize(df, replacements)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+
+        same = all(frames['Series.replace'][column].astype(object).equals(
+                       frames['normalize_plan_values'][column].astype(object))
+                   for column in replacements)
+        print(f"Строк: {num_rows:>9}  Series.replace: {timings['Series.replace']:.3f} с  "
+              f"normalize_plan_values: {timings['normalize_plan_values']:.3f} с  "
+              f"доля: {timings['normalize_plan_values'] / max(timings['Series.replace'], 1e-9):.0%}  "
+              f"совпадает: {'да' if same else 'НЕТ'}")
+
+def aggregate_plan_streaming(source, file_path=None, chunk_size=None):
+    """Агрегация строк плана по частям: память ограничена размером части, а не всего листа"""
+    if file_path is None:
+        file_path = source_file_path(source)
+    if chunk_size is None:
+        chunk_size = RUN_SETTINGS['chunk_size']
+    short_name = SOURCE_TITLES[source][0]
+    replacements = VALUE_REPLACEMENTS[source]
+
+    blocks = pivot_blocks(source)
+    cube = None
+    unmapped = {}
+    extent = None
+    for chunk in iter_sheet_chunks(file_path, **SHEET_CONFIGS[source],
+                                   empty_run_limit=RUN_SETTINGS['empty_run_limit'],
+                                   key_column='ПО_Общества', chunk_size=chunk_size):
+        extent = chunk.attrs['extent']
+        chunk = normalize_plan_values(chunk.dropna(subset=['ПО_Общества']), replacements)
+        # Счетчики части сворачиваются в куб, строки части после этого не нужны
+        chunk_cube = build_count_cube(chunk, blocks)
+        cube = chunk_cube if cube is None else cube.merge(chunk_cube)
+        for column, stray in find_unmapped_values(chunk, replacements).items():
+            column_unmapped = unmapped.setdefault(column, {})
+            for raw, count in stray.items():
+                column_unmapped[raw] = column_unmapped.get(raw, 0) + count
+
+    if cube is None:
+        cube = build_count_cube(pd.DataFrame(columns=SHEET_CONFIGS[source]['names']), blocks)
+    describe_data_extent(extent, cube.num_rows, short_name)
+    print_unmapped_values(unmapped, short_name)
+    return cube.report_model()
+
+def write_synthetic_plan_workbook(source, file_path, num_rows, num_subdivisions=40, seed=0):
+    """Запись синтетической книги плана с исходными кодами в структуре реального листа"""
+    from openpyxl import Workbook
+
+    config = SHEET_CONFIGS[source]
+    col_indexes = sorted(column_letters_to_index(letter) for letter in config['usecols'].split(','))
+    rng = np.random.default_rng(seed)
+    subdivisions = [f'ПО {i:03d}' for i in range(num_subdivisions)]
+    choices_by_name = {'ПО_Общества': subdivisions}
+    for column, mapping in VALUE_REPLACEMENTS[source].items():
+        choices_by_name[column] = list(mapping) + [None]
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(config['sheet_name'])
+    for row_number in range(config['skiprows']):
+        sheet.append([f'Шапка {row_number + 1}'])
+    header = [None] * (col_indexes[-1] + 1)
+    for col_index, name in zip(col_indexes, config['names']):
+        header[col_index] = name
+    sheet.append(header)
+
+    picks = {name: rng.integers(0, len(values), num_rows) for name, values in choices_by_name.items()}
+    for row_index in range(num_rows):
+        row = [None] * (col_indexes[-1] + 1)
+        for col_index, name in zip(col_indexes, config['names']):
+            row[col_index] = choices_by_name[name][picks[name][row_index]]
+        sheet.append(row)
+    workbook.save(file_path)
+
+def _peak_rss_mb():
+    """Пиковый объем резидентной памяти текущего процесса в МБ (None, если недоступно)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _measure_aggregation(source, file_path, streaming, chunk_size):
+    """Агрегация в отдельном процессе с замером времени и пиковой памяти"""
+    RUN_SETTINGS['chunk_size'] = chunk_size
+    start = time.perf_counter()
+    if streaming:
+        result = aggregate_plan_streaming(source, file_path)
+    else:
+        df = read_sheet_columns(file_path, **SHEET_CONFIGS[source],
+                                empty_run_limit=RUN_SETTINGS['empty_run_limit'],
+                                key_column='ПО_Общества').dropna(subset=['ПО_Общества'])
+        result = aggregate_report(normalize_plan_values(df, VALUE_REPLACEMENTS[source]), pivot_blocks(source))
+    return result, time.perf_counter() - start, _peak_rss_mb()
+
+def benchmark_streaming(source='kr', num_rows=200_000, chunk_size=None, memory_budget_mb=None):
+    """Сравнение потоковой агрегации с загрузкой всего листа: время, пиковая память, совпадение
+
+    Каждый вариант выполняется в новом процессе, чтобы пиковая память не
+    включала предыдущие замеры. Возвращает False, если пиковая память
+    потокового режима превысила memory_budget_mb.
+    """
+    if chunk_size is None:
+        chunk_size = RUN_SETTINGS['chunk_size']
+    context = multiprocessing.get_context('spawn')
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = os.path.join(temp_dir, f'synthetic_{source}.xlsx')
+        start = time.perf_counter()
+        write_synthetic_plan_workbook(source, file_path, num_rows)
+        print(f"Синтетическая книга: {num_rows} строк, {os.path.getsize(file_path) / 1024 / 1024:.1f} МБ "
+              f"(создана за {time.perf_counter() - start:.1f} с)")
+
+        results = {}
+        for streaming in (True, False):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results[streaming] = executor.submit(_measure_aggregation, source, file_path,
+                                                     streaming, chunk_size).result()
+            _, elapsed, peak = results[streaming]
+            mode = f"потоковый (части по {chunk_size})" if streaming else "весь лист в памяти"
+            peak_text = f"{peak:.0f} МБ" if peak is not None else "недоступно"
+            print(f"{mode:<32} время: {elapsed:.2f} с, пиковая память процесса: {peak_text}")
+
+    same = results[True][0].equals(results[False][0])
+    print(f"Результаты совпадают: {'да' if same else 'НЕТ'}")
+
+    streaming_peak = results[True][2]
+    within_budget = memory_budget_mb is None or streaming_peak is None or streaming_peak <= memory_budget_mb
+    if memory_budget_mb is not None:
+        print(f"Бюджет памяти {memory_budget_mb} МБ: {'соблюден' if within_budget else 'ПРЕВЫШЕН'}")
+    return same and within_budget
+
+def source_cube(source):
+    """Куб счетчиков источника по нормализованным строкам (в потоковом режиме - накопленный по частям)"""
+    if RUN_SETTINGS['streaming']:
+        return aggregate_plan_streaming(source).cube
+    return build_count_cube(load_plan_data(source), pivot_blocks(source))
+
+def print_breakdown(source, dimension, by=None, where=None):
+    """Вывод среза куба счетчиков источника по одному или двум измерениям"""
+    cube = source_cube(source)
+    try:
+        result = cube.breakdown(dimension, by, where)
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return False
+    conditions = ', '.join(f"{name} = {label}" for name, label in (where or {}).items())
+    print(f"{SOURCE_TITLES[source][0]}: {dimension}" + (f" x {by}" if by else '')
+          + (f" при {conditions}" if conditions else '') + f" (строк в кубе: {cube.num_rows})")
+    print(result.to_string())
+    return True
+
+# Число единичных битов в каждом возможном байте битовой карты
+BITMAP_POPCOUNT = None
+
+class PlanIndex:
+    """Строки плана источника с битовыми картами по значениям ПО_Общества и столбцов статусов
+
+    bitmaps[столбец][значение] - упакованная битовая карта строк (np.packbits): бит строки
+    установлен, если в ней это значение. Значения столбцов - подписи отчета, а также
+    CUBE_EXTRA_LABELS для значений вне таблицы замен и пустых ячеек. Условия по разным
+    столбцам объединяются через И, несколько значений одного столбца - через ИЛИ.
+    """
+    __slots__ = ('source', 'rows', 'excel_rows', 'labels', 'bitmaps', 'all_rows')
+
+    def __init__(self, source, rows, excel_rows, labels, bitmaps):
+        self.source = source
+        self.rows = rows
+        self.excel_rows = excel_rows
+        self.labels = labels
+        self.bitmaps = bitmaps
+        self.all_rows = np.packbits(np.ones(len(rows), dtype=bool))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _value_bitmap(self, column, values):
+        """Объединение (ИЛИ) битовых карт значений столбца"""
+        if column not in self.bitmaps:
+            raise ValueError(f"Нет столбца '{column}', доступны: {', '.join(self.bitmaps)}")
+        if isinstance(values, str):
+            values = [values]
+        result = np.zeros_like(self.all_rows)
+        for value in values:
+            bitmap = self.bitmaps[column].get(value)
+            if bitmap is None:
+                raise ValueError(f"Нет значения '{value}' в столбце '{column}', "
+                                 f"доступны: {', '.join(map(str, self.labels[column]))}")
+            result |= bitmap
+        return result
+
+    def bitmap(self, where=None, exclude=None):
+        """Битовая карта строк, удовлетворяющих всем условиям where и ни одному из exclude
+
+        where и exclude - словари {столбец: значение или список значений}.
+        """
+        result = self.all_rows.copy()
+        for column, values in (where or {}).items():
+            result &= self._value_bitmap(column, values)
+        for column, values in (exclude or {}).items():
+            result &= ~self._value_bitmap(column, values)
+        # Инверсия устанавливает и биты дополнения последнего байта
+        return result & self.all_rows
+
+    def count(self, where=None, exclude=None):
+        """Число строк, удовлетворяющих условиям"""
+        global BITMAP_POPCOUNT
+        if BITMAP_POPCOUNT is None:
+            BITMAP_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+        return int(BITMAP_POPCOUNT[self.bitmap(where, exclude)].sum())
+
+    def positions(self, where=None, exclude=None):
+        """Номера подходящих строк (позиции в rows)"""
+        return np.flatnonzero(np.unpackbits(self.bitmap(where, exclude), count=len(self.rows)))
+
+    def select(self, where=None, exclude=None):
+        """Подходящие строки с номером строки листа Excel в первом столбце"""
+        positions = self.positions(where, exclude)
+        result = self.rows.iloc[positions].astype(object)
+        result.insert(0, 'Строка Excel', self.excel_rows[positions])
+        return result.reset_index(drop=True)
+
+def build_plan_index(df, source):
+    """Индекс строк плана: битовые карты по каждому значению ПО_Общества и столбцов блоков"""
+    codes, labels = cube_dimension_codes(df, pivot_blocks(source))
+    columns = ['ПО_Общества'] + [column for column, _ in pivot_blocks(source)]
+    bitmaps = {}
+    for column, column_codes, column_labels in zip(columns, codes, labels):
+        bitmaps[column] = {label: np.packbits(column_codes == code) for code, label in enumerate(column_labels)}
+    # Индекс строк совпадает с порядком строк данных листа
+    excel_rows = df.index.to_numpy() + SHEET_CONFIGS[source]['skiprows'] + 2
+    return PlanIndex(source, df[SHEET_CONFIGS[source]['names']], excel_rows, dict(zip(columns, labels)), bitmaps)
+
+def parse_conditions(conditions):
+    """Условия вида 'Столбец=Значение' в словарь {столбец: [значения]}"""
+    result = {}
+    for condition in conditions:
+        if '=' not in condition:
+            raise ValueError(f"Условие '{condition}' должно иметь вид СТОЛБЕЦ=ЗНАЧЕНИЕ")
+        column, value = condition.split('=', 1)
+        result.setdefault(column.strip(), []).append(value.strip())
+    return result
+
+def parse_breakdown_conditions(conditions):
+    """Условия среза куба в словарь {столбец: значение}: срез берется по одному значению столбца"""
+    where = {}
+    for column, values in parse_conditions(conditions).items():
+        if len(values) > 1:
+            raise ValueError(f"Для столбца '{column}' задано несколько значений ({', '.join(values)}): "
+                             f"срез куба строится по одному значению")
+        where[column] = values[0]
+    return where
+
+def run_query(source, where=None, exclude=None, limit=20, export_path=None, count_only=False):
+    """Отбор строк плана по условиям: число строк, первые limit строк и выгрузка в CSV или XLSX"""
+    index = build_plan_index(load_plan_data(source), source)
+    try:
+        start = time.perf_counter()
+        count = index.count(where, exclude)
+        elapsed = time.perf_counter() - start
+    except ValueError as e:
+        print(f"Ошибка: {e}")
+        return False
+    conditions = [f"{column} = {' или '.join(values)}" for column, values in (where or {}).items()]
+    conditions += [f"{column} кроме {', '.join(values)}" for column, values in (exclude or {}).items()]
+    print(f"{SOURCE_TITLES[source][0]}: найдено строк {count} из {len(index)} за {elapsed * 1e6:.0f} мкс"
+          + (f" ({'; '.join(conditions)})" if conditions else ''))
+    if count_only and not export_path:
+        return True
+
+    rows = index.select(where, exclude)
+    if limit and not count_only:
+        print(rows.head(limit).to_string(index=False))
+        if len(rows) > limit:
+            print(f"... показаны первые {limit} строк")
+    if export_path:
+        if export_path.lower().endswith('.xlsx'):
+            rows.to_excel(export_path, index=False)
+        else:
+            # Кодировка с BOM, чтобы Excel правильно открыл кириллицу
+            rows.to_csv(export_path, index=False, encoding='utf-8-sig', sep=';')
+        print(f"Строки выгружены: {export_path}")
+    return True
+
+def generate_kr_report():
+    """Генерация отчета по капитальному ремонту"""
+    
+    if RUN_SETTINGS['streaming']:
+        # Потоковая агрегация частями без загрузки всего листа в память
+        return aggregate_plan_streaming('kr')
+
+    # Читаем и нормализуем данные (при неизменном файле - из кэша)
+    df = load_plan_data('kr')
+
+    # Строим модель отчета за один проход по кодам категорий
+    return aggregate_report(df, pivot_blocks('kr'))
+
+def generate_totr_report():
+    """Генерация отчета по техническому обслуживанию и текущему ремонту"""
+    
+    if RUN_SETTINGS['streaming']:
+        # Потоковая агрегация частями без загрузки всего листа в память
+        return aggregate_plan_streaming('totr')
+
+    # Читаем и нормализуем данные (при неизменном файле - из кэша)
+    df = load_plan_data('totr')
+
+    # Строим модель отчета за один проход по кодам категорий
+    return aggregate_report(df, pivot_blocks('totr'))
+
+# [Остальные функции остаются без изменений - create_doughnut_chart_matplotlib, create_status_doughnut_chart, 
+# create_status_bar_chart, create_docx_report, set_cell_shading, create_table_with_chart, create_table_without_chart]
+
+def configure_matplotlib(config_dir=None):
+    """Каталог настроек и кэша шрифтов matplotlib (MPLCONFIGDIR), задается до первого импорта
+
+    Переменная окружения наследуется процессами отрисовки, поэтому заранее собранный
+    кэш шрифтов используется и в пуле.
+    """
+    config_dir = config_dir or RUN_SETTINGS['matplotlib_config_dir']
+    if config_dir:
+        os.makedirs(config_dir, exist_ok=True)
+        os.environ['MPLCONFIGDIR'] = os.path.abspath(config_dir)
+
+def _pyplot():
+    """matplotlib.pyplot с неинтерактивным бэкендом Agg (загружается при первой отрисовке)"""
+    if 'matplotlib.pyplot' not in sys.modules:
+        configure_matplotlib()
+        import matplotlib
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+def build_font_cache(config_dir=None):
+    """Заранее строит кэш шрифтов matplotlib, например при сборке образа контейнера"""
+    configure_matplotlib(config_dir)
+    start = time.perf_counter()
+    import matplotlib
+    import matplotlib.font_manager
+    print(f"Кэш шрифтов matplotlib: {matplotlib.get_cachedir()} (готов за {time.perf_counter() - start:.2f} с)")
+
+class DoughnutChartRenderer:
+    """Кольцевая диаграмма с постоянной геометрией фигуры
+
+    Фигура, сектора, подписи процентов, центральный текст и легенда создаются один раз;
+    для каждой диаграммы меняются только углы и цвета секторов и тексты. Разметка
+    (tight_layout) считается при создании по текстам-заполнителям, поэтому зависит только
+    от вида диаграммы, числа секторов, размера и DPI фигуры, а не от того, какая диаграмма
+    отрисована первой. Фигура рисуется сразу на холст Agg, без pyplot и без второго прохода
+    bbox_inches='tight'.
+    """
+
+    def __init__(self, num_wedges, figsize=(5.0, 5.5), dpi=150, pct_fontsize=10, legend_fontsize=10, legend_ncol=1):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        self.figure = Figure(figsize=figsize, dpi=dpi, facecolor='#f8f9fa', edgecolor='none')
+        self.canvas = FigureCanvasAgg(self.figure)
+        ax = self.figure.add_subplot()
+        self.wedges, _, self.autotexts = ax.pie([1] * num_wedges, labels=None, autopct='%1.1f%%',
+                                                startangle=90, radius=1.3,
+                                                wedgeprops=dict(width=0.7, edgecolor='w', linewidth=2),
+                                                pctdistance=0.75)
+        for autotext in self.autotexts:
+            autotext.set_color('#2c3e50')
+            autotext.set_fontweight('bold')
+            autotext.set_fontsize(pct_fontsize)
+        self.total_text = ax.text(0, 0, '', ha='center', va='center', fontsize=16, fontweight='bold', color='#2c3e50')
+        ax.text(0, -0.2, 'объектов', ha='center', va='center', fontsize=14, color='#2c3e50')
+        self.title = ax.set_title('', fontsize=12, fontweight='bold', pad=15)
+        self.legend = ax.legend(self.wedges, [''] * num_wedges, loc='upper center', bbox_to_anchor=(0.5, 0.0),
+                                ncol=legend_ncol, fontsize=legend_fontsize)
+        self.legend_handles = getattr(self.legend, 'legend_handles', None) or self.legend.legendHandles
+        self.legend_fontsize = legend_fontsize
+        ax.axis('equal')
+        # Высота заголовка и легенды зависит только от шрифта и числа строк легенды,
+        # ширина длинных текстов подгоняется при отрисовке (_fit_text_width)
+        self.title.set_text(CHART_LAYOUT_PLACEHOLDER)
+        for text in self.legend.get_texts():
+            text.set_text(CHART_LAYOUT_PLACEHOLDER)
+        self.figure.tight_layout()
+
+    def render(self, labels, sizes, chart_title, colors, chart_format='png'):
+        """Отрисовка диаграммы с новыми значениями, возвращает PNG или SVG в буфере памяти"""
+        total = sum(sizes)
+        fractions = np.asarray(sizes, dtype=float)
+        if fractions.sum() == 0:
+            raise ValueError('All wedge sizes are zero')
+        fractions = fractions / fractions.sum()
+
+        # Углы и положение подписей - как в Axes.pie: от 90 градусов против часовой стрелки
+        theta1 = 90 / 360
+        for index, (wedge, autotext, fraction) in enumerate(zip(self.wedges, self.autotexts, fractions)):
+            theta2 = theta1 + fraction
+            wedge.set_theta1(360 * theta1)
+            wedge.set_theta2(360 * theta2)
+            wedge.set_facecolor(colors[index % len(colors)])
+            self.legend_handles[index].set_facecolor(colors[index % len(colors)])
+            thetam = np.pi * (theta1 + theta2)
+            autotext.set_position((0.75 * 1.3 * np.cos(thetam), 0.75 * 1.3 * np.sin(thetam)))
+            autotext.set_text('%1.1f%%' % (100 * fraction))
+            theta1 = theta2
+
+        self.total_text.set_text(f'{total}')
+        self.title.set_text(chart_title)
+        for text, label, size in zip(self.legend.get_texts(), labels, sizes):
+            text.set_text(f'{label}: {size}')
+
+        # Ширина фигуры постоянная: длинный заголовок или легенда уменьшаются, а не обрезаются
+        renderer = self.canvas.get_renderer()
+        max_width = self.figure.bbox.width * 0.96
+        _fit_text_width(self.title, [self.title], 12, max_width, renderer)
+        _fit_text_width(self.legend, self.legend.get_texts(), self.legend_fontsize, max_width, renderer)
+        return _print_chart(self.canvas, chart_format)
+
+class BarChartRenderer:
+    """Горизонтальная столбчатая диаграмма статусов с постоянной геометрией фигуры
+
+    Столбцы, подписи значений и рамка с итогом создаются один раз; для каждой диаграммы
+    меняются ширины и цвета столбцов, подписи оси Y и тексты, пределы оси X пересчитываются.
+    Поля фигуры считаются при создании по заполнителям: слева - под подпись оси Y шириной
+    BAR_LABEL_PLACEHOLDER (более длинные подписи уменьшаются), справа - под подпись
+    семизначного значения.
+    """
+
+    LABEL_FONTSIZE = 11
+
+    def __init__(self, num_bars, figsize=(10, 6), dpi=150):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        self.figure = Figure(figsize=figsize, dpi=dpi, facecolor='#f8f9fa', edgecolor='none')
+        self.canvas = FigureCanvasAgg(self.figure)
+        ax = self.axes = self.figure.add_subplot()
+        y_pos = range(num_bars)
+        self.bars = ax.barh(y_pos, [1] * num_bars, edgecolor='white', linewidth=1.5, height=0.7)
+        self.value_texts = [ax.text(0, bar.get_y() + bar.get_height() / 2, '', ha='left', va='center',
+                                    fontsize=11, fontweight='bold')
+                            for bar in self.bars]
+        self.title = ax.set_title('', fontsize=14, fontweight='bold', pad=20)
+        ax.set_xlabel('Количество объектов', fontsize=12)
+        ax.set_yticks(y_pos)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['left'].set_color('#d3d3d3')
+        ax.spines['bottom'].set_color('#d3d3d3')
+        ax.grid(axis='x', alpha=0.3, linestyle='--')
+        self.total_text = ax.text(0.98, 0.02, '', transform=ax.transAxes, ha='right', va='bottom',
+                                  fontsize=12, fontweight='bold',
+                                  bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+        self.title.set_text(CHART_LAYOUT_PLACEHOLDER)
+        ax.set_yticklabels([BAR_LABEL_PLACEHOLDER] * num_bars, fontsize=self.LABEL_FONTSIZE)
+        for text in self.value_texts:
+            # Подпись наибольшего значения стоит у правого края столбца, как при отрисовке
+            text.set_x(1.01)
+            text.set_text('0000000 (100.0%)')
+        self.figure.tight_layout()
+        renderer = self.canvas.get_renderer()
+        self.label_width = max(label.get_window_extent(renderer).width for label in ax.get_yticklabels())
+
+    def render(self, labels, sizes, chart_title, colors, chart_format='png'):
+        """Отрисовка диаграммы с новыми значениями, возвращает PNG или SVG в буфере памяти"""
+        sizes = [float(size) for size in sizes]
+
+        # Сортируем по возрастанию: наибольшее значение оказывается вверху
+        sorted_indices = sorted(range(len(sizes)), key=lambda i: sizes[i])
+        sorted_sizes = [sizes[i] for i in sorted_indices]
+        total = sum(sorted_sizes)
+        percentages = [f'({size/total*100:.1f}%)' if total > 0 else '(0%)' for size in sorted_sizes]
+
+        offset = max(sorted_sizes) * 0.01
+        for bar, text, index, size, percentage in zip(self.bars, self.value_texts, sorted_indices,
+                                                      sorted_sizes, percentages):
+            bar.set_width(size)
+            bar.set_facecolor(colors[index])
+            text.set_x(size + offset)
+            text.set_text(f'{int(size)} {percentage}')
+
+        ax = self.axes
+        tick_labels = ax.set_yticklabels([labels[i] for i in sorted_indices], fontsize=self.LABEL_FONTSIZE)
+        ax.relim()
+        ax.autoscale_view(scaley=False)
+        self.title.set_text(chart_title)
+        self.total_text.set_text(f'Всего объектов: {int(total)}')
+
+        # Геометрия осей постоянная: подписи шире отведенного поля и длинный заголовок уменьшаются
+        renderer = self.canvas.get_renderer()
+        for label in tick_labels:
+            _fit_text_width(label, [label], self.LABEL_FONTSIZE, self.label_width, renderer)
+        # Заголовок центрирован над осями: доступна удвоенная ширина до ближайшего края фигуры
+        axes_center = (ax.bbox.x0 + ax.bbox.x1) / 2
+        title_width = 2 * min(axes_center, self.figure.bbox.width - axes_center) * 0.96
+        _fit_text_width(self.title, [self.title], 14, title_width, renderer)
+        return _print_chart(self.canvas, chart_format)
+
+# Заполнители, по которым при создании отрисовщика рассчитываются поля фигуры
+CHART_LAYOUT_PLACEHOLDER = 'Заполнитель'
+BAR_LABEL_PLACEHOLDER = 'Объект предлагается к исключению'
+
+def _fit_text_width(artist, texts, fontsize, max_width, renderer):
+    """Уменьшение шрифта текстов, пока элемент диаграммы не уместится по ширине фигуры"""
+    for text in texts:
+        text.set_fontsize(fontsize)
+    for _ in range(3):
+        width = artist.get_window_extent(renderer).width
+        if width <= max_width:
+            break
+        fontsize *= max_width / width
+        for text in texts:
+            text.set_fontsize(fontsize)
+
+def _print_chart(canvas, chart_format='png'):
+    """Запись фигуры в буфер памяти за один проход, без bbox_inches='tight'
+
+    PNG рисуется прямо на холст Agg. SVG пишется без даты и с постоянной солью
+    идентификаторов, чтобы одинаковая диаграмма давала одинаковые байты.
+    """
+    buffer = io.BytesIO()
+    if chart_format == 'svg':
+        import matplotlib
+        with matplotlib.rc_context({'svg.hashsalt': 'report-chart'}):
+            canvas.print_figure(buffer, format='svg', metadata={'Date': None})
+    else:
+        canvas.print_png(buffer)
+    buffer.seek(0)
+    return buffer
+
+def quantize_png(image, colors=256):
+    """PNG с палитрой до colors цветов: диаграммы залиты плоскими цветами, поэтому файл заметно меньше
+
+    Требуется Pillow; без него возвращается исходное изображение.
+    """
+    if importlib.util.find_spec('PIL') is None:
+        return image
+    from PIL import Image
+    with Image.open(io.BytesIO(image)) as picture:
+        paletted = picture.convert('RGB').quantize(colors=colors, method=Image.Quantize.FASTOCTREE,
+                                                   dither=Image.Dither.NONE)
+    buffer = io.BytesIO()
+    paletted.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def chart_render_dpi(figsize, chart_size, ppi=None):
+    """DPI отрисовки фигуры figsize (дюймы), при котором диаграмма размером chart_size (см)
+    получает в документе ppi точек на дюйм (по умолчанию RUN_SETTINGS['chart_ppi'])
+
+    Фиксированное значение RUN_SETTINGS['chart_dpi'] имеет приоритет.
+    """
+    if RUN_SETTINGS['chart_dpi']:
+        return RUN_SETTINGS['chart_dpi']
+    ppi = ppi or RUN_SETTINGS['chart_ppi']
+    scale = max(chart_size[0] / 2.54 / figsize[0], chart_size[1] / 2.54 / figsize[1])
+    return max(1, round(ppi * scale))
+
+# Отрисовщики диаграмм текущего процесса по виду, числу элементов, размеру и разрешению
+_chart_renderers = {}
+
+def chart_renderer(kind, num_items, figsize, dpi):
+    """Отрисовщик диаграммы: создается при первом обращении и переиспользуется в пределах процесса"""
+    key = (kind, num_items, tuple(figsize), dpi)
+    renderer = _chart_renderers.get(key)
+    if renderer is None:
+        configure_matplotlib()
+        if kind == 'plan_doughnut':
+            renderer = DoughnutChartRenderer(num_items, figsize, dpi, pct_fontsize=12, legend_fontsize=12, legend_ncol=3)
+        elif kind == 'status_doughnut':
+            renderer = DoughnutChartRenderer(num_items, figsize, dpi, legend_ncol=1 if num_items <= 4 else 2)
+        else:
+            renderer = BarChartRenderer(num_items, figsize, dpi)
+        _chart_renderers[key] = renderer
+    return renderer
+
+def create_doughnut_chart_matplotlib(table_data, chart_title, sheet_type, colors=None, figsize=(5.0, 5.5), dpi=150,
+                                     chart_format='png'):
+    """Создание кольцевой диаграммы распределения по планам по итоговой строке таблицы 'plan' (ReportTable)"""
+    # Данные для диаграммы: итоги по планам без 'Кол-во объектов'
+    labels = table_data.columns[2:]
+    sizes = list(table_data.totals[1:])
+
+    # Цвета для диаграммы
+    if colors is None:
+        colors = ['#99ff99', '#66b3ff', '#ff9999']
+    renderer = chart_renderer('plan_doughnut', len(labels), figsize, dpi)
+    return renderer.render(labels, sizes, chart_title, colors, chart_format)
+
+def create_status_doughnut_chart(labels, sizes, chart_title, colors=None, figsize=(5.0, 5.5), dpi=150,
+                                 chart_format='png'):
+    """Создание кольцевой диаграммы для статусов"""
+    if colors is None:
+        colors = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0', '#ffb3e6', '#c4e17f']
+    renderer = chart_renderer('status_doughnut', len(labels), figsize, dpi)
+    return renderer.render(labels, sizes, chart_title, colors, chart_format)
+
+def create_status_bar_chart(labels, sizes, chart_title, colors=None, figsize=(10, 6), dpi=150, chart_format='png'):
+    """Создание горизонтальной столбчатой диаграммы для статусов объектов с сортировкой по убыванию"""
+    if colors is None:
+        colors = ['#66b3ff', '#99ff99', '#c2c2f0', '#ffcc99', '#ff9999']
+    renderer = chart_renderer('status_bar', len(labels), figsize, dpi)
+    return renderer.render(labels, sizes, chart_title, colors, chart_format)
+
+def _render_chart_pyplot(spec):
+    """Прежняя отрисовка диаграммы через pyplot: новая фигура, tight_layout и savefig(bbox_inches='tight')
+
+    Оставлена для сравнения в benchmark charts.
+    """
+    plt = _pyplot()
+    labels, sizes, colors = spec['labels'], spec['sizes'], spec['colors']
+    fig, ax = plt.subplots(figsize=spec['figsize'])
+    if spec['kind'] == 'status_bar':
+        sizes = [float(size) for size in sizes]
+        sorted_indices = sorted(range(len(sizes)), key=lambda i: sizes[i])
+        sorted_sizes = [sizes[i] for i in sorted_indices]
+        total = sum(sorted_sizes)
+        percentages = [f'({size/total*100:.1f}%)' if total > 0 else '(0%)' for size in sorted_sizes]
+        y_pos = range(len(sizes))
+        bars = ax.barh(y_pos, sorted_sizes, color=[colors[i] for i in sorted_indices],
+                       edgecolor='white', linewidth=1.5, height=0.7)
+        for bar, size, percentage in zip(bars, sorted_sizes, percentages):
+            ax.text(bar.get_width() + (max(sorted_sizes) * 0.01), bar.get_y() + bar.get_height()/2,
+                    f'{int(size)} {percentage}', ha='left', va='center', fontsize=11, fontweight='bold')
+        ax.set_title(spec['title'], fontsize=14, fontweight='bold', pad=20)
+        ax.set_xlabel('Количество объектов', fontsize=12)
+        ax.set_yticks(y_pos)
+        ax.set_yticklabels([labels[i] for i in sorted_indices], fontsize=11)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['left'].set_color('#d3d3d3')
+        ax.spines['bottom'].set_color('#d3d3d3')
+        ax.grid(axis='x', alpha=0.3, linestyle='--')
+        ax.text(0.98, 0.02, f'Всего объектов: {int(total)}',
+                transform=ax.transAxes, ha='right', va='bottom',
+                fontsize=12, fontweight='bold', bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+    else:
+        fontsize = 12 if spec['kind'] == 'plan_doughnut' else 10
+        if spec['kind'] == 'plan_doughnut':
+            ncol = 3
+        else:
+            ncol = 1 if len(labels) <= 4 else 2
+        wedges, texts, autotexts = ax.pie(sizes, labels=None, colors=colors, autopct='%1.1f%%',
+                                          startangle=90, radius=1.3, wedgeprops=dict(width=0.7, edgecolor='w', linewidth=2),
+                                          pctdistance=0.75)
+        for autotext in autotexts:
+            autotext.set_color('#2c3e50')
+            autotext.set_fontweight('bold')
+            autotext.set_fontsize(fontsize)
+        ax.text(0, 0, f'{sum(sizes)}', ha='center', va='center', fontsize=16, fontweight='bold', color='#2c3e50')
+        ax.text(0, -0.2, 'объектов', ha='center', va='center', fontsize=14, color='#2c3e50')
+        ax.set_title(spec['title'], fontsize=12, fontweight='bold', pad=15)
+        ax.legend(wedges, [f'{label}: {size}' for label, size in zip(labels, sizes)],
+                  loc='upper center', bbox_to_anchor=(0.5, 0.0), ncol=ncol, fontsize=fontsize)
+        ax.axis('equal')
+    plt.tight_layout()
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png', dpi=spec['dpi'], bbox_inches='tight',
+                facecolor='#f8f9fa', edgecolor='none')
+    plt.close(fig)
+    return buffer.getvalue()
+
+# Пространства имен DrawingML для встроенных диаграмм Word
+CHART_XML_NAMESPACES = (
+    'xmlns:c="http://schemas.openxmlformats.org/drawingml/2006/chart" '
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+)
+
+def _chart_number(value):
+    """Числовое значение для кэша диаграммы Word"""
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def _chart_text_properties(size, bold=False, color='2C3E50'):
+    """Оформление текста элементов диаграммы (c:txPr)"""
+    return (f'<c:txPr><a:bodyPr/><a:lstStyle/><a:p><a:pPr><a:defRPr sz="{size * 100}" b="{int(bold)}">'
+            f'<a:solidFill><a:srgbClr val="{color}"/></a:solidFill><a:latin typeface="Arial"/></a:defRPr>'
+            f'</a:pPr><a:endParaRPr lang="ru-RU"/></a:p></c:txPr>')
+
+def _chart_title(chart_title, subtitle):
+    """Заголовок диаграммы из двух строк: название и общее количество"""
+    lines = [(chart_title, 1200, 1), (subtitle, 1000, 0)]
+    paragraphs = ''.join(
+        f'<a:p><a:pPr><a:defRPr sz="{size}" b="{bold}"/></a:pPr><a:r><a:rPr lang="ru-RU" sz="{size}" b="{bold}">'
+        f'<a:solidFill><a:srgbClr val="2C3E50"/></a:solidFill><a:latin typeface="Arial"/></a:rPr>'
+        f'<a:t>{xml_escape(text)}</a:t></a:r></a:p>'
+        for text, size, bold in lines
+    )
+    return (f'<c:title><c:tx><c:rich><a:bodyPr/><a:lstStyle/>{paragraphs}</c:rich></c:tx>'
+            f'<c:overlay val="0"/></c:title><c:autoTitleDeleted val="0"/>')
+
+def _chart_series_name(series_name):
+    """Имя ряда со ссылкой на заголовок столбца значений книги данных диаграммы"""
+    return (f'<c:tx><c:strRef><c:f>Sheet1!$B$1</c:f><c:strCache><c:ptCount val="1"/>'
+            f'<c:pt idx="0"><c:v>{xml_escape(series_name)}</c:v></c:pt></c:strCache></c:strRef></c:tx>')
+
+def _chart_series_data(categories, values):
+    """Подписи и значения ряда с кэшем strCache/numCache (данные хранятся в самой диаграмме)"""
+    last_row = len(categories) + 1
+    points = ''.join(f'<c:pt idx="{i}"><c:v>{xml_escape(str(category))}</c:v></c:pt>'
+                     for i, category in enumerate(categories))
+    numbers = ''.join(f'<c:pt idx="{i}"><c:v>{_chart_number(value)}</c:v></c:pt>'
+                      for i, value in enumerate(values))
+    return (f'<c:cat><c:strRef><c:f>Sheet1!$A$2:$A${last_row}</c:f><c:strCache>'
+            f'<c:ptCount val="{len(categories)}"/>{points}</c:strCache></c:strRef></c:cat>'
+            f'<c:val><c:numRef><c:f>Sheet1!$B$2:$B${last_row}</c:f><c:numCache><c:formatCode>General</c:formatCode>'
+            f'<c:ptCount val="{len(values)}"/>{numbers}</c:numCache></c:numRef></c:val>')
+
+def _chart_point_colors(colors, count, point_options):
+    """Цвета отдельных точек ряда (c:dPt)"""
+    return ''.join(
+        f'<c:dPt><c:idx val="{i}"/>{point_options}<c:spPr><a:solidFill><a:srgbClr val="{colors[i % len(colors)].lstrip("#").upper()}"/>'
+        f'</a:solidFill><a:ln w="19050"><a:solidFill><a:srgbClr val="FFFFFF"/></a:solidFill></a:ln></c:spPr></c:dPt>'
+        for i in range(count)
+    )
+
+def _chart_space(chart_body):
+    """Корневой элемент части диаграммы с фоном как у диаграмм matplotlib и ссылкой на книгу данных"""
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<c:chartSpace {CHART_XML_NAMESPACES}><c:roundedCorners val="0"/><c:chart>{chart_body}'
+            f'<c:plotVisOnly val="1"/><c:dispBlanksAs val="gap"/></c:chart>'
+            f'<c:spPr><a:solidFill><a:srgbClr val="F8F9FA"/></a:solidFill><a:ln><a:noFill/></a:ln></c:spPr>'
+            f'{_chart_text_properties(10)}<c:externalData r:id="{CHART_WORKBOOK_REL_ID}"><c:autoUpdate val="0"/>'
+            f'</c:externalData></c:chartSpace>').encode('utf-8')
+
+# Связь части диаграммы Word с ее книгой данных: единственная связь части, поэтому номер постоянный
+CHART_WORKBOOK_REL_ID = 'rId1'
+
+# Части книги Excel с данными диаграммы: данные на листе Sheet1, как в диаграммах, вставленных в Word
+SPREADSHEETML_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+OFFICE_RELS_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+CHART_WORKBOOK_PARTS = {
+    '[Content_Types].xml': (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/></Types>'),
+    '_rels/.rels': (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{OFFICE_RELS_NS}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        f'<workbook xmlns="{SPREADSHEETML_NS}" xmlns:r="{OFFICE_RELS_NS}">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{OFFICE_RELS_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'),
+}
+
+def create_chart_workbook(categories, values, series_name):
+    """Книга Excel с данными диаграммы Word: подписи в столбце A, значения в столбце B
+
+    Word открывает ее командой "Изменить данные" (c:externalData в части диаграммы).
+    Записи архива с фиксированной датой, поэтому одинаковые данные дают одинаковые байты.
+    """
+    def text_cell(reference, text):
+        return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{xml_escape(str(text))}</t></is></c>'
+
+    rows = [f'<row r="1">{text_cell("A1", "Категория")}{text_cell("B1", series_name)}</row>']
+    rows += [f'<row r="{row}">{text_cell(f"A{row}", category)}<c r="B{row}"><v>{_chart_number(value)}</v></c></row>'
+             for row, (category, value) in enumerate(zip(categories, values), start=2)]
+    sheet = f'<worksheet xmlns="{SPREADSHEETML_NS}"><sheetData>{"".join(rows)}</sheetData></worksheet>'
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for membername, xml in [*CHART_WORKBOOK_PARTS.items(), ('xl/worksheets/sheet1.xml', sheet)]:
+            archive.writestr(_package_zip_info(membername, zipfile.ZIP_DEFLATED),
+                             '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + xml)
+    return buffer.getvalue()
+
+def _native_chart(chart_body, categories, values, series_name):
+    """Диаграмма Word: XML части диаграммы и книга Excel с ее данными"""
+    return {'chart': _chart_space(chart_body), 'workbook': create_chart_workbook(categories, values, series_name)}
+
+def create_native_doughnut_chart(labels, sizes, chart_title, colors=None):
+    """Создание кольцевой диаграммы Word (DrawingML) без отрисовки изображения"""
+    if colors is None:
+        colors = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0', '#ffb3e6', '#c4e17f']
+
+    # Категории - только подписи статусов: количество и доля выводятся подписями данных
+    # по значениям ряда, поэтому после правки встроенной книги («Изменить данные») они
+    # пересчитываются (в отличие от легенды "статус: количество" у matplotlib)
+    categories = list(labels)
+    total = sum(sizes)
+
+    # Формат подписи не задается: он применялся бы и к количеству, доля выводится в формате 0%
+    data_labels = (f'<c:dLbls><c:spPr><a:noFill/><a:ln><a:noFill/></a:ln></c:spPr>'
+                   f'{_chart_text_properties(10, bold=True)}<c:showLegendKey val="0"/><c:showVal val="1"/>'
+                   f'<c:showCatName val="0"/><c:showSerName val="0"/><c:showPercent val="1"/>'
+                   f'<c:showBubbleSize val="0"/><c:separator>\n</c:separator><c:showLeaderLines val="0"/></c:dLbls>')
+    point_colors = _chart_point_colors(colors, len(categories), '<c:bubble3D val="0"/>')
+    series = (f'<c:ser><c:idx val="0"/><c:order val="0"/>{_chart_series_name(chart_title)}'
+              f'{point_colors}{data_labels}{_chart_series_data(categories, sizes)}</c:ser>')
+    body = (f'{_chart_title(chart_title, f"Всего: {total} объектов")}'
+            f'<c:plotArea><c:layout/><c:doughnutChart><c:varyColors val="1"/>{series}'
+            f'<c:firstSliceAng val="0"/><c:holeSize val="50"/></c:doughnutChart></c:plotArea>'
+            f'<c:legend><c:legendPos val="b"/><c:overlay val="0"/>{_chart_text_properties(10)}</c:legend>')
+    return _native_chart(body, categories, sizes, chart_title)
+
+def create_native_bar_chart(labels, sizes, chart_title, colors=None):
+    """Создание горизонтальной столбчатой диаграммы Word (DrawingML) с сортировкой по возрастанию"""
+    if colors is None:
+        colors = ['#66b3ff', '#99ff99', '#c2c2f0', '#ffcc99', '#ff9999']
+
+    # Сортировка как в create_status_bar_chart: первая категория оказывается внизу
+    sizes = [float(size) for size in sizes]
+    sorted_indices = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    sorted_labels = [labels[i] for i in sorted_indices]
+    sorted_sizes = [sizes[i] for i in sorted_indices]
+    sorted_colors = [colors[i] for i in sorted_indices]
+    total = sum(sorted_sizes)
+
+    data_labels = (f'<c:dLbls><c:spPr><a:noFill/><a:ln><a:noFill/></a:ln></c:spPr>{_chart_text_properties(11, bold=True)}'
+                   f'<c:dLblPos val="outEnd"/><c:showLegendKey val="0"/><c:showVal val="1"/><c:showCatName val="0"/>'
+                   f'<c:showSerName val="0"/><c:showPercent val="0"/><c:showBubbleSize val="0"/></c:dLbls>')
+    point_colors = _chart_point_colors(sorted_colors, len(sorted_labels),
+                                       '<c:invertIfNegative val="0"/><c:bubble3D val="0"/>')
+    series = (f'<c:ser><c:idx val="0"/><c:order val="0"/>{_chart_series_name(chart_title)}'
+              f'<c:invertIfNegative val="0"/>{point_colors}{data_labels}'
+              f'{_chart_series_data(sorted_labels, sorted_sizes)}</c:ser>')
+    axis_line = '<c:spPr><a:ln><a:solidFill><a:srgbClr val="D3D3D3"/></a:solidFill></a:ln></c:spPr>'
+    body = (f'{_chart_title(chart_title, f"Всего объектов: {int(total)}")}'
+            f'<c:plotArea><c:layout/><c:barChart><c:barDir val="bar"/><c:grouping val="clustered"/>'
+            f'<c:varyColors val="0"/>{series}<c:gapWidth val="40"/><c:axId val="1001"/><c:axId val="1002"/></c:barChart>'
+            f'<c:catAx><c:axId val="1001"/><c:scaling><c:orientation val="minMax"/></c:scaling><c:delete val="0"/>'
+            f'<c:axPos val="l"/><c:numFmt formatCode="General" sourceLinked="0"/><c:majorTickMark val="none"/>'
+            f'<c:minorTickMark val="none"/><c:tickLblPos val="nextTo"/>{axis_line}{_chart_text_properties(11)}'
+            f'<c:crossAx val="1002"/><c:crosses val="autoZero"/><c:auto val="1"/><c:lblAlgn val="ctr"/>'
+            f'<c:lblOffset val="100"/><c:noMultiLvlLbl val="0"/></c:catAx>'
+            f'<c:valAx><c:axId val="1002"/><c:scaling><c:orientation val="minMax"/></c:scaling><c:delete val="0"/>'
+            f'<c:axPos val="b"/><c:majorGridlines><c:spPr><a:ln><a:solidFill><a:srgbClr val="D3D3D3"/></a:solidFill>'
+            f'<a:prstDash val="dash"/></a:ln></c:spPr></c:majorGridlines>'
+            f'<c:title><c:tx><c:rich><a:bodyPr/><a:lstStyle/><a:p><a:pPr><a:defRPr sz="1200" b="0"/></a:pPr>'
+            f'<a:r><a:rPr lang="ru-RU" sz="1200" b="0"/><a:t>Количество объектов</a:t></a:r></a:p></c:rich></c:tx>'
+            f'<c:overlay val="0"/></c:title><c:numFmt formatCode="General" sourceLinked="1"/>'
+            f'<c:majorTickMark val="none"/><c:minorTickMark val="none"/><c:tickLblPos val="nextTo"/>{axis_line}'
+            f'{_chart_text_properties(10)}<c:crossAx val="1001"/><c:crosses val="autoZero"/>'
+            f'<c:crossBetween val="between"/></c:valAx></c:plotArea>')
+    return _native_chart(body, sorted_labels, sorted_sizes, chart_title)
+
+def render_native_chart(spec):
+    """Построение диаграммы Word по описанию, возвращает XML части диаграммы и книгу с ее данными"""
+    if spec['kind'] == 'status_bar':
+        return create_native_bar_chart(spec['labels'], spec['sizes'], spec['title'], spec['colors'])
+    return create_native_doughnut_chart(spec['labels'], spec['sizes'], spec['title'], spec['colors'])
+
+def add_native_chart(run, native_chart, width, height):
+    """Добавляет часть диаграммы с книгой данных в пакет DOCX и вставляет ее в run как встроенный объект"""
+    from docx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+    from docx.opc.part import Part
+    from docx.oxml import parse_xml
+    document_part = run.part
+    package = document_part.package
+    chart_part = Part(package.next_partname('/word/charts/chart%d.xml'), CT.DML_CHART, native_chart['chart'], package)
+    workbook_part = Part(package.next_partname('/word/embeddings/Microsoft_Excel_Worksheet%d.xlsx'),
+                         CT.SML_SHEET, native_chart['workbook'], package)
+    chart_part.rels.add_relationship(RT.PACKAGE, workbook_part, CHART_WORKBOOK_REL_ID)
+    rel_id = document_part.relate_to(chart_part, RT.CHART)
+    shape_id = document_part.next_id
+    inline = parse_xml(
+        f'<wp:inline distT="0" distB="0" distL="0" distR="0" '
+        f'xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing" {CHART_XML_NAMESPACES}>'
+        f'<wp:extent cx="{int(width)}" cy="{int(height)}"/><wp:effectExtent l="0" t="0" r="0" b="0"/>'
+        f'<wp:docPr id="{shape_id}" name="Диаграмма {shape_id}"/><wp:cNvGraphicFramePr/>'
+        f'<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/chart">'
+        f'<c:chart r:id="{rel_id}"/></a:graphicData></a:graphic></wp:inline>'
+    )
+    run._r.add_drawing(inline)
+
+# Расширение a:blip со ссылкой на SVG-версию изображения (Word 2016 и новее)
+SVG_BLIP_EXTENSION_URI = '{96DAC541-7B7A-43D3-8B79-37D633B846F1}'
+
+def add_svg_picture(run, svg_image, png_image, width, height):
+    """Вставляет векторную диаграмму: PNG - основное изображение, SVG - расширение svgBlip
+
+    Word 2016 и новее показывает SVG, остальные программы - запасной PNG.
+    """
+    from docx.opc.constants import RELATIONSHIP_TYPE as RT
+    from docx.opc.part import Part
+    from docx.oxml import parse_xml
+    with io.BytesIO(png_image) as image_stream:
+        inline_shape = run.add_picture(image_stream, width=width, height=height)
+    document_part = run.part
+    package = document_part.package
+    svg_part = Part(package.next_partname('/word/media/image%d.svg'), 'image/svg+xml', svg_image, package)
+    rel_id = document_part.relate_to(svg_part, RT.IMAGE)
+    blip = inline_shape._inline.xpath('.//a:blip')[0]
+    blip.append(parse_xml(
+        f'<a:extLst xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">'
+        f'<a:ext uri="{SVG_BLIP_EXTENSION_URI}">'
+        f'<asvg:svgBlip xmlns:asvg="http://schemas.microsoft.com/office/drawing/2016/SVG/main" '
+        f'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" r:embed="{rel_id}"/>'
+        f'</a:ext></a:extLst>'
+    ))
+
+def embed_chart(run, chart_image, width, height, chart_backend='matplotlib'):
+    """Вставка готовой диаграммы в run: PNG-изображение, SVG с запасным PNG или часть диаграммы Word"""
+    if chart_backend == 'native':
+        add_native_chart(run, chart_image, width, height)
+    elif isinstance(chart_image, dict):
+        add_svg_picture(run, chart_image['svg'], chart_image['png'], width, height)
+    else:
+        with io.BytesIO(chart_image) as image_stream:
+            run.add_picture(image_stream, width=width, height=height)
+
+def register_report_styles(doc):
+    """Регистрирует стили отчета в документе (однократно) и возвращает их идентификаторы по ключам
+
+    Идентификатор стиля python-docx получает из имени без пробелов; наличие стиля проверяется
+    по идентификатору через XPath, без перебора всех стилей документа.
+    """
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt
+    styles = doc.styles
+    styles_element = styles.element
+    alignments = {'left': WD_ALIGN_PARAGRAPH.LEFT, 'center': WD_ALIGN_PARAGRAPH.CENTER}
+    style_ids = {}
+    for key, spec in REPORT_PARAGRAPH_STYLES.items():
+        style_id = spec['name'].replace(' ', '')
+        if styles_element.get_by_id(style_id) is not None:
+            style_ids[key] = style_id
+            continue
+        style = styles.add_style(spec['name'], WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = styles['Normal']
+        if 'size' in spec:
+            style.font.size = Pt(spec['size'])
+        if spec.get('bold'):
+            style.font.bold = True
+        style.paragraph_format.alignment = alignments[spec.get('alignment', 'left')]
+        style.paragraph_format.space_before = Pt(spec['space_before'])
+        style.paragraph_format.space_after = Pt(spec['space_after'])
+        style.paragraph_format.line_spacing = 1
+        style_ids[key] = style.style_id
+
+    # Стиль таблицы на основе сетки: границы и интервалы берутся из Table Grid
+    style_ids['table'] = REPORT_TABLE_STYLE.replace(' ', '')
+    if styles_element.get_by_id(style_ids['table']) is None:
+        table_style = styles.add_style(REPORT_TABLE_STYLE, WD_STYLE_TYPE.TABLE)
+        table_style.base_style = styles['Table Grid']
+    return style_ids
+
+def add_section_title(doc, text, style_key, space_after=None):
+    """Добавляет абзац заголовка со стилем отчета; space_after - отступ, отличный от стиля"""
+    from docx.shared import Pt
+    paragraph = doc.add_paragraph(text, REPORT_PARAGRAPH_STYLES[style_key]['name'])
+    if space_after is not None:
+        paragraph.paragraph_format.space_after = Pt(space_after)
+    return paragraph
+
+# Кэш отрисованных диаграмм в памяти процесса (ключ -> PNG) и счетчики обращений
+_chart_memory_cache = OrderedDict()
+CHART_CACHE_STATS = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+def chart_cache_key(spec):
+    """Ключ диаграммы по содержимому: тип, подписи, значения, цвета, заголовок, размер, DPI и формат"""
+    payload = {
+        'version': CHART_CACHE_VERSION,
+        'kind': spec['kind'],
+        'title': spec['title'],
+        'labels': list(spec['labels']),
+        # Значения попадают в подписи через str(), поэтому 5 и 5.0 дают разные изображения
+        'sizes': [str(size) for size in spec['sizes']],
+        'colors': list(spec['colors']),
+        'figsize': list(spec['figsize']),
+        'dpi': spec['dpi'],
+        'format': spec.get('format', 'png'),
+        'palette_colors': spec.get('palette_colors')
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def _chart_entry_path(key, chart_format='png'):
+    """Путь к файлу диаграммы в каталоге кэша"""
+    return os.path.join(CACHE_SETTINGS['directory'], f"chart_{key}.{chart_format}")
+
+def _remember_chart(key, image):
+    """Помещает диаграмму в кэш памяти, вытесняя давно не использованные"""
+    _chart_memory_cache[key] = image
+    _chart_memory_cache.move_to_end(key)
+    limit = CACHE_SETTINGS['chart_memory_mb'] * 1024 * 1024
+    total_size = sum(len(cached) for cached in _chart_memory_cache.values())
+    while total_size > limit and len(_chart_memory_cache) > 1:
+        _, evicted = _chart_memory_cache.popitem(last=False)
+        total_size -= len(evicted)
+
+def load_cached_chart(key, chart_format='png'):
+    """Возвращает изображение диаграммы из памяти или с диска, либо None при промахе"""
+    if key in _chart_memory_cache:
+        _chart_memory_cache.move_to_end(key)
+        CHART_CACHE_STATS['memory_hits'] += 1
+        return _chart_memory_cache[key]
+
+    entry_path = _chart_entry_path(key, chart_format)
+    if os.path.exists(entry_path):
+        try:
+            with open(entry_path, 'rb') as f:
+                image = f.read()
+        except OSError as e:
+            print(f"Ошибка при чтении кэша {entry_path}: {e}")
+            _remove_cache_file(entry_path)
+        else:
+            os.utime(entry_path)
+            _remember_chart(key, image)
+            CHART_CACHE_STATS['disk_hits'] += 1
+            return image
+
+    CHART_CACHE_STATS['misses'] += 1
+    return None
+
+def store_cached_chart(key, image, chart_format='png'):
+    """Сохраняет изображение диаграммы в память и на диск"""
+    _remember_chart(key, image)
+    entry_path = _chart_entry_path(key, chart_format)
+    try:
+        os.makedirs(CACHE_SETTINGS['directory'], exist_ok=True)
+        temp_path = f"{entry_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(image)
+        os.replace(temp_path, entry_path)
+    except OSError as e:
+        print(f"Ошибка при записи кэша {entry_path}: {e}")
+        return
+    enforce_cache_size_limit(('.png', '.svg'), 'chart_max_size_mb')
+
+def describe_chart_cache_stats():
+    """Строка со счетчиками кэша диаграмм для итоговой сводки"""
+    hits = CHART_CACHE_STATS['memory_hits'] + CHART_CACHE_STATS['disk_hits']
+    return (f"Кэш диаграмм: попаданий {hits} (память {CHART_CACHE_STATS['memory_hits']}, "
+            f"диск {CHART_CACHE_STATS['disk_hits']}), промахов {CHART_CACHE_STATS['misses']}")
+
+def collect_chart_specs(report_models):
+    """Сбор описаний всех диаграмм отчета до сборки документа
+
+    Описание содержит только подписи и значения итоговой строки, поэтому
+    легко передается в дочерние процессы и однозначно задает ключ кэша.
+    """
+    specs = []
+    for section in REPORT_LAYOUT:
+        model = report_models[section['source']]
+        for item_index, item in enumerate(section['items']):
+            if 'chart_title' in item:
+                title = item['chart_title']
+                group = item['columns']
+                if "Распределение по планам" in title:
+                    # Для таблицы 1 - специальная диаграмма распределения по планам (без 'Кол-во объектов')
+                    kind = 'plan_doughnut'
+                    labels = TABLE_COLUMNS[group][2:]
+                    sizes = list(model.group_totals(group)[1:])
+                else:
+                    # Для остальных таблиц - диаграммы статусов
+                    kind = 'status_doughnut'
+                    labels = TABLE_COLUMNS[group][1:]
+                    sizes = list(model.group_totals(group))
+            elif 'status_bar_chart' in item:
+                title = item['status_bar_chart']
+                kind = 'status_bar'
+                labels = TABLE_COLUMNS['status'][1:]
+                sizes = list(model.group_totals('status'))
+            else:
+                continue
+            figsize = CHART_STYLES[kind]['figsize']
+            specs.append({
+                'id': f"{section['source']}:{item_index}",
+                'kind': kind,
+                'title': title,
+                'labels': labels,
+                'sizes': sizes,
+                'colors': CHART_STYLES[kind]['colors'],
+                'figsize': figsize,
+                'chart_size': item['chart_size'],
+                'dpi': chart_render_dpi(figsize, item['chart_size']),
+                'format': RUN_SETTINGS['chart_format'],
+                'palette_colors': RUN_SETTINGS['chart_palette_colors']
+            })
+    return specs
+
+def svg_fallback_specs(specs):
+    """Описания запасных PNG к SVG-диаграммам (для программ без поддержки SVG), с меньшей плотностью"""
+    return [{**spec, 'id': f"{spec['id']}:png", 'format': 'png',
+             'dpi': chart_render_dpi(spec['figsize'], spec['chart_size'], RUN_SETTINGS['chart_fallback_ppi'])}
+            for spec in specs]
+
+def render_chart(spec):
+    """Отрисовка одной диаграммы по описанию, возвращает PNG или SVG в виде байтов
+
+    Ошибка одной диаграммы (например, все значения нулевые) не прерывает отчет:
+    она выводится в лог, вместо изображения возвращается None.
+    """
+    chart_format = spec.get('format', 'png')
+    try:
+        renderer = chart_renderer(spec['kind'], len(spec['labels']), spec['figsize'], spec['dpi'])
+        buffer = renderer.render(spec['labels'], spec['sizes'], spec['title'], spec['colors'], chart_format)
+        if chart_format == 'png' and spec.get('palette_colors'):
+            return quantize_png(buffer.getvalue(), spec['palette_colors'])
+        return buffer.getvalue()
+    except Exception as e:
+        print(f"Диаграмма '{spec['title']}' не построена: {e}")
+        return None
+
+def _init_chart_worker():
+    """Инициализация процесса отрисовки: matplotlib (Figure и холст Agg) загружается один раз при старте"""
+    configure_matplotlib()
+    import matplotlib.backends.backend_agg
+    import matplotlib.figure
+
+def render_charts(specs, parallel=None):
+    """Отрисовка всех диаграмм отчета, параллельно в пуле процессов или последовательно
+
+    Диаграммы с уже известным содержимым берутся из кэша, в пул уходят только промахи.
+    """
+    if parallel is None:
+        parallel = RUN_SETTINGS['parallel']
+    start = time.perf_counter()
+    # Каталог кэша шрифтов передается процессам пула через окружение
+    configure_matplotlib()
+
+    images = {}
+    pending = []
+    for spec in specs:
+        key = chart_cache_key(spec) if CACHE_SETTINGS['enabled'] else None
+        image = load_cached_chart(key, spec['format']) if key else None
+        if image is None:
+            pending.append((spec, key))
+        else:
+            images[spec['id']] = image
+
+    workers = min(os.cpu_count() or 1, len(pending))
+    rendered = None
+    if parallel and workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_chart_worker) as executor:
+                rendered = list(executor.map(render_chart, [spec for spec, _ in pending]))
+        except BrokenProcessPool as e:
+            print(f"Пул процессов для диаграмм недоступен ({e}), отрисовка выполняется последовательно")
+    if rendered is None:
+        workers = min(1, len(pending))
+        rendered = [render_chart(spec) for spec, _ in pending]
+
+    for (spec, key), image in zip(pending, rendered):
+        images[spec['id']] = image
+        if key and image:
+            store_cached_chart(key, image, spec['format'])
+
+    formats = ', '.join(sorted({spec['format'] for spec in specs}))
+    total_size = sum(len(image) for image in images.values() if image)
+    failed = sum(1 for image in rendered if image is None)
+    print(f"Отрисовано диаграмм: {len(pending)} из {len(specs)} за {time.perf_counter() - start:.2f} с "
+          f"(процессов: {workers}), формат: {formats or '-'}, размер: {total_size / 1024:.0f} КБ"
+          + (f", не построено: {failed}" if failed else ''))
+    return images
+
+def add_chart_picture(doc, image, width, height, chart_backend='matplotlib'):
+    """Вставка диаграммы отдельным абзацем по центру (изображение передается из памяти)"""
+    chart_para = doc.add_paragraph(style=REPORT_PARAGRAPH_STYLES['chart']['name'])
+    run = chart_para.add_run()
+    embed_chart(run, image, width, height, chart_backend)
+
+def new_report_document():
+    """Пустой документ отчета: поля страницы, шрифт Arial и зарегистрированные стили"""
+    from docx import Document
+    from docx.oxml.ns import qn
+    from docx.shared import Cm, Pt
+    doc = Document()
+
+    # Устанавливаем поля документа
+    sections = doc.sections
+    for section in sections:
+        section.top_margin = Cm(2.05)
+        section.bottom_margin = Cm(0.95)
+        section.left_margin = Cm(3.17)
+        section.right_margin = Cm(1.41)
+
+    # Настраиваем шрифт Arial для всего документа
+    style = doc.styles['Normal']
+    style.font.name = 'Arial'
+    style.font.size = Pt(10)
+    style._element.rPr.rFonts.set(qn('w:eastAsia'), 'Arial')
+
+    # Стили заголовков, таблиц и ячеек регистрируются один раз
+    register_report_styles(doc)
+
+    # Время создания и изменения в свойствах документа - дата отчета, а не момент запуска
+    report_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    doc.core_properties.created = report_day
+    doc.core_properties.modified = report_day
+    return doc
+
+def _add_report_header(doc, timestamp):
+    """Заголовок отчета и дата"""
+    add_section_title(doc, 'Отчет по подготовке планов ТОиР на 2027 года', 'title')
+    add_section_title(doc, f'Дата: {timestamp}', 'date')
+
+def _add_section_heading(doc, section, page_break):
+    """Заголовок раздела отчета; каждый следующий раздел начинается с новой страницы"""
+    if page_break:
+        doc.add_page_break()
+    add_section_title(doc, section['heading'], 'section', section['heading_space_after'])
+
+def _add_layout_item(doc, item, table_data, chart_image, chart_backend):
+    """Элемент раздела из REPORT_LAYOUT: разрыв страницы, диаграмма или таблица с подписью"""
+    from docx.shared import Cm
+    if item.get('page_break'):
+        doc.add_page_break()
+    elif 'status_bar_chart' in item:
+        # Диаграмма статусов объектов после таблицы готовности
+        if chart_image:
+            add_chart_picture(doc, chart_image, Cm(item['chart_size'][0]), Cm(item['chart_size'][1]), chart_backend)
+    else:
+        add_section_title(doc, item['title'], 'table_title')
+        if 'chart_title' in item:
+            # Диаграммы построены заранее: если диаграмма не построена, таблица выводится без нее
+            create_table_with_chart(doc, table_data, item['chart_title'], chart_size=item['chart_size'],
+                                    chart_image=chart_image, chart_backend=chart_backend, render_missing=False)
+        else:
+            create_table_without_chart(doc, table_data)
+
+def report_blocks(report_models, chart_images, chart_backend='matplotlib'):
+    """Блоки отчета согласно REPORT_LAYOUT: шапка, заголовки разделов, элементы разделов
+
+    Каждый блок - словарь с входными данными (описание из макета, таблица, диаграмма),
+    по которым строится ключ кэша фрагментов, и функцией build(doc), добавляющей блок в документ.
+    """
+    timestamp = datetime.now().strftime("%d.%m.%Y")
+    blocks = [{
+        'id': 'header', 'layout': {'date': timestamp}, 'data': None, 'chart': None,
+        'build': functools.partial(_add_report_header, timestamp=timestamp)
+    }]
+    for section_index, section in enumerate(REPORT_LAYOUT):
+        model = report_models[section['source']]
+        heading = {key: value for key, value in section.items() if key != 'items'}
+        blocks.append({
+            'id': f"{section['source']}:heading", 'layout': {**heading, 'page_break': section_index > 0},
+            'data': None, 'chart': None,
+            'build': functools.partial(_add_section_heading, section=section, page_break=section_index > 0)
+        })
+        for item_index, item in enumerate(section['items']):
+            chart_image = chart_images.get(f"{section['source']}:{item_index}")
+            table_data = model.table(item['columns']) if 'columns' in item else None
+            blocks.append({
+                'id': f"{section['source']}:{item_index}", 'layout': item, 'data': table_data, 'chart': chart_image,
+                'build': functools.partial(_add_layout_item, item=item, table_data=table_data,
+                                           chart_image=chart_image, chart_backend=chart_backend)
+            })
+    return blocks
+
+def iter_report_blocks(doc, report_models, chart_images, chart_backend='matplotlib'):
+    """Добавляет содержимое отчета в документ по блокам согласно REPORT_LAYOUT
+
+    Генератор возвращает управление после каждого блока (шапка отчета, заголовок раздела,
+    таблица с подписью и диаграммой, разрыв страницы), чтобы потоковая запись могла
+    выгрузить готовый блок из дерева документа.
+    """
+    for block in report_blocks(report_models, chart_images, chart_backend):
+        block['build'](doc)
+        yield
+
+def _take_body_fragment(doc):
+    """Сериализует накопленные блоки тела документа и удаляет их из дерева
+
+    Тело сериализуется целиком без w:sectPr, открывающий и закрывающий теги w:body
+    отбрасываются: пространства имен уже объявлены в корне w:document.
+    """
+    from lxml import etree
+    body = doc.element.body
+    sect_pr = body.sectPr
+    body.remove(sect_pr)
+    fragment = b''
+    if len(body):
+        fragment = etree.tostring(body, encoding='utf-8')
+        fragment = fragment[fragment.index(b'>') + 1:-len(b'</w:body>')]
+        del body[:]
+    body.append(sect_pr)
+    return fragment
+
+# Номер и имя фигуры (wp:docPr) в сериализованном фрагменте тела документа
+SHAPE_ID_PATTERN = re.compile(rb'(<wp:docPr id=")(\d+)(" name=")([^"]*)(")')
+
+def _renumber_shapes(fragment, shape_ids):
+    """Номера фигур фрагмента по сквозному счетчику документа shape_ids (itertools.count)
+
+    python-docx выдает номер фигуры как наибольший id в дереве плюс один, а при потоковой
+    записи в дереве только текущий блок, и номера в каждом блоке начинаются заново.
+    Счетчик нумерует фигуры подряд в порядке документа, как при сборке целиком; имя
+    фигуры с номером на конце ('Picture 3') меняется вместе с номером.
+    """
+    def renumber(match):
+        old_id = match.group(2)
+        new_id = str(next(shape_ids)).encode()
+        name = match.group(4)
+        if name.endswith(b' ' + old_id):
+            name = name[:-len(old_id)] + new_id
+        return match.group(1) + new_id + match.group(3) + name + match.group(5)
+
+    return SHAPE_ID_PATTERN.sub(renumber, fragment)
+
+def _name_media_by_content(package):
+    """Имена изображений по содержимому (/word/media/image_<хэш>.png) вместо порядковых номеров"""
+    from docx.opc.packuri import PackURI
+    for part in package.iter_parts():
+        if str(part.partname).startswith('/word/media/'):
+            digest = hashlib.sha256(part.blob).hexdigest()[:16]
+            part.partname = PackURI(f'/word/media/image_{digest}.{part.partname.ext}')
+
+def _set_package_file_attributes(zip_info):
+    """Одинаковые атрибуты файла у всех записей архива (хранятся только в центральном каталоге)"""
+    zip_info.create_system = 3
+    zip_info.external_attr = 0o644 << 16
+    return zip_info
+
+def _package_zip_info(membername, compress_type):
+    """Запись архива с фиксированными датой и атрибутами, чтобы одинаковый пакет давал одинаковые байты"""
+    zip_info = _set_package_file_attributes(zipfile.ZipInfo(membername, date_time=PACKAGE_ZIP_DATE_TIME))
+    zip_info.compress_type = compress_type
+    return zip_info
+
+def save_docx_package(doc, output_filename, blocks=None, compress_level=None, skip_unchanged=None):
+    """Запись пакета DOCX со сжатием по типу части и потоковой записью word/document.xml
+
+    blocks - итератор, который на каждом шаге добавляет в doc очередной блок (iter_report_blocks)
+    либо возвращает уже сериализованный фрагмент тела (iter_cached_report_blocks).
+    Готовый блок сразу сериализуется в запись архива и удаляется из дерева, поэтому пиковая
+    память определяется самым большим блоком, а не всем документом. Номера фигур во фрагментах
+    идут подряд по счетчику записи (_renumber_shapes). Без blocks document.xml сериализуется
+    целиком одним куском: отсоединение больших поддеревьев в lxml дороже самой сериализации.
+    Изображения диаграмм отрисованы заранее и в любом случае находятся в памяти.
+
+    XML-части сжимаются deflate с уровнем compress_level (по умолчанию
+    RUN_SETTINGS['docx_compress_level']), уже сжатые изображения (PACKAGE_STORED_CONTENT_TYPES)
+    записываются без сжатия, одинаковые изображения - один раз.
+
+    Пакет детерминирован: части идут в фиксированном порядке, у записей архива одна дата,
+    изображения названы по содержимому. Архив пишется во временный файл рядом с output_filename,
+    при ошибке записи временный файл удаляется. При skip_unchanged (по умолчанию
+    RUN_SETTINGS['skip_unchanged']) файл с тем же SHA-256 не перезаписывается.
+    Возвращает сводку записи.
+    """
+    from docx.opc.oxml import serialize_part_xml
+    from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+    from docx.opc.pkgwriter import _ContentTypesItem
+    if compress_level is None:
+        compress_level = RUN_SETTINGS['docx_compress_level']
+    if skip_unchanged is None:
+        skip_unchanged = RUN_SETTINGS['skip_unchanged']
+    start = time.perf_counter()
+    package = doc.part.package
+    document_part = doc.part
+    body = doc.element.body
+    sect_pr = body.sectPr
+
+    if blocks is not None:
+        # Начало и конец document.xml: сериализация документа, в теле которого только w:sectPr
+        content = [child for child in body if child is not sect_pr]
+        for child in content:
+            body.remove(child)
+        head, tail = serialize_part_xml(doc.element).split(b'<w:body>', 1)
+        for child in content:
+            sect_pr.addprevious(child)
+
+    summary = {'parts': 0, 'stored': 0, 'duplicates': 0, 'unchanged': False}
+    temp_path = f"{output_filename}.tmp"
+    try:
+        # Метод и уровень сжатия архива получает запись document.xml, открытая по имени: у ZipFile.open()
+        # нет параметра compresslevel, а для готовой записи ZipInfo уровень задается только ее закрытым
+        # атрибутом. Дата такой записи по умолчанию совпадает с PACKAGE_ZIP_DATE_TIME
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=compress_level) as archive:
+            document_membername = document_part.partname.membername
+            with archive.open(document_membername, 'w') as stream:
+                if blocks is None:
+                    stream.write(serialize_part_xml(doc.element))
+                else:
+                    stream.write(head + b'<w:body>')
+                    shape_ids = itertools.count(1)
+                    for fragment in blocks:
+                        fragment = fragment if fragment is not None else _take_body_fragment(doc)
+                        stream.write(_renumber_shapes(fragment, shape_ids))
+                    stream.write(_renumber_shapes(_take_body_fragment(doc), shape_ids))
+                    stream.write(tail)
+            _set_package_file_attributes(archive.getinfo(document_membername))
+
+            # Изображения названы по содержимому, поэтому одинаковые изображения - части с одним именем:
+            # в архив записывается одна, связи остальных уже указывают на то же имя
+            _name_media_by_content(package)
+            parts = []
+            for part in sorted(package.iter_parts(), key=lambda part: str(part.partname)):
+                if parts and parts[-1].partname == part.partname:
+                    summary['duplicates'] += 1
+                else:
+                    parts.append(part)
+            for part in parts:
+                part.before_marshal()
+
+            def write(membername, blob, compress_type=zipfile.ZIP_DEFLATED):
+                archive.writestr(_package_zip_info(membername, compress_type), blob, compresslevel=compress_level)
+
+            write(CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(parts).blob)
+            write(PACKAGE_URI.rels_uri.membername, package.rels.xml)
+            for part in parts:
+                if part is not document_part:
+                    if part.content_type in PACKAGE_STORED_CONTENT_TYPES:
+                        write(part.partname.membername, part.blob, zipfile.ZIP_STORED)
+                        summary['stored'] += 1
+                    else:
+                        write(part.partname.membername, part.blob)
+                if len(part.rels):
+                    write(part.partname.rels_uri.membername, part.rels.xml)
+            summary['parts'] = len(parts)
+
+        summary['sha256'] = _file_content_hash(temp_path)
+        summary['size'] = os.path.getsize(temp_path)
+        if skip_unchanged and os.path.exists(output_filename) and _file_content_hash(output_filename) == summary['sha256']:
+            os.unlink(temp_path)
+            summary['unchanged'] = True
+        else:
+            os.replace(temp_path, output_filename)
+    except BaseException:
+        # Недописанный архив не оставляем рядом с отчетом
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+def describe_package_summary(summary):
+    """Строка со временем записи и размером пакета DOCX"""
+    if summary['unchanged']:
+        return (f"Пакет DOCX не изменился (SHA-256 {summary['sha256'][:16]}), запись пропущена: "
+                f"{summary['size'] / 1024:.0f} КБ, проверка за {summary['seconds']:.2f} с")
+    text = (f"Пакет DOCX записан за {summary['seconds']:.2f} с: {summary['size'] / 1024:.0f} КБ, "
+            f"частей {summary['parts']}, без сжатия {summary['stored']}")
+    if summary['duplicates']:
+        text += f", исключено повторов изображений {summary['duplicates']}"
+    return text
+
+# Счетчики кэша фрагментов документа за текущий запуск
+FRAGMENT_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+# Ссылки фрагмента на связанные части пакета
+FRAGMENT_REL_PATTERN = re.compile(rb'(r:(?:embed|id|link)=")(rId\d+)(")')
+
+def fragment_cache_key(doc, block, chart_backend):
+    """Ключ фрагмента блока: описание из макета, данные таблицы, диаграмма и оформление документа"""
+    from docx import __version__ as docx_version
+    section = doc.sections[-1]
+    payload = {
+        'version': FRAGMENT_CACHE_VERSION,
+        'python_docx': docx_version,
+        'layout': block['layout'],
+        'chart_backend': chart_backend,
+        'styles': [REPORT_PARAGRAPH_STYLES, REPORT_TABLE_STYLE, TABLE_FILL_COLOR],
+        'page': [section.page_width, section.left_margin, section.right_margin]
+    }
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    table = block['data']
+    if table is not None:
+        # Значения попадают в ячейки через str(), поэтому тип значений входит в ключ вместе с данными
+        digest.update(json.dumps([table.columns, str(table.values.dtype), [str(label) for label in table.labels]],
+                                 ensure_ascii=False).encode('utf-8'))
+        digest.update(np.ascontiguousarray(table.values).tobytes())
+        digest.update(table.totals.tobytes())
+    chart = block['chart']
+    if chart is not None:
+        # SVG-диаграмма передается вместе с запасным PNG, диаграмма Word - вместе с книгой данных
+        for image in (chart.values() if isinstance(chart, dict) else [chart]):
+            digest.update(hashlib.sha256(image).digest())
+    return digest.hexdigest()
+
+def _fragment_entry_path(key):
+    """Путь к файлу фрагмента в каталоге кэша"""
+    return os.path.join(CACHE_SETTINGS['directory'], f"fragment_{key}.docxfrag")
+
+def _fragment_part(rel):
+    """Описание связанной части вместе с ее собственными связями (None, если есть внешние связи)"""
+    part = rel.target_part
+    related = []
+    for child_rel in part.rels.values():
+        child = None if child_rel.is_external else _fragment_part(child_rel)
+        if child is None:
+            return None
+        related.append(child)
+    return {'rId': rel.rId, 'reltype': rel.reltype, 'content_type': part.content_type,
+            'partname': str(part.partname), 'blob': part.blob, 'parts': related}
+
+def _fragment_parts(doc, fragment):
+    """Части пакета, на которые ссылается фрагмент, с вложенными частями (книга данных диаграммы Word)
+
+    None, если фрагмент нельзя восстановить из кэша (у части есть внешние связи).
+    """
+    parts = []
+    for rel_id in dict.fromkeys(match.group(2).decode() for match in FRAGMENT_REL_PATTERN.finditer(fragment)):
+        part = _fragment_part(doc.part.rels[rel_id])
+        if part is None:
+            return None
+        parts.append(part)
+    return parts
+
+def _iter_fragment_parts(parts, prefix='parts'):
+    """Части фрагмента вместе с вложенными и имена записей их содержимого в файле кэша"""
+    for index, part in enumerate(parts):
+        name = f'{prefix}/{index}'
+        yield name, part
+        yield from _iter_fragment_parts(part['parts'], name)
+
+def _fragment_parts_manifest(parts):
+    """Описание частей фрагмента без содержимого для parts.json"""
+    return [{name: _fragment_parts_manifest(value) if name == 'parts' else value
+             for name, value in part.items() if name != 'blob'} for part in parts]
+
+def load_cached_fragment(key):
+    """Возвращает (фрагмент, части) из кэша или None при промахе"""
+    entry_path = _fragment_entry_path(key)
+    if not os.path.exists(entry_path):
+        return None
+    try:
+        with zipfile.ZipFile(entry_path) as archive:
+            parts = json.loads(archive.read('parts.json'))
+            for name, part in _iter_fragment_parts(parts):
+                part['blob'] = archive.read(name)
+            fragment = archive.read('fragment.xml')
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+        # Поврежденная запись удаляется и считается промахом
+        print(f"Ошибка при чтении кэша {entry_path}: {e}")
+        _remove_cache_file(entry_path)
+        return None
+    os.utime(entry_path)
+    return fragment, parts
+
+def store_cached_fragment(key, fragment, parts):
+    """Сохраняет фрагмент блока и связанные с ним части (изображения, диаграммы Word)"""
+    entry_path = _fragment_entry_path(key)
+    try:
+        os.makedirs(CACHE_SETTINGS['directory'], exist_ok=True)
+        temp_path = f"{entry_path}.tmp"
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('fragment.xml', fragment)
+            archive.writestr('parts.json', json.dumps(_fragment_parts_manifest(parts)))
+            for name, part in _iter_fragment_parts(parts):
+                archive.writestr(name, part['blob'])
+        os.replace(temp_path, entry_path)
+    except OSError as e:
+        print(f"Ошибка при записи кэша {entry_path}: {e}")
+        return
+    enforce_cache_size_limit('.docxfrag', 'fragment_max_size_mb')
+
+def _splice_fragment(doc, fragment, parts):
+    """Подготавливает фрагмент из кэша к вставке: добавляет части в пакет и перенумеровывает связи
+
+    Части добавляются так же, как при построении блока (изображения - через python-docx с
+    исключением повторов), поэтому идентификаторы связей совпадают с теми, что получились бы
+    при полной сборке. Номера фигур, как и у построенных блоков, задает save_docx_package.
+    """
+    from docx.opc.constants import RELATIONSHIP_TYPE as RT
+    from docx.opc.part import Part
+    package = doc.part.package
+
+    def add_part(part):
+        template = re.sub(r'\d+(\.\w+)$', r'%d\1', part['partname'])
+        new_part = Part(package.next_partname(template), part['content_type'], part['blob'], package)
+        # Вложенные части (книга данных диаграммы Word) связываются под прежними rId:
+        # на них ссылается содержимое самой части
+        for child in part['parts']:
+            new_part.rels.add_relationship(child['reltype'], add_part(child), child['rId'])
+        return new_part
+
+    rel_ids = {}
+    for part in parts:
+        # SVG python-docx как изображение не разбирает, такая часть добавляется напрямую
+        if part['reltype'] == RT.IMAGE and part['content_type'] != 'image/svg+xml':
+            rel_id, _ = doc.part.get_or_add_image(io.BytesIO(part['blob']))
+        else:
+            rel_id = doc.part.relate_to(add_part(part), part['reltype'])
+        rel_ids[part['rId'].encode()] = rel_id.encode()
+    return FRAGMENT_REL_PATTERN.sub(lambda m: m.group(1) + rel_ids[m.group(2)] + m.group(3), fragment)
+
+def iter_cached_report_blocks(doc, blocks, chart_backend='matplotlib'):
+    """Блоки отчета с кэшем фрагментов: неизменившиеся блоки берутся из кэша, остальные строятся
+
+    Возвращает сериализованные фрагменты тела документа для save_docx_package. Построенный
+    блок сразу выгружается из дерева; без потоковой записи фрагменты собираются в список до записи.
+    """
+    for block in blocks:
+        key = fragment_cache_key(doc, block, chart_backend)
+        cached = load_cached_fragment(key)
+        if cached is not None:
+            FRAGMENT_CACHE_STATS['hits'] += 1
+            yield _splice_fragment(doc, *cached)
+            continue
+
+        FRAGMENT_CACHE_STATS['misses'] += 1
+        block['build'](doc)
+        fragment = _take_body_fragment(doc)
+        parts = _fragment_parts(doc, fragment)
+        if parts is not None:
+            store_cached_fragment(key, fragment, parts)
+        yield fragment
+
+def describe_fragment_cache_stats():
+    """Строка со счетчиками кэша фрагментов документа для итоговой сводки"""
+    return (f"Кэш фрагментов документа: из кэша {FRAGMENT_CACHE_STATS['hits']}, "
+            f"построено {FRAGMENT_CACHE_STATS['misses']}")
+
+def create_docx_report(kr_model, totr_model, output_filename=None, streaming=None):
+    """Создание полного отчета в формате DOCX со всеми диаграммами и правильным форматированием
+
+    streaming - записывать document.xml в архив по блокам, не держа в памяти все дерево
+    документа (по умолчанию RUN_SETTINGS['docx_streaming']); оформление отчета не меняется.
+    """
+    
+    # Используем выходной файл из конфигурации, если не указан другой
+    if output_filename is None:
+        output_filename = output_file_path()
+    if streaming is None:
+        streaming = RUN_SETTINGS['docx_streaming']
+    
+    try:
+        report_models = {'kr': kr_model, 'totr': totr_model}
+
+        # Все диаграммы отрисовываются заранее, сборка документа только вставляет готовые изображения
+        chart_backend = RUN_SETTINGS['chart_backend']
+        chart_specs = collect_chart_specs(report_models)
+        if chart_backend == 'native':
+            # Диаграммы Word строятся как XML без matplotlib и без растеризации
+            chart_images = {spec['id']: render_native_chart(spec) for spec in chart_specs}
+        elif RUN_SETTINGS['chart_format'] == 'svg':
+            # К каждой SVG-диаграмме отрисовывается запасной PNG для программ без поддержки SVG
+            images = render_charts(chart_specs + svg_fallback_specs(chart_specs))
+            chart_images = {spec['id']: {'svg': images[spec['id']], 'png': images[f"{spec['id']}:png"]}
+                            if images[spec['id']] and images[f"{spec['id']}:png"] else None
+                            for spec in chart_specs}
+        else:
+            chart_images = render_charts(chart_specs)
+
+        doc = new_report_document()
+        if CACHE_SETTINGS['enabled']:
+            # Блоки с неизменившимися данными и макетом берутся из кэша готовыми фрагментами
+            blocks = iter_cached_report_blocks(doc, report_blocks(report_models, chart_images, chart_backend),
+                                               chart_backend)
+            if not streaming:
+                # Без потоковой записи весь документ (из кэша и построенный) собирается в памяти
+                blocks = list(blocks)
+        else:
+            blocks = iter_report_blocks(doc, report_models, chart_images, chart_backend)
+            # Сохраняем документ: при потоковой записи блоки выгружаются в архив по мере построения
+            if not streaming:
+                for _ in blocks:
+                    pass
+                blocks = None
+        summary = save_docx_package(doc, output_filename, blocks)
+        if not summary['unchanged']:
+            print(f"DOCX отчет успешно создан: {output_filename}")
+        print(describe_package_summary(summary))
+        
+    except Exception as e:
+        print(f"Ошибка при создании DOCX отчета: {e}")
+        import traceback
+        traceback.print_exc()
+
+# Элементы, которые по схеме идут в w:tcPr после w:shd (заливка вставляется перед ними)
+WORDML_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+TC_PR_SHADING_SUCCESSORS = frozenset(WORDML_NS + tag for tag in (
+    'noWrap', 'tcMar', 'textDirection', 'tcFitText', 'vAlign', 'hideMark',
+    'headers', 'cellIns', 'cellDel', 'cellMerge', 'tcPrChange'))
+
+# Разметка w:shd по цвету заливки и заготовки w:shd/w:tcPr из нее: разбираются один раз,
+# в ячейки вставляются копии
+_shading_markup = {}
+_shading_templates = {}
+
+def shading_xml(fill_color):
+    """Разметка w:shd для цвета заливки (шесть шестнадцатеричных цифр или auto)
+
+    Единственный источник разметки заливки: из нее собираются и таблицы отчета
+    (build_table_xml), и заготовки для заливки готовых ячеек (set_cell_shading, shade_row).
+    """
+    markup = _shading_markup.get(fill_color)
+    if markup is None:
+        color = str(fill_color)
+        if color != 'auto' and not (len(color) == 6 and all(c in '0123456789ABCDEFabcdef' for c in color)):
+            raise ValueError(f"Некорректный цвет заливки: {fill_color!r}")
+        markup = _shading_markup[fill_color] = f'<w:shd w:fill="{color}"/>'
+    return markup
+
+def _shading_template(fill_color):
+    """Заготовки (w:shd, w:tcPr с w:shd) для цвета заливки"""
+    from docx.oxml import parse_xml
+    templates = _shading_templates.get(fill_color)
+    if templates is None:
+        tc_pr = parse_xml(f'<w:tcPr {nsdecls("w")}>{shading_xml(fill_color)}</w:tcPr>')
+        templates = _shading_templates[fill_color] = (tc_pr[0], tc_pr)
+    return templates
+
+def _shade_tc(tc, fill_color):
+    """Заливка элемента w:tc: существующая w:shd заменяется, а не дублируется"""
+    shading, tc_pr_template = _shading_template(fill_color)
+    tc_pr = tc.tcPr
+    if tc_pr is None:
+        # w:tcPr должен быть первым потомком w:tc
+        tc.insert(0, copy.deepcopy(tc_pr_template))
+        return
+    # Один проход по свойствам ячейки: убрать прежнюю заливку и найти место по порядку схемы
+    shading_tag = shading.tag
+    successor = None
+    for child in list(tc_pr):
+        if child.tag == shading_tag:
+            tc_pr.remove(child)
+        elif successor is None and child.tag in TC_PR_SHADING_SUCCESSORS:
+            successor = child
+    if successor is None:
+        tc_pr.append(copy.deepcopy(shading))
+    else:
+        successor.addprevious(copy.deepcopy(shading))
+
+def set_cell_shading(cell, fill_color):
+    """Устанавливает заливку ячейки таблицы"""
+    _shade_tc(cell._element, fill_color)
+
+def _row_tc_at(tr, grid_col):
+    """Ячейка w:tc строки, занимающая столбец сетки grid_col, с учетом w:gridSpan (None - нет такой)"""
+    col = 0
+    for tc in tr.tc_lst:
+        col += tc.grid_span
+        if grid_col < col:
+            return tc
+    return None
+
+def shade_row(table, row_idx, fill_color):
+    """Заливка всех ячеек строки таблицы за один вызов"""
+    for tc in table._tbl.tr_lst[row_idx].tc_lst:
+        _shade_tc(tc, fill_color)
+
+def shade_column(table, col_idx, fill_color):
+    """Заливка всех ячеек столбца таблицы за один вызов (по элементам строк, без сетки ячеек python-docx)"""
+    for tr in table._tbl.tr_lst:
+        tc = _row_tc_at(tr, col_idx)
+        if tc is not None:
+            _shade_tc(tc, fill_color)
+
+# Заливка заголовка и итоговой строки таблиц отчета (шрифт и выравнивание задаются стилями ячеек)
+TABLE_FILL_COLOR = 'F8F9FA'
+
+def _table_paragraph_xml(text, style_id):
+    """Абзац ячейки со стилем и текстом в одном run (None - абзац без текста)"""
+    if text is None:
+        run = ''
+    elif text:
+        space = ' xml:space="preserve"' if text != text.strip() else ''
+        run = f'<w:r><w:t{space}>{xml_escape(text)}</w:t></w:r>'
+    else:
+        run = '<w:r/>'
+    return f'<w:p><w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>{run}</w:p>'
+
+def _table_cell_xml(width_twips, paragraph_xml, fill_color=None, v_merge=''):
+    """Ячейка таблицы с шириной, объединением по вертикали, необязательной заливкой и готовым абзацем"""
+    shading = shading_xml(fill_color) if fill_color is not None else ''
+    return (f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width_twips}"/>{v_merge}{shading}</w:tcPr>'
+            f'{paragraph_xml}</w:tc>')
+
+def table_column_widths(num_data_cols, chart_column=False):
+    """Ширины столбцов таблицы отчета
+
+    Общая доступная ширина листа (A4): 21 см. Первый столбец - 3.19 см. В таблице с диаграммой
+    последний столбец - 7.46 см, средним столбцам остается 10.35 см; без диаграммы остальные
+    столбцы делят 17.81 см поровну.
+    """
+    from docx.shared import Cm
+    first_col_width = Cm(3.19)
+    if chart_column:
+        if num_data_cols > 1:
+            middle_col_width = Cm(10.35) / (num_data_cols - 1)
+        else:
+            middle_col_width = Cm(0)
+        return [first_col_width] + [middle_col_width] * (num_data_cols - 1) + [Cm(7.46)]
+
+    if num_data_cols > 1:
+        other_cols_width = Cm(17.81) / (num_data_cols - 1)
+    else:
+        other_cols_width = Cm(0)
+    return [first_col_width] + [other_cols_width] * (num_data_cols - 1)
+
+def build_table_xml(table, grid_width, style_ids, widths=None, chart_column=False):
+    """Формирует XML всей таблицы (сетка, ширины, заголовок, данные, итоговая строка, заливка) за один проход
+
+    table - таблица модели отчета (ReportTable), ее последняя строка - итоговая: стиль выделенной ячейки и заливка. Оформление
+    текста задается ссылками на стили из register_report_styles(), без свойств run.
+    При chart_column=True справа добавляется столбец для диаграммы, объединенный по вертикали
+    через w:vMerge сразу при формировании строк, поэтому время построения линейно по числу строк.
+    """
+    from docx.shared import Emu
+    num_cols = len(table.columns) + (1 if chart_column else 0)
+    col_width = Emu(grid_width // num_cols).twips
+    grid = ''.join(f'<w:gridCol w:w="{col_width}"/>' for _ in range(num_cols))
+    # Ширины ячеек задаются сразу в tcW, без обхода таблицы по столбцам
+    if widths is None:
+        cell_widths = [col_width] * num_cols
+    else:
+        cell_widths = [Emu(width).twips for width in widths]
+    chart_width = cell_widths[-1]
+
+    # Заголовки (упрощаем названия столбцов для лучшего отображения)
+    bold_style = style_ids['cell_bold']
+    header = [_table_cell_xml(cell_widths[col_idx],
+                              _table_paragraph_xml(str(name).replace('_', ' '), bold_style), TABLE_FILL_COLOR)
+              for col_idx, name in enumerate(table.columns)]
+    if chart_column:
+        v_merge = '<w:vMerge w:val="restart"/>' if len(table) else ''
+        header.append(_table_cell_xml(chart_width, _table_paragraph_xml(None, bold_style), TABLE_FILL_COLOR, v_merge))
+    rows = [f"<w:tr>{''.join(header)}</w:tr>"]
 
-# Конфигурация путей к файлам относительно базовой директории
-FILE_PATHS = {
-    'kr_file': os.path.join(BASE_DIR, "КР", "Проект плана КР 2027_20.xlsx"),
-    'totr_file': os.path.join(BASE_DIR, "ТОиТР", "Проект плана ТОиТР 2027.xlsx"),
-    'output_file': os.path.join(BASE_DIR, f"Отчет_по_подготовке_ТОиР_2027_{current_date}.docx")
-}
+    # Данные: первый столбец по левому краю, остальные по центру; итоговая строка выделяется
+    body_styles = [style_ids['cell']] + [style_ids['cell_center']] * (len(table.columns) - 1)
+    num_data_rows = len(table)
+    for row_idx, row_data in enumerate(table.rows(), 1):
+        is_total = row_idx == num_data_rows
+        fill_color = TABLE_FILL_COLOR if is_total else None
+        row_styles = [bold_style] * len(row_data) if is_total else body_styles
+        cells = [
+            _table_cell_xml(cell_widths[col_idx], _table_paragraph_xml(str(value), row_styles[col_idx]), fill_color)
+            for col_idx, value in enumerate(row_data)
+        ]
+        if chart_column:
+            chart_paragraph = _table_paragraph_xml(None, bold_style) if is_total else '<w:p/>'
+            cells.append(_table_cell_xml(chart_width, chart_paragraph, fill_color, '<w:vMerge/>'))
+        rows.append(f"<w:tr>{''.join(cells)}</w:tr>")
 
-# Глобальный список для хранения временных файлов
-temp_files = []
+    return (f'<w:tbl {nsdecls("w")}><w:tblPr><w:tblStyle w:val="{style_ids["table"]}"/><w:tblW w:type="auto" w:w="0"/>'
+            f'<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" w:noHBand="0" '
+            f'w:noVBand="1" w:val="04A0"/></w:tblPr><w:tblGrid>{grid}</w:tblGrid>{"".join(rows)}</w:tbl>')
 
-def cleanup_temp_files():
-    """Очистка временных файлов при завершении программы"""
-    for temp_file in temp_files:
-        try:
-            if os.path.exists(temp_file):
-                os.unlink(temp_file)
-        except Exception as e:
-            print(f"Ошибка при удалении временного файла {temp_file}: {e}")
+def add_frame_table(doc, table, widths=None, chart_column=False):
+    """Добавляет в конец документа таблицу модели отчета (ReportTable), построенную одним XML-фрагментом"""
+    from docx.oxml import parse_xml
+    from docx.table import Table
+    section = doc.sections[-1]
+    grid_width = section.page_width - section.left_margin - section.right_margin
+    tbl = parse_xml(build_table_xml(table, grid_width, register_report_styles(doc), widths, chart_column))
+    doc.element.body._insert_tbl(tbl)
+    return Table(tbl, doc._body)
 
-# Регистрируем функцию очистки при выходе
-atexit.register(cleanup_temp_files)
+def _build_table_per_cell(doc, data, widths, chart_column=False):
+    """Прежнее построение таблицы через объекты python-docx по одной ячейке (для замеров)"""
+    register_report_styles(doc)
+    cell_style = REPORT_PARAGRAPH_STYLES['cell']['name']
+    center_style = REPORT_PARAGRAPH_STYLES['cell_center']['name']
+    bold_style = REPORT_PARAGRAPH_STYLES['cell_bold']['name']
+    num_data_cols = len(data.columns)
+    table = doc.add_table(rows=len(data) + 1, cols=num_data_cols + (1 if chart_column else 0))
+    table.style = REPORT_TABLE_STYLE
+    for i, width in enumerate(widths):
+        for cell in table.columns[i].cells:
+            cell.width = width
 
-def check_file_exists(file_path, file_description):
-    """Проверяет существование файла и выводит информационное сообщение"""
-    if not os.path.exists(file_path):
-        print(f"Файл не найден: {file_path}")
-        print(f"Описание: {file_description}")
-        print(f"Текущая рабочая директория: {os.getcwd()}")
-        print(f"Базовая директория: {BASE_DIR}")
-        print("Пожалуйста, проверьте пути в конфигурации FILE_PATHS")
-        return False
-    else:
-        print(f"Файл найден: {file_path}")
-        return True
+    header_cells = table.rows[0].cells
+    for i, header_cell in enumerate(header_cells):
+        if i < num_data_cols:
+            header_cell.text = str(data.columns[i]).replace('_', ' ')
+        header_cell.paragraphs[0].style = bold_style
+    shade_row(table, 0, TABLE_FILL_COLOR)
 
-def save_buffer_to_temp_file(buffer, prefix="chart"):
-    """Сохраняет буфер изображения во временный файл и возвращает путь к нему"""
-    try:
-        # Создаем временный файл
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.png', prefix=prefix)
-        temp_file.write(buffer.getvalue())
-        temp_file.flush()
-        temp_files.append(temp_file.name)
-        return temp_file.name
-    except Exception as e:
-        print(f"Ошибка при сохранении временного файла: {e}")
-        return None
+    for row_idx, row_data in enumerate(data.rows(), 1):
+        for col_idx, value in enumerate(row_data):
+            cell = table.rows[row_idx].cells[col_idx]
+            cell.text = str(value)
+            cell.paragraphs[0].style = cell_style if col_idx == 0 else center_style
 
-def generate_kr_report():
-    """Генерация отчета по капитальному ремонту"""
-    
-    # Проверяем существование файла
-    if not check_file_exists(FILE_PATHS['kr_file'], "Файл данных по капитальному ремонту"):
-        raise FileNotFoundError(f"Файл КР не найден: {FILE_PATHS['kr_file']}")
-    
-    # Читаем данные
-    df = pd.read_excel(
-        FILE_PATHS['kr_file'],
-        sheet_name="ПроектКР2026",
-        usecols="AO,AQ,BD,BJ,BM,BT,BV,CI,CK",
-        skiprows=15,
-        nrows=1000,
-        names=['ПО_Общества', 'План', 'МТР', 'ДВ', 'КП', 'Передано_в_ОДСиССР', 'Направлено_на_осмечивание', 'Статус_объекта', 'Признак_МТР_в_заказе']
-    ).dropna(subset=['ПО_Общества'])
-    
-    # Предварительно обрабатываем значения для правильного отображения
-    df['План'] = df['План'].replace({
-        'Основная': 'Основной',
-        'Доп1': 'Доп_1',
-        'Доп2': 'Доп_2'
-    })
-
-    df['ДВ'] = df['ДВ'].replace({
-        'НА ПРОВЕРКЕ': 'ДВ на проверке',
-        'ДА': 'ДВ принята в работу',
-        'НЕТ': 'ДВ отсутствует'
-    })
-
-    df['КП'] = df['КП'].replace({
-        'НА ПРОВЕРКЕ': 'КП на проверке',
-        'ДА': 'КП принято в работу',
-        'НЕТ': 'КП отсутствует',
-        'НЕ требуется': 'КП не требуется'
-    })
-
-    df['МТР'] = df['МТР'].replace({
-        'НА ПРОВЕРКЕ': 'МТР на проверке',
-        'ДА': 'ЕСТЬ замечания к МТР',
-        'НЕТ': 'Замечаний к МТР НЕТ',
-        'НЕ ТРЕБУЕТСЯ': 'Внесение МТР не требуется'
-    })
-
-    df['Признак_МТР_в_заказе'] = df['Признак_МТР_в_заказе'].replace({
-        'Да': 'Есть признаки МТР в заказе',
-        'Нет': 'Нет признаков МТР в заказе',
-        'Не требуется': 'Не требуется МТР в заказе'
-    })
-
-    df['Передано_в_ОДСиССР'] = df['Передано_в_ОДСиССР'].replace({
-        'ДА': 'Передано в ОДСиССР',
-        'НЕТ': 'Не передано в ОДСиССР'
-    })
-
-    df['Направлено_на_осмечивание'] = df['Направлено_на_осмечивание'].replace({
-        'ДА': 'Направлено на осмечивание',
-        'НЕТ': 'Не направлено на осмечивание',
-        'На доработке': 'СД на доработке'
-    })
-
-    df['Статус_объекта'] = df['Статус_объекта'].replace({
-        'НА ПРОВЕРКЕ': 'Объект на проверке',
-        'РАЗРАБОТКА СД': 'Разработка СД по объекту',
-        'ВКЛ': 'Объект включен в план',
-        'ПРЕД. К ИСКЛ': 'Объект предлагается к исключению',
-        'ИСКЛ': 'Объект исключен из плана'
-    })
-
-    # Создаем сводные таблицы и объединяем
-    result = pd.concat([
-        pd.crosstab(df['ПО_Общества'], df['План']),
-        pd.crosstab(df['ПО_Общества'], df['ДВ']),
-        pd.crosstab(df['ПО_Общества'], df['КП']),
-        pd.crosstab(df['ПО_Общества'], df['МТР']),
-        pd.crosstab(df['ПО_Общества'], df['Признак_МТР_в_заказе']),
-        pd.crosstab(df['ПО_Общества'], df['Передано_в_ОДСиССР']),
-        pd.crosstab(df['ПО_Общества'], df['Направлено_на_осмечивание']),
-        pd.crosstab(df['ПО_Общества'], df['Статус_объекта'])
-    ], axis=1, sort=False)    
-
-    # Добавляем настоящие столбцы
-    required_columns = ['Основной', 'Доп_1', 'Доп_2',
-                       'ДВ на проверке', 'ДВ принята в работу', 'ДВ отсутствует',
-                       'КП на проверке', 'КП принято в работу', 'КП отсутствует', 'КП не требуется',
-                       'МТР на проверке', 'ЕСТЬ замечания к МТР', 'Замечаний к МТР НЕТ', 'Внесение МТР не требуется',
-                       'Есть признаки МТР в заказе', 'Нет признаков МТР в заказе', 'Не требуется МТР в заказе',
-                       'Передано в ОДСиССР', 'Не передано в ОДСиССР',
-                       'Направлено на осмечивание', 'Не направлено на осмечивание', 'СД на доработке',
-                       'Объект на проверке', 'Разработка СД по объекту', 'Объект включен в план', 'Объект предлагается к исключению', 'Объект исключен из плана']
-    for col in required_columns:
-        if col not in result.columns:
-            result[col] = 0
-  
-    # Сбрасываем индекс, чтобы 'ПО_Общества' стал обычным столбцом
-    result = result.reset_index()
+    for cell in table.rows[len(data)].cells:
+        cell.paragraphs[0].style = bold_style
+    shade_row(table, len(data), TABLE_FILL_COLOR)
 
-    # Добавляем столбец 'Кол-во объектов' - количество уникальных записей для каждого ПО_Общества
-    count_series = df.groupby('ПО_Общества').size().reset_index(name='Кол-во объектов')
-    result = result.merge(count_series, on='ПО_Общества', how='left')
+    # Объединение столбца диаграммы: каждый merge перестраивает растущий диапазон
+    if chart_column and len(data):
+        start_cell = table.rows[0].cells[num_data_cols]
+        for row_idx in range(1, len(data) + 1):
+            start_cell.merge(table.rows[row_idx].cells[num_data_cols])
+    return table
 
-    # Формируем итоговую таблицу
-    result = result[['ПО_Общества', 'Кол-во объектов'] + required_columns]
+def make_synthetic_report_model(source, num_subdivisions, seed=0):
+    """Модель отчета с заданным числом подразделений для замеров"""
+    df = make_synthetic_plan_rows(source, num_subdivisions * 20, num_subdivisions=num_subdivisions, seed=seed)
+    return aggregate_report(df, pivot_blocks(source))
 
-    # Добавляем строку с общим итогом
-    total_row = result.sum(numeric_only=True)
-    total_row['ПО_Общества'] = 'Общий итог'
-    result = pd.concat([result, pd.DataFrame([total_row])], ignore_index=True, sort=False)
-    
-    return result
+def benchmark_tables(source='kr', sizes=(10, 100, 1000), repeats=3, per_cell_limit=200):
+    """Сравнение построения таблицы с диаграммой по ячейкам через python-docx и одним XML-фрагментом
 
-def generate_totr_report():
-    """Генерация отчета по техническому обслуживанию и текущему ремонту"""
-    
-    # Проверяем существование файла
-    if not check_file_exists(FILE_PATHS['totr_file'], "Файл данных по техническому обслуживанию и текущему ремонту"):
-        raise FileNotFoundError(f"Файл ТОиТР не найден: {FILE_PATHS['totr_file']}")
-    
-    # Читаем данные
-    df = pd.read_excel(
-        FILE_PATHS['totr_file'],
-        sheet_name="ПроектТОиТР2026",
-        usecols="AM,AO,BB,BE,BJ,BL,BU,BW",
-        skiprows=15,
-        nrows=1500,
-        names=['ПО_Общества', 'План', 'ДВ', 'КП', 'Передано_в_ОДСиССР', 'Направлено_на_осмечивание', 'Статус_объекта', 'Признак_МТР_в_заказе']
-    ).dropna(subset=['ПО_Общества'])
-    
-    # Предварительно обрабатываем значения для правильного отображения
-    df['План'] = df['План'].replace({
-        'Основная': 'Основной',
-        'Доп1': 'Доп_1',
-        'Доп2': 'Доп_2'
-    })
-
-    df['ДВ'] = df['ДВ'].replace({
-        'НА ПРОВЕРКЕ': 'ДВ на проверке',
-        'ДА': 'ДВ принята в работу',
-        'НЕТ': 'ДВ отсутствует'
-    })
-
-    df['КП'] = df['КП'].replace({
-        'НА ПРОВЕРКЕ': 'КП на проверке',
-        'ДА': 'КП принято в работу',
-        'НЕТ': 'КП отсутствует',
-        'Не требуется': 'КП не требуется'
-    })
-
-    df['Признак_МТР_в_заказе'] = df['Признак_МТР_в_заказе'].replace({
-        'Да': 'Есть признаки МТР в заказе',
-        'Нет': 'Нет признаков МТР в заказе',
-        'Не требуется': 'Не требуется МТР в заказе'
-    })
-
-    df['Передано_в_ОДСиССР'] = df['Передано_в_ОДСиССР'].replace({
-        'ДА': 'Передано в ОДСиССР',
-        'НЕТ': 'Не передано в ОДСиССР'
-    })
-
-    df['Направлено_на_осмечивание'] = df['Направлено_на_осмечивание'].replace({
-        'ДА': 'Направлено на осмечивание',
-        'НЕТ': 'Не направлено на осмечивание',
-        'На доработке': 'СД на доработке'
-    })
-
-    df['Статус_объекта'] = df['Статус_объекта'].replace({
-        'НА ПРОВЕРКЕ': 'Объект на проверке',
-        'РАЗРАБОТКА СД': 'Разработка СД по объекту',
-        'ВКЛ': 'Объект включен в план',
-        'ПРЕД. К ИСКЛ': 'Объект предлагается к исключению',
-        'ИСКЛ': 'Объект исключен из плана'
-    })
-
-    # Создаем сводные таблицы и объединяем
-    result = pd.concat([
-        pd.crosstab(df['ПО_Общества'], df['План']),
-        pd.crosstab(df['ПО_Общества'], df['ДВ']),
-        pd.crosstab(df['ПО_Общества'], df['КП']),
-        pd.crosstab(df['ПО_Общества'], df['Признак_МТР_в_заказе']),
-        pd.crosstab(df['ПО_Общества'], df['Передано_в_ОДСиССР']),
-        pd.crosstab(df['ПО_Общества'], df['Направлено_на_осмечивание']),
-        pd.crosstab(df['ПО_Общества'], df['Статус_объекта'])
-    ], axis=1, sort=False)    
-
-    # Добавляем настоящие столбцы
-    required_columns = ['Основной', 'Доп_1', 'Доп_2',
-                       'ДВ на проверке', 'ДВ принята в работу', 'ДВ отсутствует',
-                       'КП на проверке', 'КП принято в работу', 'КП отсутствует', 'КП не требуется',
-                       'Есть признаки МТР в заказе', 'Нет признаков МТР в заказе', 'Не требуется МТР в заказе',
-                       'Передано в ОДСиССР', 'Не передано в ОДСиССР',
-                       'Направлено на осмечивание', 'Не направлено на осмечивание', 'СД на доработке',
-                       'Объект на проверке', 'Разработка СД по объекту', 'Объект включен в план', 'Объект предлагается к исключению', 'Объект исключен из плана']
-    for col in required_columns:
-        if col not in result.columns:
-            result[col] = 0
-  
-    # Сбрасываем индекс, чтобы 'ПО_Общества' стал обычным столбцом
-    result = result.reset_index()
+    Прежний способ объединяет столбец диаграммы за квадратичное время (а на тысячах строк
+    python-docx упирается в глубину рекурсии), поэтому он замеряется только до per_cell_limit строк.
+    """
+    from docx import Document
+    for num_subdivisions in sizes:
+        data = make_synthetic_report_model(source, num_subdivisions).table('kp')
+        widths = table_column_widths(len(data.columns), chart_column=True)
+        builders = [('bulk_xml', add_frame_table)]
+        if num_subdivisions <= per_cell_limit:
+            builders.insert(0, ('per_cell', _build_table_per_cell))
+        timings = {}
+        tables_xml = {}
+        for name, build in builders:
+            best = None
+            for _ in range(repeats):
+                doc = Document()
+                start = time.perf_counter()
+                table = build(doc, data, widths, chart_column=True)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings[name] = best
+            tables_xml[name] = table._tbl.xml
 
-    # Добавляем столбец 'Кол-во объектов' - количество уникальных записей для каждого ПО_Общества
-    count_series = df.groupby('ПО_Общества').size().reset_index(name='Кол-во объектов')
-    result = result.merge(count_series, on='ПО_Общества', how='left')
+        if 'per_cell' not in timings:
+            print(f"Строк таблицы: {len(data):>5}  по ячейкам: не замеряется  "
+                  f"одним фрагментом: {timings['bulk_xml']:.3f} с")
+            continue
+        same = tables_xml['per_cell'] == tables_xml['bulk_xml']
+        print(f"Строк таблицы: {len(data):>5}  по ячейкам: {timings['per_cell']:.3f} с  "
+              f"одним фрагментом: {timings['bulk_xml']:.3f} с  "
+              f"ускорение: {timings['per_cell'] / max(timings['bulk_xml'], 1e-9):.1f}x  "
+              f"совпадает: {'да' if same else 'НЕТ'}")
 
-    # Формируем итоговую таблицу
-    result = result[['ПО_Общества', 'Кол-во объектов'] + required_columns]
+def benchmark_charts(repeats=3):
+    """Время отрисовки одной диаграммы: прежний способ через pyplot против переиспользуемых фигур
 
-    # Добавляем строку с общим итогом
-    total_row = result.sum(numeric_only=True)
-    total_row['ПО_Общества'] = 'Общий итог'
-    result = pd.concat([result, pd.DataFrame([total_row])], ignore_index=True, sort=False)
-    
-    return result
+    Прежний способ создает фигуру заново, вызывает tight_layout и сохраняет с bbox_inches='tight'
+    (фигура рисуется дважды). Диаграммы - те же, что в отчете, по синтетическим сводным таблицам.
+    """
+    report_models = {source: make_synthetic_report_model(source, 40, seed=seed)
+                     for seed, source in enumerate(('kr', 'totr'))}
+    specs = collect_chart_specs(report_models)
+    _pyplot()
 
-# [Остальные функции остаются без изменений - create_doughnut_chart_matplotlib, create_status_doughnut_chart, 
-# create_status_bar_chart, create_docx_report, set_cell_shading, create_table_with_chart, create_table_without_chart]
+    # Первая отрисовка каждого вида строит фигуру и разметку, она замеряется отдельно
+    start = time.perf_counter()
+    for spec in specs:
+        render_chart(spec)
+    first_pass = time.perf_counter() - start
 
-def create_doughnut_chart_matplotlib(df, chart_title, sheet_type):
-    """Создание кольцевой диаграммы с использованием Matplotlib"""
-    # Находим строку с общим итогом
-    total_row = df[df['ПО_Общества'] == 'Общий итог']
-    if total_row.empty:
-        print("Не найдена строка с общим итогом для построения диаграммы")
-        return None
-    
-    # Данные для диаграммы
-    labels = ['Основной', 'Доп_1', 'Доп_2']
-    sizes = [
-        total_row['Основной'].iloc[0],
-        total_row['Доп_1'].iloc[0],
-        total_row['Доп_2'].iloc[0]
-    ]
-    
-    # Вычисляем общее количество объектов
-    total_objects = sum(sizes)
-    
-    # Цвета для диаграммы
-    colors = ['#99ff99', '#66b3ff', '#ff9999']
-    
-    # Создаем фигуру с увеличенной высотой для размещения легенды под диаграммой
-    fig, ax = plt.subplots(figsize=(5.0, 5.5))
-    
-    # Создаем кольцевую диаграмму
-    wedges, texts, autotexts = ax.pie(sizes, labels=None, colors=colors, autopct='%1.1f%%',
-                                      startangle=90, radius=1.3, wedgeprops=dict(width=0.7, edgecolor='w', linewidth=2),
-                                      pctdistance=0.75)
-    
-    # Настраиваем внешний вид процентов
-    for autotext in autotexts:
-        autotext.set_color('#2c3e50')
-        autotext.set_fontweight('bold')
-        autotext.set_fontsize(12)
-    
-    # Добавляем центральный текст с общим количеством объектов
-    center_text = f'{total_objects}'
-    ax.text(0, 0, center_text, ha='center', va='center', fontsize=16, fontweight='bold', color='#2c3e50')
-    
-    # Добавляем подпись под центральным числом
-    ax.text(0, -0.2, 'объектов', ha='center', va='center', fontsize=14, color='#2c3e50')
-    
-    # Настраиваем заголовок
-    ax.set_title(chart_title, fontsize=12, fontweight='bold', pad=15)
-    
-    # Добавляем легенду ПОД диаграммой
-    legend_labels = [f'{label}: {size}' for label, size in zip(labels, sizes)]
-    legend = ax.legend(wedges, legend_labels, 
-                      loc='upper center', bbox_to_anchor=(0.5, 0.0),
-                      ncol=3, fontsize=12)
-    
-    # Устанавливаем размер шрифта заголовка легенды
-    legend.get_title().set_fontsize(11)
-    
-    # Убеждаемся, что диаграмма круговая
-    ax.axis('equal')
-    
-    # Настраиваем общий вид с учетом легенды
-    plt.tight_layout()
-    
-    # Сохраняем диаграмму в буфер памяти
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight', 
-                facecolor='#f8f9fa', edgecolor='none')
-    buffer.seek(0)
-    
-    # Закрываем фигуру для освобождения памяти
-    plt.close(fig)
-    
-    return buffer
+    timings = {}
+    for name, render in (('pyplot', _render_chart_pyplot), ('reuse', render_chart)):
+        for spec in specs:
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                render(spec)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings.setdefault((name, spec['kind']), []).append(best)
 
-def create_status_doughnut_chart(labels, sizes, chart_title, colors=None, figsize=(5.0, 5.5)):
-    """Создание кольцевой диаграммы для статусов"""
-    if colors is None:
-        colors = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0', '#ffb3e6', '#c4e17f']
-    
-    # Вычисляем общее количество
-    total = sum(sizes)
-    
-    # Создаем фигуру с увеличенной высотой для размещения легенды под диаграммой
-    fig, ax = plt.subplots(figsize=figsize)
-    
-    # Создаем кольцевую диаграмму
-    wedges, texts, autotexts = ax.pie(sizes, labels=None, colors=colors, autopct='%1.1f%%',
-                                      startangle=90, radius=1.3, wedgeprops=dict(width=0.7, edgecolor='w', linewidth=2),
-                                      pctdistance=0.75)
-    
-    # Настраиваем внешний вид процентов
-    for autotext in autotexts:
-        autotext.set_color('#2c3e50')
-        autotext.set_fontweight('bold')
-        autotext.set_fontsize(10)
-    
-    # Добавляем центральный текст с общим количеством
-    center_text = f'{total}'
-    ax.text(0, 0, center_text, ha='center', va='center', fontsize=16, fontweight='bold', color='#2c3e50')
-    
-    # Добавляем подпись под центральным числом
-    ax.text(0, -0.2, 'объектов', ha='center', va='center', fontsize=14, color='#2c3e50')
-    
-    # Настраиваем заголовок
-    ax.set_title(chart_title, fontsize=12, fontweight='bold', pad=15)
-    
-    # Добавляем легенду ПОД диаграммой
-    legend_labels = [f'{label}: {size}' for label, size in zip(labels, sizes)]
-    ncol = 1 if len(labels) <= 4 else 2
-    legend = ax.legend(wedges, legend_labels, 
-                      loc='upper center', bbox_to_anchor=(0.5, 0.0),
-                      ncol=ncol, fontsize=10)
-    
-    # Убеждаемся, что диаграмма круговая
-    ax.axis('equal')
-    
-    # Настраиваем общий вид с учетом легенды
-    plt.tight_layout()
-    
-    # Сохраняем диаграмму в буфер памяти
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight', 
-                facecolor='#f8f9fa', edgecolor='none')
-    buffer.seek(0)
-    
-    # Закрываем фигуру для освобождения памяти
-    plt.close(fig)
-    
-    return buffer
+    for kind in ('plan_doughnut', 'status_doughnut', 'status_bar'):
+        before = timings[('pyplot', kind)]
+        after = timings[('reuse', kind)]
+        before_ms = sum(before) / len(before) * 1000
+        after_ms = sum(after) / len(after) * 1000
+        print(f"{kind:<16} диаграмм: {len(before):>2}  pyplot: {before_ms:6.1f} мс  "
+              f"переиспользуемая фигура: {after_ms:6.1f} мс  ускорение: {before_ms / max(after_ms, 1e-9):.1f}x")
+    total_before = sum(sum(values) for (name, _), values in timings.items() if name == 'pyplot')
+    total_after = sum(sum(values) for (name, _), values in timings.items() if name == 'reuse')
+    print(f"Все диаграммы отчета ({len(specs)}): pyplot {total_before:.2f} с, "
+          f"переиспользуемые фигуры {total_after:.2f} с (первый проход с построением фигур: {first_pass:.2f} с)")
 
-def create_status_bar_chart(labels, sizes, chart_title, colors=None, figsize=(10, 6)):
-    """Создание горизонтальной столбчатой диаграммы для статусов объектов с сортировкой по убыванию"""
-    if colors is None:
-        colors = ['#66b3ff', '#99ff99', '#c2c2f0', '#ffcc99', '#ff9999']
-    
-    # Убедимся, что все значения числовые
-    sizes = [float(size) for size in sizes]
-    
-    # СОРТИРУЕМ ПО ВОЗРАСТАНИЮ (от меньшего к большему) 
-    sorted_indices = sorted(range(len(sizes)), key=lambda i: sizes[i])
-    
-    sorted_labels = [labels[i] for i in sorted_indices]
-    sorted_sizes = [sizes[i] for i in sorted_indices]
-    sorted_colors = [colors[i] for i in sorted_indices]
-    
-    # Вычисляем общее количество и проценты для отсортированных данных
-    total = sum(sorted_sizes)
-    percentages = [f'({size/total*100:.1f}%)' if total > 0 else '(0%)' for size in sorted_sizes]
-    
-    # Создаем фигуру
-    fig, ax = plt.subplots(figsize=figsize)
-    
-    # Создаем горизонтальную столбчатую диаграмму
-    y_pos = range(len(sorted_labels))
-    bars = ax.barh(y_pos, sorted_sizes, color=sorted_colors, edgecolor='white', linewidth=1.5, height=0.7)
-    
-    # Настраиваем внешний вид столбцов
-    for i, (bar, size, percentage) in enumerate(zip(bars, sorted_sizes, percentages)):
-        width = bar.get_width()
-        # Добавляем подписи с количеством и процентом справа от столбца
-        ax.text(width + (max(sorted_sizes) * 0.01), bar.get_y() + bar.get_height()/2,
-                f'{int(size)} {percentage}', ha='left', va='center', fontsize=11, fontweight='bold')
-    
-    # Настраиваем заголовок и подписи
-    ax.set_title(chart_title, fontsize=14, fontweight='bold', pad=20)
-    ax.set_xlabel('Количество объектов', fontsize=12)
-    
-    # Настраиваем ось Y с метками (отсортированными)
-    ax.set_yticks(y_pos)
-    ax.set_yticklabels(sorted_labels, fontsize=11)
-    
-    # Настраиваем внешний вид осей
-    ax.spines['top'].set_visible(False)
-    ax.spines['right'].set_visible(False)
-    ax.spines['left'].set_color('#d3d3d3')
-    ax.spines['bottom'].set_color('#d3d3d3')
-    
-    # Настраиваем сетку
-    ax.grid(axis='x', alpha=0.3, linestyle='--')
-    
-    # Добавляем общее количество в заголовок или как подпись
-    ax.text(0.98, 0.02, f'Всего объектов: {int(total)}', 
-            transform=ax.transAxes, ha='right', va='bottom', 
-            fontsize=12, fontweight='bold', bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
-    
-    # Настраиваем общий вид
-    plt.tight_layout()
-    
-    # Сохраняем диаграмму в буфер памяти
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight', 
-                facecolor='#f8f9fa', edgecolor='none')
-    buffer.seek(0)
-    
-    # Закрываем фигуру для освобождения памяти
-    plt.close(fig)
-    
-    return buffer
+def benchmark_chart_formats(repeats=3):
+    """Время отрисовки и размер диаграмм отчета для каждого формата вывода
 
-def create_docx_report(kr_df, totr_df, output_filename=None):
-    """Создание полного отчета в формате DOCX со всеми диаграммами и правильным форматированием"""
-    
-    # Используем выходной файл из конфигурации, если не указан другой
-    if output_filename is None:
-        output_filename = FILE_PATHS['output_file']
-    
+    Сравниваются прежний PNG с DPI 150, PNG с DPI по размеру диаграммы в документе,
+    он же с палитрой и SVG вместе с запасным PNG. Фигуры строятся до замера; размер в DOCX
+    учитывает сжатие SVG в пакете.
+    """
+    report_models = {source: make_synthetic_report_model(source, 40, seed=seed)
+                     for seed, source in enumerate(('kr', 'totr'))}
+    modes = [
+        ("PNG, 150 DPI (прежний)", {'chart_format': 'png', 'chart_dpi': 150, 'chart_palette_colors': None}),
+        (f"PNG по размеру, {RUN_SETTINGS['chart_ppi']} ppi",
+         {'chart_format': 'png', 'chart_dpi': None, 'chart_palette_colors': None}),
+        ("PNG по размеру, палитра 256 цветов", {'chart_format': 'png', 'chart_dpi': None, 'chart_palette_colors': 256}),
+        ("SVG + запасной PNG", {'chart_format': 'svg', 'chart_dpi': None, 'chart_palette_colors': None})
+    ]
+    if importlib.util.find_spec('PIL') is None:
+        print("Pillow не установлен: палитра не применяется")
+    saved = {name: RUN_SETTINGS[name] for name in ('chart_format', 'chart_dpi', 'chart_palette_colors')}
     try:
-        doc = Document()
-        
-        # Устанавливаем поля документа
-        sections = doc.sections
-        for section in sections:
-            section.top_margin = Cm(2.05)
-            section.bottom_margin = Cm(0.95)
-            section.left_margin = Cm(3.17)
-            section.right_margin = Cm(1.41)
-        
-        # Настраиваем шрифт Arial для всего документа
-        style = doc.styles['Normal']
-        style.font.name = 'Arial'
-        style.font.size = Pt(10)
-        style._element.rPr.rFonts.set(qn('w:eastAsia'), 'Arial')
-        
-        # Заголовок отчета
-        title = doc.add_paragraph()
-        title_run = title.add_run('Отчет по подготовке планов ТОиР на 2027 года')
-        title_run.font.size = Pt(16)
-        title_run.font.name = 'Arial'
-        title_run.bold = True
-        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        title.paragraph_format.space_before = Pt(0)
-        title.paragraph_format.space_after = Pt(6)
-        title.paragraph_format.line_spacing = 1
-        
-        # Дата
-        timestamp = datetime.now().strftime("%d.%m.%Y")
-        date_para = doc.add_paragraph()
-        date_run = date_para.add_run(f'Дата: {timestamp}')
-        date_run.font.size = Pt(12)
-        date_run.font.name = 'Arial'
-        date_para.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        date_para.paragraph_format.space_before = Pt(6)
-        date_para.paragraph_format.space_after = Pt(6)
-        date_para.paragraph_format.line_spacing = 1
-        
-        # Раздел КР
-        kr_title = doc.add_paragraph()
-        kr_title_run = kr_title.add_run('КАПИТАЛЬНЫЙ РЕМОНТ')
-        kr_title_run.font.size = Pt(12)
-        kr_title_run.font.name = 'Arial'
-        kr_title_run.bold = True
-        kr_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        kr_title.paragraph_format.space_before = Pt(6)
-        kr_title.paragraph_format.space_after = Pt(6)
-        kr_title.paragraph_format.line_spacing = 1
-        
-        # Таблица 1: Количество объектов для КР
-        table1_title = doc.add_paragraph()
-        table1_title_run = table1_title.add_run('КР: Количество объектов')
-        table1_title_run.font.size = Pt(12)
-        table1_title_run.font.name = 'Arial'
-        table1_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table1_title.paragraph_format.space_before = Pt(6)
-        table1_title.paragraph_format.space_after = Pt(0)
-        table1_title.paragraph_format.line_spacing = 1
-        
-        # Создаем таблицу 1 для КР с дополнительным столбцом для диаграммы
-        table1_cols = ['ПО_Общества', 'Кол-во объектов', 'Основной', 'Доп_1', 'Доп_2']
-        table1_data = kr_df[table1_cols]
-        create_table_with_chart(doc, table1_data, "КР: Распределение по планам", "kr_plan_chart", chart_size=(6.06, 6.1))
-        
-        # Таблица 2.1: Статусы ДВ для КР
-        table21_title = doc.add_paragraph()
-        table21_title_run = table21_title.add_run('КР: Статусы ДВ')
-        table21_title_run.font.size = Pt(12)
-        table21_title_run.font.name = 'Arial'
-        table21_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table21_title.paragraph_format.space_before = Pt(6)
-        table21_title.paragraph_format.space_after = Pt(0)
-        table21_title.paragraph_format.line_spacing = 1
-        
-        table21_cols = ['ПО_Общества', 'ДВ на проверке', 'ДВ принята в работу', 'ДВ отсутствует']
-        table21_data = kr_df[table21_cols]
-        create_table_with_chart(doc, table21_data, "КР: Статусы ДВ", "kr_dv_chart", chart_size=(5.91, 6.5))
-        
-        # Таблица 2.2: Статусы КП для КР
-        table22_title = doc.add_paragraph()
-        table22_title_run = table22_title.add_run('КР: Статусы КП')
-        table22_title_run.font.size = Pt(12)
-        table22_title_run.font.name = 'Arial'
-        table22_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table22_title.paragraph_format.space_before = Pt(6)
-        table22_title.paragraph_format.space_after = Pt(0)
-        table22_title.paragraph_format.line_spacing = 1
-        
-        table22_cols = ['ПО_Общества', 'КП на проверке', 'КП принято в работу', 'КП отсутствует', 'КП не требуется']
-        table22_data = kr_df[table22_cols]
-        create_table_with_chart(doc, table22_data, "КР: Статусы КП", "kr_kp_chart", chart_size=(5.91, 6.5))
-        
-        # Разрыв страницы
-        doc.add_page_break()
-        
-        # Таблица 2.3: Статусы МТР для КР
-        table23_title = doc.add_paragraph()
-        table23_title_run = table23_title.add_run('КР: Статусы МТР')
-        table23_title_run.font.size = Pt(12)
-        table23_title_run.font.name = 'Arial'
-        table23_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table23_title.paragraph_format.space_before = Pt(6)
-        table23_title.paragraph_format.space_after = Pt(0)
-        table23_title.paragraph_format.line_spacing = 1
-        
-        table23_cols = ['ПО_Общества', 'МТР на проверке', 'ЕСТЬ замечания к МТР', 'Замечаний к МТР НЕТ', 'Внесение МТР не требуется']
-        table23_data = kr_df[table23_cols]
-        create_table_with_chart(doc, table23_data, "КР: Статусы МТР", "kr_kp_chart", chart_size=(5.91, 6.5))
-
-        # Таблица 2.4: Признаки наличия у заказа ведомости МТР для КР
-        table24_title = doc.add_paragraph()
-        table24_title_run = table24_title.add_run('КР: Признаки наличия у заказа ведомости МТР')
-        table24_title_run.font.size = Pt(12)
-        table24_title_run.font.name = 'Arial'
-        table24_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table24_title.paragraph_format.space_before = Pt(6)
-        table24_title.paragraph_format.space_after = Pt(0)
-        table24_title.paragraph_format.line_spacing = 1
-        
-        table24_cols = ['ПО_Общества', 'Есть признаки МТР в заказе', 'Нет признаков МТР в заказе', 'Не требуется МТР в заказе']
-        table24_data = kr_df[table24_cols]
-        create_table_with_chart(doc, table24_data, "КР: Признаки наличия у заказа ведомости МТР", "kr_kp_chart", chart_size=(5.91, 6.5))
-
-        # Таблица 3.1: Передача в ОДСиССР для КР
-        table31_title = doc.add_paragraph()
-        table31_title_run = table31_title.add_run('КР: Передача в ОДСиССР')
-        table31_title_run.font.size = Pt(12)
-        table31_title_run.font.name = 'Arial'
-        table31_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table31_title.paragraph_format.space_before = Pt(6)
-        table31_title.paragraph_format.space_after = Pt(0)
-        table31_title.paragraph_format.line_spacing = 1
-        
-        table31_cols = ['ПО_Общества', 'Передано в ОДСиССР', 'Не передано в ОДСиССР']
-        table31_data = kr_df[table31_cols]
-        create_table_with_chart(doc, table31_data, "КР: Передача в ОДСиССР", "kr_ods_chart", chart_size=(5.91, 6.5))
-        
-        # Разрыв страницы
-        doc.add_page_break()
+        for title, settings in modes:
+            RUN_SETTINGS.update(settings)
+            specs = collect_chart_specs(report_models)
+            num_charts = len(specs)
+            if settings['chart_format'] == 'svg':
+                specs += svg_fallback_specs(specs)
+            for spec in specs:
+                render_chart(spec)
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                images = [render_chart(spec) for spec in specs]
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            size = sum(len(image) for image in images)
+            # В пакете DOCX SVG сжимается deflate, PNG хранится как есть
+            packed = sum(len(zlib.compress(image, RUN_SETTINGS['docx_compress_level'])) if spec['format'] == 'svg'
+                         else len(image) for spec, image in zip(specs, images))
+            print(f"{title:<36} время: {best:.2f} с ({best / num_charts * 1000:.0f} мс на диаграмму), "
+                  f"размер: {size / 1024:.0f} КБ, в DOCX: {packed / 1024:.0f} КБ")
+    finally:
+        RUN_SETTINGS.update(saved)
 
-        # Таблица 3.2: Направление на осмечивание для КР
-        table32_title = doc.add_paragraph()
-        table32_title_run = table32_title.add_run('КР: Направление на осмечивание')
-        table32_title_run.font.size = Pt(12)
-        table32_title_run.font.name = 'Arial'
-        table32_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table32_title.paragraph_format.space_before = Pt(6)
-        table32_title.paragraph_format.space_after = Pt(0)
-        table32_title.paragraph_format.line_spacing = 1
-        
-        table32_cols = ['ПО_Общества', 'Направлено на осмечивание', 'Не направлено на осмечивание', 'СД на доработке']
-        table32_data = kr_df[table32_cols]
-        create_table_with_chart(doc, table32_data, "КР: Направление на осмечивание", "kr_osmech_chart", chart_size=(5.91, 6.5))
-        
-        # Таблица 4: Готовность объектов для КР (без диаграммы)
-        table4_title = doc.add_paragraph()
-        table4_title_run = table4_title.add_run('КР: Готовность объектов')
-        table4_title_run.font.size = Pt(12)
-        table4_title_run.font.name = 'Arial'
-        table4_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table4_title.paragraph_format.space_before = Pt(6)
-        table4_title.paragraph_format.space_after = Pt(0)
-        table4_title.paragraph_format.line_spacing = 1
-        
-        table4_cols = ['ПО_Общества', 'Объект на проверке', 'Разработка СД по объекту', 'Объект включен в план', 
-                      'Объект предлагается к исключению', 'Объект исключен из плана']
-        table4_data = kr_df[table4_cols]
-        create_table_without_chart(doc, table4_data)
-        
-        # Диаграмма Статусы объектов для КР после таблицы 4
-        kr_total = kr_df[kr_df['ПО_Общества'] == 'Общий итог'].iloc[0]
-        status_labels = ['Объект на проверке', 'Разработка СД по объекту', 'Объект включен в план', 
-                        'Объект предлагается к исключению', 'Объект исключен из плана']
-        status_data = [kr_total['Объект на проверке'], kr_total['Разработка СД по объекту'], 
-                      kr_total['Объект включен в план'], kr_total['Объект предлагается к исключению'], 
-                      kr_total['Объект исключен из плана']]
-        status_chart_buffer = create_status_bar_chart(status_labels, status_data, "КР: Статусы объектов")
-        
-        if status_chart_buffer:
-            temp_file_path = save_buffer_to_temp_file(status_chart_buffer, "kr_status_chart")
-            if temp_file_path and os.path.exists(temp_file_path):
-                chart_para = doc.add_paragraph()
-                chart_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                chart_para.paragraph_format.space_before = Pt(6)
-                chart_para.paragraph_format.space_after = Pt(0)
-                chart_para.paragraph_format.line_spacing = 1
-                run = chart_para.add_run()
-                run.add_picture(temp_file_path, width=Cm(15.24), height=Cm(9.02))
-        
-        # Разрыв страницы для ТОиТР
-        doc.add_page_break()
-        
-        # Раздел ТОиТР
-        totr_title = doc.add_paragraph()
-        totr_title_run = totr_title.add_run('ТЕХНИЧЕСКОЕ ОБСЛУЖИВАНИЕ И ТЕКУЩИЙ РЕМОНТ')
-        totr_title_run.font.size = Pt(12)
-        totr_title_run.font.name = 'Arial'
-        totr_title_run.bold = True
-        totr_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        totr_title.paragraph_format.space_before = Pt(6)
-        totr_title.paragraph_format.space_after = Pt(0)
-        totr_title.paragraph_format.line_spacing = 1
-        
-        # Таблица 1 для ТОиТР с дополнительным столбцом для диаграммы
-        table1_title_totr = doc.add_paragraph()
-        table1_title_run_totr = table1_title_totr.add_run('ТОиТР: Количество объектов')
-        table1_title_run_totr.font.size = Pt(12)
-        table1_title_run_totr.font.name = 'Arial'
-        table1_title_totr.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table1_title_totr.paragraph_format.space_before = Pt(6)
-        table1_title_totr.paragraph_format.space_after = Pt(0)
-        table1_title_totr.paragraph_format.line_spacing = 1
-        
-        table1_data_totr = totr_df[table1_cols]
-        create_table_with_chart(doc, table1_data_totr, "ТОиТР: Распределение по планам", "totr_plan_chart", chart_size=(6.06, 6.1))
-        
-        # Таблица 2.1: Статусы ДВ для ТОиТР
-        table21_title_totr = doc.add_paragraph()
-        table21_title_run_totr = table21_title_totr.add_run('ТОиТР: Статусы ДВ')
-        table21_title_run_totr.font.size = Pt(12)
-        table21_title_run_totr.font.name = 'Arial'
-        table21_title_totr.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table21_title_totr.paragraph_format.space_before = Pt(6)
-        table21_title_totr.paragraph_format.space_after = Pt(0)
-        table21_title_totr.paragraph_format.line_spacing = 1
-        
-        table21_data_totr = totr_df[table21_cols]
-        create_table_with_chart(doc, table21_data_totr, "ТОиТР: Статусы ДВ", "totr_dv_chart", chart_size=(5.91, 6.5))
-        
-        # Таблица 2.2: Статусы КП для ТОиТР
-        table22_title_totr = doc.add_paragraph()
-        table22_title_run_totr = table22_title_totr.add_run('ТОиТР: Статусы КП')
-        table22_title_run_totr.font.size = Pt(12)
-        table22_title_run_totr.font.name = 'Arial'
-        table22_title_totr.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table22_title_totr.paragraph_format.space_before = Pt(6)
-        table22_title_totr.paragraph_format.space_after = Pt(0)
-        table22_title_totr.paragraph_format.line_spacing = 1
-        
-        table22_data_totr = totr_df[table22_cols]
-        create_table_with_chart(doc, table22_data_totr, "ТОиТР: Статусы КП", "totr_kp_chart", chart_size=(5.91, 6.5))
-        
-        # Разрыв страницы
-        doc.add_page_break()
+def _measure_docx_build(num_subdivisions, streaming, output_filename):
+    """Сборка синтетического отчета в отдельном процессе с замером времени и пиковой памяти
 
-        # Таблица 2.4: Признаки наличия у заказа ведомости МТР для ТОиТР
-        table24_title = doc.add_paragraph()
-        table24_title_run = table24_title.add_run('ТОиТР: Признаки наличия у заказа ведомости МТР')
-        table24_title_run.font.size = Pt(12)
-        table24_title_run.font.name = 'Arial'
-        table24_title.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table24_title.paragraph_format.space_before = Pt(6)
-        table24_title.paragraph_format.space_after = Pt(0)
-        table24_title.paragraph_format.line_spacing = 1
-        
-        table24_data_totr = totr_df[table24_cols]
-        create_table_with_chart(doc, table24_data_totr, "ТОиТР: Признаки наличия у заказа ведомости МТР", "totr_kp_chart", chart_size=(5.91, 6.5))
-
-        # Таблица 3.1: Передача в ОДСиССР для ТОиТР
-        table31_title_totr = doc.add_paragraph()
-        table31_title_run_totr = table31_title_totr.add_run('ТОиТР: Передача в ОДСиССР')
-        table31_title_run_totr.font.size = Pt(12)
-        table31_title_run_totr.font.name = 'Arial'
-        table31_title_totr.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table31_title_totr.paragraph_format.space_before = Pt(6)
-        table31_title_totr.paragraph_format.space_after = Pt(0)
-        table31_title_totr.paragraph_format.line_spacing = 1
-        
-        table31_data_totr = totr_df[table31_cols]
-        create_table_with_chart(doc, table31_data_totr, "ТОиТР: Передача в ОДСиССР", "totr_ods_chart", chart_size=(5.91, 6.5))
-        
-        # Таблица 3.2: Направление на осмечивание для ТОиТР
-        table32_title_totr = doc.add_paragraph()
-        table32_title_run_totr = table32_title_totr.add_run('ТОиТР: Направление на осмечивание')
-        table32_title_run_totr.font.size = Pt(12)
-        table32_title_run_totr.font.name = 'Arial'
-        table32_title_totr.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table32_title_totr.paragraph_format.space_before = Pt(6)
-        table32_title_totr.paragraph_format.space_after = Pt(0)
-        table32_title_totr.paragraph_format.line_spacing = 1
-        
-        table32_data_totr = totr_df[table32_cols]
-        create_table_with_chart(doc, table32_data_totr, "ТОиТР: Направление на осмечивание", "totr_osmech_chart", chart_size=(5.91, 6.5))
-        
-        # Разрыв страницы
-        doc.add_page_break()
+    Кэш отключен: иначе замер брал бы блоки из кэша прошлых запусков и записывал
+    фрагменты синтетического отчета в каталог кэша пользователя.
+    """
+    CACHE_SETTINGS['enabled'] = False
+    RUN_SETTINGS['chart_backend'] = 'native'
+    report_models = {source: make_synthetic_report_model(source, num_subdivisions, seed=seed)
+                     for seed, source in enumerate(('kr', 'totr'))}
+    start = time.perf_counter()
+    create_docx_report(report_models['kr'], report_models['totr'], output_filename, streaming=streaming)
+    return time.perf_counter() - start, _peak_rss_mb()
 
-        # Таблица 4: Готовность объектов для ТОиТР (без диаграммы)
-        table4_title_totr = doc.add_paragraph()
-        table4_title_run_totr = table4_title_totr.add_run('ТОиТР: Готовность объектов')
-        table4_title_run_totr.font.size = Pt(12)
-        table4_title_run_totr.font.name = 'Arial'
-        table4_title_totr.alignment = WD_ALIGN_PARAGRAPH.LEFT
-        table4_title_totr.paragraph_format.space_before = Pt(6)
-        table4_title_totr.paragraph_format.space_after = Pt(0)
-        table4_title_totr.paragraph_format.line_spacing = 1
-        
-        table4_data_totr = totr_df[table4_cols]
-        create_table_without_chart(doc, table4_data_totr)
-        
-        # Диаграмма Статусы объектов для ТОиТР после таблицы 4
-        totr_total = totr_df[totr_df['ПО_Общества'] == 'Общий итог'].iloc[0]
-        status_labels_totr = ['Объект на проверке', 'Разработка СД по объекту', 'Объект включен в план', 
-                             'Объект предлагается к исключению', 'Объект исключен из плана']
-        status_data_totr = [totr_total['Объект на проверке'], totr_total['Разработка СД по объекту'], 
-                           totr_total['Объект включен в план'], totr_total['Объект предлагается к исключению'], 
-                           totr_total['Объект исключен из плана']]
-        status_chart_buffer_totr = create_status_bar_chart(status_labels_totr, status_data_totr, "ТОиТР: Статусы объектов")
-        
-        if status_chart_buffer_totr:
-            temp_file_path = save_buffer_to_temp_file(status_chart_buffer_totr, "totr_status_chart")
-            if temp_file_path and os.path.exists(temp_file_path):
-                chart_para = doc.add_paragraph()
-                chart_para.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                chart_para.paragraph_format.space_before = Pt(6)
-                chart_para.paragraph_format.space_after = Pt(0)
-                chart_para.paragraph_format.line_spacing = 1
-                run = chart_para.add_run()
-                run.add_picture(temp_file_path, width=Cm(15.24), height=Cm(9.02))
-        
-        # Сохраняем документ
-        doc.save(output_filename)
-        print(f"DOCX отчет успешно создан: {output_filename}")
-        
-    except Exception as e:
-        print(f"Ошибка при создании DOCX отчета: {e}")
-        import traceback
-        traceback.print_exc()
+def benchmark_docx(num_subdivisions=2000):
+    """Сравнение сохранения отчета целиком и потоковой записи document.xml: время, пиковая память, совпадение
 
-def set_cell_shading(cell, fill_color):
-    """Устанавливает заливку ячейки таблицы"""
-    try:
-        tc_pr = cell._element.tcPr
-        if tc_pr is None:
-            tc_pr = parse_xml(r'<w:tcPr {}></w:tcPr>'.format(nsdecls('w')))
-            cell._element.append(tc_pr)
-        
-        shading = parse_xml(r'<w:shd {} w:fill="{}"/>'.format(nsdecls('w'), fill_color))
-        tc_pr.append(shading)
-    except Exception as e:
-        print(f"Ошибка при установке заливки ячейки: {e}")
+    Отчет строится по синтетическим сводным таблицам на num_subdivisions подразделений со
+    встроенными диаграммами Word (без matplotlib); каждый вариант - в новом процессе.
+    """
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        documents = {}
+        for streaming in (False, True):
+            output_filename = os.path.join(temp_dir, f'report_{int(streaming)}.docx')
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                elapsed, peak = executor.submit(_measure_docx_build, num_subdivisions, streaming,
+                                                output_filename).result()
+            with zipfile.ZipFile(output_filename) as archive:
+                documents[streaming] = archive.read('word/document.xml')
+            mode = "потоковая запись по блокам" if streaming else "документ целиком в памяти"
+            peak_text = f"{peak:.0f} МБ" if peak is not None else "недоступно"
+            print(f"{mode:<28} время: {elapsed:.2f} с, пиковая память процесса: {peak_text}, "
+                  f"document.xml: {len(documents[streaming]) / 1024 / 1024:.1f} МБ")
 
-def create_table_with_chart(doc, df, chart_title, chart_prefix, chart_size):
-    """Создание таблицы с диаграммой"""
+    same = documents[True] == documents[False]
+    print(f"document.xml совпадает: {'да' if same else 'НЕТ'}")
+    return same
+
+def create_table_with_chart(doc, table_data, chart_title, chart_size, chart_image=None, chart_backend='matplotlib',
+                            render_missing=True):
+    """Создание таблицы модели отчета с диаграммой (chart_image - заранее построенная диаграмма выбранного chart_backend)
+
+    Без chart_image диаграмма строится здесь же, если render_missing; иначе столбец диаграммы остается пустым.
+    """
+    from docx.shared import Cm
+    from docx.table import _Cell
     try:
-        # Создаем таблицу с дополнительным столбцом для диаграммы
-        num_data_cols = len(df.columns)
-        num_rows = len(df) + 1  # +1 для заголовка
-        table = doc.add_table(rows=num_rows, cols=num_data_cols + 1)  # +1 для столбца с диаграммой
-        table.style = 'Table Grid'
-        
-        # РАСЧЕТ ШИРИН СТОЛБЦОВ
-        # Общая доступная ширина листа (A4): 21 см
-        # Первый столбец: 3.19 см, последний: 7.46 см
-        # Оставшаяся ширина для средних столбцов: 21 - 3.19 - 7.46 = 10.35 см
-        first_col_width = Cm(3.19)
-        last_col_width = Cm(7.46)
-        middle_cols_total_width = Cm(10.35)
-        
-        # Количество средних столбцов (все столбцы данных кроме первого)
-        num_middle_cols = num_data_cols - 1
-        
-        # Равномерно распределяем оставшуюся ширину между средними столбцами
-        if num_middle_cols > 0:
-            middle_col_width = middle_cols_total_width / num_middle_cols
-        else:
-            middle_col_width = Cm(0)
-        
-        # Формируем список ширин для всех столбцов
-        widths = [first_col_width]  # первый столбец
-        
-        # Добавляем средние столбцы
-        for i in range(num_middle_cols):
-            widths.append(middle_col_width)
-        
-        # Добавляем последний столбец для диаграммы
-        widths.append(last_col_width)
-        
-        # Применяем ширины к столбцам таблицы
-        for i, width in enumerate(widths):
-            for cell in table.columns[i].cells:
-                cell.width = width
-        
-        # Заголовки таблицы (только для данных)
-        header_cells = table.rows[0].cells
-        column_names = list(df.columns)
-        
-        for i, column_name in enumerate(column_names):
-            # Упрощаем названия столбцов для лучшего отображения
-            simplified_name = str(column_name).replace('_', ' ')
-            header_cells[i].text = simplified_name
-            
-            # Форматирование заголовков
-            for paragraph in header_cells[i].paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                for run in paragraph.runs:
-                    run.font.bold = True
-                    run.font.size = Pt(8)
-                    run.font.name = 'Arial'
-            
-            # Заливка заголовков
-            set_cell_shading(header_cells[i], 'F8F9FA')
-        
-        # Пустой заголовок для столбца с диаграммой
-        header_cells[num_data_cols].text = ""  # Пустой заголовок для столбца с диаграммой
-        for paragraph in header_cells[num_data_cols].paragraphs:
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            for run in paragraph.runs:
-                run.font.bold = True
-                run.font.size = Pt(8)
-                run.font.name = 'Arial'
-        
-        set_cell_shading(header_cells[num_data_cols], 'F8F9FA')
-        
-        # Данные таблицы
-        for row_idx, row_data in enumerate(df.itertuples(), 1):
-            for col_idx, value in enumerate(row_data[1:], 0):  # Пропускаем индекс
-                cell = table.rows[row_idx].cells[col_idx]
-                cell.text = str(value)
-                
-                # Форматирование данных
-                for paragraph in cell.paragraphs:
-                    if col_idx == 0:  # Первый столбец - выравнивание по левому краю и по центру
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                    else:  # Остальные столбцы - по центру
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    
-                    for run in paragraph.runs:
-                        run.font.size = Pt(8)
-                        run.font.name = 'Arial'
-        
-        # Форматирование итоговой строки
-        total_cells = table.rows[len(df)].cells
-        for cell in total_cells:
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                for run in paragraph.runs:
-                    run.font.bold = True
-                    run.font.size = Pt(8)
-                    run.font.name = 'Arial'
-            
-            # Заливка итоговой строки
-            set_cell_shading(cell, 'F8F9FA')
-        
-        # Объединяем ВСЕ ячейки в последнем столбце для размещения диаграммы
-        if num_rows > 1:
-            start_cell = table.rows[0].cells[num_data_cols]  # Начинаем с заголовка
-            for row_idx in range(1, num_rows):
-                next_cell = table.rows[row_idx].cells[num_data_cols]
-                start_cell.merge(next_cell)
+        # Создаем таблицу с дополнительным столбцом для диаграммы: ширины столбцов, заголовок,
+        # данные, итоговая строка, заливка и объединение столбца диаграммы формируются одним XML-фрагментом
+        num_data_cols = len(table_data.columns)
+        widths = table_column_widths(num_data_cols, chart_column=True)
+        table = add_frame_table(doc, table_data, widths, chart_column=True)
+        # Первая ячейка объединенного столбца берется прямо из строки заголовка: table.rows[0].cells
+        # строит сетку ячеек всей таблицы, а ее кэш держит дерево таблицы в памяти до сборки мусора
+        chart_cell = _Cell(_row_tc_at(table._tbl.tr_lst[0], num_data_cols), table)
         
         # Создаем и вставляем соответствующую диаграмму в объединенную ячейку
-        total_row = df[df['ПО_Общества'] == 'Общий итог']
-        if not total_row.empty:
+        if chart_image is not None:
+            # Вставляем готовую диаграмму в объединенную ячейку
+            paragraph = chart_cell.paragraphs[0]  # Стиль ячейки уже выравнивает по центру
+            embed_chart(paragraph.add_run(), chart_image, Cm(chart_size[0]), Cm(chart_size[1]), chart_backend)
+            return
+        if not render_missing:
+            return
+
+        try:
             if "Распределение по планам" in chart_title:
                 # Для таблицы 1 - специальная диаграмма распределения по планам
-                chart_buffer = create_doughnut_chart_matplotlib(df, chart_title, "")
+                chart_buffer = create_doughnut_chart_matplotlib(table_data, chart_title, "")
             else:
-                # Для остальных таблиц - диаграммы статусов
-                data_columns = list(df.columns)[1:]  # Исключаем 'ПО_Общества'
-                data_values = [total_row[col].iloc[0] for col in data_columns]
-                chart_buffer = create_status_doughnut_chart(data_columns, data_values, chart_title)
-            
-            if chart_buffer:
-                temp_file_path = save_buffer_to_temp_file(chart_buffer, chart_prefix)
-                if temp_file_path and os.path.exists(temp_file_path):
-                    # Вставляем диаграмму в объединенную ячейку
-                    cell = table.rows[0].cells[num_data_cols]  # Первая ячейка объединенного столбца
-                    paragraph = cell.paragraphs[0]
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    run = paragraph.add_run()
-                    run.add_picture(temp_file_path, width=Cm(chart_size[0]), height=Cm(chart_size[1]))
-                
+                # Для остальных таблиц - диаграммы статусов по итоговой строке модели
+                data_columns = table_data.columns[1:]  # Исключаем 'ПО_Общества'
+                chart_buffer = create_status_doughnut_chart(data_columns, list(table_data.totals), chart_title)
+        except ValueError as e:
+            # Диаграмму без данных пропускаем, таблица остается в отчете
+            print(f"Диаграмма '{chart_title}' не построена: {e}")
+            return
+
+        if chart_buffer:
+            # Вставляем диаграмму в объединенную ячейку прямо из буфера
+            paragraph = chart_cell.paragraphs[0]  # Стиль ячейки уже выравнивает по центру
+            run = paragraph.add_run()
+            with chart_buffer:
+                run.add_picture(chart_buffer, width=Cm(chart_size[0]), height=Cm(chart_size[1]))
+
     except Exception as e:
         print(f"Ошибка при создании таблицы с диаграммой: {e}")
 
-def create_table_without_chart(doc, df):
-    """Создание таблицы без диаграммы (для таблицы 4)"""
+def create_table_without_chart(doc, table_data):
+    """Создание таблицы модели отчета без диаграммы (для таблицы 4)"""
     try:
-        # Создаем таблицу без дополнительного столбца для диаграммы
-        num_data_cols = len(df.columns)
-        num_rows = len(df) + 1  # +1 для заголовка
-        table = doc.add_table(rows=num_rows, cols=num_data_cols)
-        table.style = 'Table Grid'
-        
-        # РАСЧЕТ ШИРИН СТОЛБЦОВ ДЛЯ ТАБЛИЦЫ БЕЗ ДИАГРАММЫ
-        # Общая ширина: 21 см (ширина листа A4)
-        # Первый столбец: 3.19 см
-        # Оставшаяся ширина для остальных столбцов: 21 - 3.19 = 17.81 см
-        first_col_width = Cm(3.19)
-        remaining_width = Cm(17.81)
-        
-        # Равномерно распределяем оставшуюся ширину между остальными столбцами
-        if num_data_cols > 1:
-            other_cols_width = remaining_width / (num_data_cols - 1)
-        else:
-            other_cols_width = Cm(0)
-        
-        widths = [first_col_width] + [other_cols_width] * (num_data_cols - 1)
-        
-        for i, width in enumerate(widths):
-            for cell in table.columns[i].cells:
-                cell.width = width
-        
-        # Заголовки таблицы
-        header_cells = table.rows[0].cells
-        column_names = list(df.columns)
-        
-        for i, column_name in enumerate(column_names):
-            # Упрощаем названия столбцов для лучшего отображения
-            simplified_name = str(column_name).replace('_', ' ')
-            header_cells[i].text = simplified_name
-            
-            # Форматирование заголовков
-            for paragraph in header_cells[i].paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                for run in paragraph.runs:
-                    run.font.bold = True
-                    run.font.size = Pt(8)
-                    run.font.name = 'Arial'
-            
-            # Заливка заголовков
-            set_cell_shading(header_cells[i], 'F8F9FA')
-        
-        # Данные таблицы
-        for row_idx, row_data in enumerate(df.itertuples(), 1):
-            for col_idx, value in enumerate(row_data[1:], 0):  # Пропускаем индекс
-                cell = table.rows[row_idx].cells[col_idx]
-                cell.text = str(value)
-                
-                # Форматирование данных
-                for paragraph in cell.paragraphs:
-                    if col_idx == 0:  # Первый столбец - выравнивание по левому краю и по центру
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.LEFT
-                    else:  # Остальные столбцы - по центру
-                        paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                    
-                    for run in paragraph.runs:
-                        run.font.size = Pt(8)
-                        run.font.name = 'Arial'
-        
-        # Форматирование итоговой строки
-        total_cells = table.rows[len(df)].cells
-        for cell in total_cells:
-            for paragraph in cell.paragraphs:
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                for run in paragraph.runs:
-                    run.font.bold = True
-                    run.font.size = Pt(8)
-                    run.font.name = 'Arial'
-            
-            # Заливка итоговой строки
-            set_cell_shading(cell, 'F8F9FA')
+        # Создаем таблицу без дополнительного столбца для диаграммы одним XML-фрагментом
+        add_frame_table(doc, table_data, table_column_widths(len(table_data.columns)))
                 
     except Exception as e:
         print(f"Ошибка при создании таблицы без диаграммы: {e}")
 
+def _run_report_worker(generator_name, file_paths, cache_settings, run_settings):
+    """Запуск генерации отчета в дочернем процессе с настройками родителя"""
+    # Настройки могли быть изменены в родительском процессе после импорта модуля
+    FILE_PATHS.update(file_paths)
+    CACHE_SETTINGS.update(cache_settings)
+    RUN_SETTINGS.update(run_settings)
+    return globals()[generator_name]()
+
+def generate_source_reports(parallel=None):
+    """Загрузка и агрегация данных КР и ТОиТР, параллельно в пуле процессов или последовательно"""
+    generators = [
+        ("капитальному ремонту", 'generate_kr_report'),
+        ("техническому обслуживанию и текущему ремонту", 'generate_totr_report')
+    ]
+    if parallel is None:
+        parallel = RUN_SETTINGS['parallel']
+    if parallel and (os.cpu_count() or 1) < 2:
+        print("Доступно одно ядро процессора - загрузка выполняется последовательно")
+        parallel = False
+
+    if parallel:
+        try:
+            print("Параллельная генерация отчетов по КР и ТОиТР...")
+            with ProcessPoolExecutor(max_workers=len(generators)) as executor:
+                futures = [
+                    executor.submit(_run_report_worker, generator_name, dict(FILE_PATHS),
+                                    dict(CACHE_SETTINGS), dict(RUN_SETTINGS))
+                    for _, generator_name in generators
+                ]
+                # result() повторно возбуждает в родителе исключение, возникшее в дочернем процессе
+                return [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            print(f"Пул процессов недоступен ({e}), выполняем загрузку последовательно")
+
+    results = []
+    for description, generator_name in generators:
+        print(f"Генерация отчета по {description}...")
+        results.append(globals()[generator_name]())
+    return results
+
 def create_combined_report():
     """Создание объединенного отчета"""
     try:
@@ -1055,7 +3580,8 @@ def create_combined_report():
         print("Базовая директория проекта:", BASE_DIR)
         print("Путь к файлу КР:", FILE_PATHS['kr_file'])
         print("Путь к файлу ТОиТР:", FILE_PATHS['totr_file'])
-        print("Выходной файл:", FILE_PATHS['output_file'])
+        output_filename = output_file_path()
+        print("Выходной файл:", output_filename)
         
         # Проверяем существование базовых папок
         if not os.path.exists(os.path.dirname(FILE_PATHS['kr_file'])):
@@ -1064,20 +3590,22 @@ def create_combined_report():
         if not os.path.exists(os.path.dirname(FILE_PATHS['totr_file'])):
             print(f"Папка ТОиТР не найдена: {os.path.dirname(FILE_PATHS['totr_file'])}")
 
-        # Генерируем отчеты
-        print("Генерация отчета по капитальному ремонту...")
-        kr_df = generate_kr_report()
-        
-        print("Генерация отчета по техническому обслуживанию и текущему ремонту...")
-        totr_df = generate_totr_report()
+        # Генерируем отчеты (по умолчанию КР и ТОиТР загружаются параллельно)
+        start = time.perf_counter()
+        kr_model, totr_model = generate_source_reports()
+        STAGE_TIMINGS['Загрузка и агрегация данных'] = time.perf_counter() - start
         
         # Создаем новый документ Word
         print("Создание отчета в формате DOCX...")
-        create_docx_report(kr_df, totr_df)
+        start = time.perf_counter()
+        create_docx_report(kr_model, totr_model, output_filename)
+        STAGE_TIMINGS['Диаграммы и сборка DOCX'] = time.perf_counter() - start
         
-        print(f"Файл успешно создан: {FILE_PATHS['output_file']}")
-        print(f"Обработано строк в КР: {len(kr_df)}")
-        print(f"Обработано строк в ТОиТР: {len(totr_df)}")
+        print(f"Файл успешно создан: {output_filename}")
+        print(f"Обработано строк в КР: {len(kr_model)}")
+        print(f"Обработано строк в ТОиТР: {len(totr_model)}")
+        print(describe_chart_cache_stats())
+        print(describe_fragment_cache_stats())
         
     except FileNotFoundError as e:
         print(f"Ошибка: {e}")
@@ -1087,11 +3615,200 @@ def create_combined_report():
         import traceback
         traceback.print_exc()
 
+# Длительность этапов текущего запуска для сводки --timings
+STAGE_TIMINGS = {}
+
+# Зависимости, которые раньше загружались при импорте скрипта (для сравнения холодного старта)
+EAGER_IMPORTS_BEFORE = ['pandas', 'numpy', 'openpyxl', 'matplotlib.pyplot', 'docx']
+
+def _measure_import_time(code):
+    """Выполняет код в новом процессе с -X importtime: (общее время, {модуль верхнего уровня: время}) в с"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, encoding='utf-8', errors='replace')
+    breakdown = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Вложенные импорты выводятся с дополнительным отступом перед именем
+        if not name[1:].startswith(' '):
+            breakdown[name.strip()] = int(cumulative) / 1_000_000
+    return sum(breakdown.values()), breakdown
+
+def print_startup_timings(top=8):
+    """Сводка --timings: стоимость холодного старта до и после отложенных импортов, этапы запуска"""
+    import_script = (f"import importlib.util; spec = importlib.util.spec_from_file_location('report', {os.path.abspath(__file__)!r}); "
+                     f"spec.loader.exec_module(importlib.util.module_from_spec(spec))")
+    before_total, before = _measure_import_time(f"import {', '.join(EAGER_IMPORTS_BEFORE)}; {import_script}")
+    after_total, after = _measure_import_time(import_script)
+
+    print("Холодный старт (импорт в новом процессе, -X importtime):")
+    print(f"  все зависимости при импорте (прежде): {before_total:.2f} с")
+    print(f"  отложенные импорты (сейчас):          {after_total:.2f} с")
+    for title, breakdown in (("прежде", before), ("сейчас", after)):
+        largest = sorted(breakdown.items(), key=lambda item: item[1], reverse=True)[:top]
+        print(f"  {title}: " + ", ".join(f"{name} {seconds:.3f} с" for name, seconds in largest))
+    print(f"Импорт скрипта в этом запуске: {MODULE_IMPORT_SECONDS:.3f} с")
+    for stage, seconds in STAGE_TIMINGS.items():
+        print(f"{stage}: {seconds:.2f} с")
+
 # Вспомогательная функция для пространств имен XML
 def nsdecls(*prefixes):
     return ' '.join(['xmlns:{}="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'.format(prefix) for prefix in prefixes])
 
+def parse_args(argv=None):
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(description="Отчет по подготовке планов ТОиР")
+    parser.add_argument('--no-cache', action='store_true', help="Не использовать кэш исходных данных")
+    parser.add_argument('--clear-cache', action='store_true', help="Очистить кэш исходных данных перед запуском")
+    parser.add_argument('--serial', action='store_true', help="Загружать КР и ТОиТР последовательно (для отладки)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Агрегировать данные частями без загрузки всего листа в память")
+    parser.add_argument('--chunk-size', type=int, default=None, help="Строк в одной части потокового режима")
+    parser.add_argument('--stream-docx', action='store_true',
+                        help="Записывать document.xml в архив по блокам, не держа в памяти все дерево документа")
+    parser.add_argument('--docx-compress-level', type=int, choices=range(10), default=None, metavar='0-9',
+                        help="Уровень сжатия XML-частей DOCX (изображения хранятся без сжатия)")
+    parser.add_argument('--skip-unchanged', action='store_true',
+                        help="Не перезаписывать DOCX, если новый файл побайтно совпадает с существующим")
+    parser.add_argument('--timings', action='store_true',
+                        help="Показать стоимость импорта зависимостей (холодный старт) и длительность этапов")
+    parser.add_argument('--mpl-config-dir', default=None,
+                        help="Каталог настроек и кэша шрифтов matplotlib (MPLCONFIGDIR)")
+    parser.add_argument('--chart-backend', choices=['matplotlib', 'native'], default=None,
+                        help="Диаграммы: PNG через matplotlib или встроенные диаграммы Word")
+    parser.add_argument('--chart-format', choices=['png', 'svg'], default=None,
+                        help="Формат изображений диаграмм matplotlib: PNG или SVG с запасным PNG")
+    parser.add_argument('--chart-dpi', type=int, default=None,
+                        help="Фиксированный DPI диаграмм (по умолчанию - по размеру диаграммы в документе)")
+    parser.add_argument('--chart-palette', type=int, default=None,
+                        help="Сохранять PNG диаграмм с палитрой из стольких цветов (требуется Pillow)")
+    parser.add_argument('--empty-run-limit', type=int, default=None,
+                        help="Остановка чтения после стольких строк подряд с пустым ПО_Общества (0 - читать лист целиком)")
+    parser.add_argument('--scan-after-stop', action='store_true',
+                        help="Диагностика: после остановки по пустым строкам проверить на ПО_Общества весь остаток листа")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('font-cache', help="Заранее построить кэш шрифтов matplotlib (для образа контейнера)")
+
+    breakdown_parser = subparsers.add_parser('breakdown', help="Срез куба счетчиков по одному или двум столбцам")
+    breakdown_parser.add_argument('dimension', help="Столбец строк среза (ПО_Общества, План, ДВ, КП, ...)")
+    breakdown_parser.add_argument('--by', default=None, help="Столбец столбцов среза")
+    breakdown_parser.add_argument('--where', action='append', default=[], metavar='СТОЛБЕЦ=ЗНАЧЕНИЕ',
+                                  help="Учитывать только строки с этим значением (можно повторять)")
+    breakdown_parser.add_argument('--source', choices=sorted(SHEET_CONFIGS), default='kr', help="Исходный файл")
+
+    query_parser = subparsers.add_parser('query', help="Отбор строк плана по значениям столбцов без формирования отчета")
+    query_parser.add_argument('--where', action='append', default=[], metavar='СТОЛБЕЦ=ЗНАЧЕНИЕ',
+                              help="Строки с этим значением (условия по разным столбцам - И, по одному - ИЛИ)")
+    query_parser.add_argument('--exclude', action='append', default=[], metavar='СТОЛБЕЦ=ЗНАЧЕНИЕ',
+                              help="Исключить строки с этим значением")
+    query_parser.add_argument('--source', choices=sorted(SHEET_CONFIGS), default='kr', help="Исходный файл")
+    query_parser.add_argument('--count', action='store_true', help="Вывести только число строк")
+    query_parser.add_argument('--limit', type=int, default=20, help="Сколько строк вывести (0 - не выводить)")
+    query_parser.add_argument('--export', default=None, metavar='ФАЙЛ',
+                              help="Выгрузить найденные строки в CSV или XLSX (по расширению)")
+
+    benchmark_parser = subparsers.add_parser('benchmark', help="Замеры производительности этапов отчета")
+    benchmark_parser.add_argument('target', choices=['reader', 'normalize', 'aggregate', 'cube', 'query',
+                                                      'streaming', 'tables', 'charts', 'chart-formats', 'docx'],
+                                  help="Этап для замера")
+    benchmark_parser.add_argument('--source', choices=sorted(SHEET_CONFIGS), default='kr', help="Исходный файл")
+    benchmark_parser.add_argument('--repeats', type=int, default=3, help="Количество повторов")
+    benchmark_parser.add_argument('--rows', type=int, default=200_000, help="Строк в синтетической книге (streaming)")
+    benchmark_parser.add_argument('--memory-budget-mb', type=float, default=None,
+                                  help="Допустимая пиковая память потокового режима (streaming)")
+    benchmark_parser.add_argument('--subdivisions', type=int, default=2000,
+                                  help="Подразделений в синтетическом отчете (docx)")
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """Точка входа: по умолчанию формирует объединенный отчет"""
+    args = parse_args(argv)
+
+    if args.clear_cache:
+        clear_cache()
+    if args.no_cache:
+        CACHE_SETTINGS['enabled'] = False
+    if args.serial:
+        RUN_SETTINGS['parallel'] = False
+    if args.streaming:
+        RUN_SETTINGS['streaming'] = True
+    if args.chunk_size is not None:
+        RUN_SETTINGS['chunk_size'] = args.chunk_size
+    if args.empty_run_limit is not None:
+        RUN_SETTINGS['empty_run_limit'] = args.empty_run_limit or None
+    if args.scan_after_stop:
+        RUN_SETTINGS['after_stop_check_rows'] = None
+    if args.chart_backend is not None:
+        RUN_SETTINGS['chart_backend'] = args.chart_backend
+    if args.chart_format is not None:
+        RUN_SETTINGS['chart_format'] = args.chart_format
+    if args.chart_dpi is not None:
+        RUN_SETTINGS['chart_dpi'] = args.chart_dpi
+    if args.chart_palette is not None:
+        RUN_SETTINGS['chart_palette_colors'] = args.chart_palette
+    if args.stream_docx:
+        RUN_SETTINGS['docx_streaming'] = True
+    if args.skip_unchanged:
+        RUN_SETTINGS['skip_unchanged'] = True
+    if args.docx_compress_level is not None:
+        RUN_SETTINGS['docx_compress_level'] = args.docx_compress_level
+    if args.mpl_config_dir is not None:
+        RUN_SETTINGS['matplotlib_config_dir'] = args.mpl_config_dir
+    configure_matplotlib()
+
+    if args.command == 'font-cache':
+        build_font_cache()
+    elif args.command == 'breakdown':
+        try:
+            where = parse_breakdown_conditions(args.where)
+        except ValueError as e:
+            print(f"Ошибка: {e}")
+            sys.exit(1)
+        if not print_breakdown(args.source, args.dimension, args.by, where):
+            sys.exit(1)
+    elif args.command == 'query':
+        try:
+            where, exclude = parse_conditions(args.where), parse_conditions(args.exclude)
+        except ValueError as e:
+            print(f"Ошибка: {e}")
+            sys.exit(2)
+        if not run_query(args.source, where, exclude, args.limit, args.export, args.count):
+            sys.exit(1)
+    elif args.command == 'benchmark':
+        if args.target == 'reader':
+            benchmark_excel_readers(args.source, args.repeats)
+        elif args.target == 'normalize':
+            benchmark_normalization(args.source, repeats=args.repeats)
+        elif args.target == 'aggregate':
+            benchmark_aggregation(args.source, repeats=args.repeats)
+        elif args.target == 'cube':
+            benchmark_cube(args.source, repeats=args.repeats)
+        elif args.target == 'query':
+            benchmark_query(args.source, repeats=args.repeats)
+        elif args.target == 'tables':
+            benchmark_tables(args.source, repeats=args.repeats)
+        elif args.target == 'charts':
+            benchmark_charts(args.repeats)
+        elif args.target == 'chart-formats':
+            benchmark_chart_formats(args.repeats)
+        elif args.target == 'docx':
+            if not benchmark_docx(args.subdivisions):
+                sys.exit(1)
+        elif args.target == 'streaming':
+            if not benchmark_streaming(args.source, args.rows, memory_budget_mb=args.memory_budget_mb):
+                sys.exit(1)
+    else:
+        create_combined_report()
+
+    if args.timings:
+        print_startup_timings()
+
+# Время импорта модуля (без отложенных зависимостей) для сводки --timings
+MODULE_IMPORT_SECONDS = time.perf_counter() - _MODULE_IMPORT_STARTED
+
 # Запускаем создание объединенного отчета
 if __name__ == "__main__":
-    create_combined_report()
+    main()
 